@@ -52,25 +52,57 @@ class ChangeSource(service.ClusteredBuildbotService):
 
 class PollingChangeSource(ChangeSource):
 
+    # True if the source adds its changes through self.addChange, so that
+    # the PollCoordinator can tell polls that found changes; otherwise its
+    # interval is never adapted
+    countsChanges = False
+
     def __init__(self, name=None, pollInterval=60 * 10, pollAtLaunch=False):
         ChangeSource.__init__(self, name=name)
         self.pollInterval = pollInterval
         self.pollAtLaunch = pollAtLaunch
+        # the interval adapted by the PollCoordinator, and the number of
+        # changes added by this source, for it to do so
+        self.currentPollInterval = pollInterval
+        self.changesFound = 0
 
     def poll(self):
         pass
 
     @poll_method
     def doPoll(self):
-        d = defer.maybeDeferred(self.poll)
+        d = self.master.poll_coordinator.poll(self)
         d.addErrback(log.err, 'while polling for changes')
         return d
 
     def force(self):
         self.doPoll()
 
+    def addChange(self, **kwargs):
+        """
+        Add a change found by this source; the arguments are those of the
+        C{addChange} data update.
+        """
+        self.changesFound += 1
+        return self.master.data.updates.addChange(**kwargs)
+
+    def runProcess(self, fn, *args, **kwargs):
+        """
+        Call C{fn(*args, **kwargs)}, which runs a VCS process (like
+        C{utils.getProcessOutput}), within the budget of concurrent processes
+        of the master.
+        """
+        if self.master is None:
+            # not attached to a master
+            return defer.maybeDeferred(fn, *args, **kwargs)
+        return self.master.poll_coordinator.runProcess(fn, *args, **kwargs)
+
     def activate(self):
-        self.doPoll.start(interval=self.pollInterval, now=self.pollAtLaunch)
+        delay = self.master.poll_coordinator.getStartDelay(
+            self.pollInterval, now=self.pollAtLaunch)
+        self.currentPollInterval = self.pollInterval
+        self.doPoll.start(interval=self.pollInterval, now=self.pollAtLaunch,
+                          delay=delay)
 
     def deactivate(self):
         return self.doPoll.stop()
@@ -36,6 +36,8 @@ class BitbucketPullrequestPoller(base.PollingChangeSource):
 
     db_class_name = 'BitbucketPullrequestPoller'
 
+    countsChanges = True
+
     def __init__(self, owner, slug,
                  branch=None,
                  pollInterval=10 * 60,
@@ -138,7 +140,7 @@ class BitbucketPullrequestPoller(base.PollingChangeSource):
                     # update database
                     yield self._setCurrentRev(nr, revision)
                     # emit the change
-                    yield self.master.data.updates.addChange(
+                    yield self.addChange(
                         author=ascii2unicode(author),
                         revision=ascii2unicode(revision),
                         revlink=ascii2unicode(revlink),
@@ -0,0 +1,151 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import collections
+import random
+
+from twisted.internet import defer
+from twisted.internet import reactor
+
+from buildbot.process import metrics
+from buildbot.util import service
+
+
+class PollCoordinator(service.ReconfigurableServiceMixin,
+                      service.AsyncService):
+
+    """
+    Coordinate the polling change sources of a master, as configured by
+    C{c['polling']}.  The master has one of these as its C{poll_coordinator}
+    service.
+
+    The first poll of each source, including the poll at launch, is moved by
+    a random part of its interval, so that sources configured together do
+    not all poll at once,
+    and the VCS commands that the sources run are limited to a number of
+    concurrent processes for the whole master.  The interval of a source that
+    finds no changes grows, up to a multiple of its configured interval, and
+    goes back to the configured interval as soon as it finds changes.
+    """
+
+    # factor by which the interval of a source grows when it finds no changes
+    INTERVAL_BACKOFF = 1.5
+
+    # the default c['polling'], until the master is configured
+    DEFAULT_CONFIG = dict(max_processes=None, jitter=0, max_interval_factor=1)
+
+    name = 'poll_coordinator'
+    # configure the coordinator before the change sources start to poll
+    reconfig_priority = 192
+
+    _reactor = reactor  # for tests
+
+    def __init__(self):
+        self.config = dict(self.DEFAULT_CONFIG)
+        self.running = 0
+        # Deferreds of the processes waiting for the budget, with the time
+        # at which they started to wait
+        self.waiting = collections.deque()
+
+    def reconfigServiceWithBuildbotConfig(self, new_config):
+        self.config = dict(new_config.polling)
+        # a larger budget may let waiting processes run
+        self._wakeUp()
+        return defer.succeed(None)
+
+    def getStartDelay(self, interval, now=False):
+        """
+        Return the delay before the first poll of a source polling every
+        C{interval} seconds, and polling at launch if C{now} is true, or None
+        to poll after C{interval} seconds, or right away if C{now} is true.
+        """
+        jitter = self.config['jitter']
+        if not jitter:
+            return None
+        spread = interval * jitter * random.random()
+        if now:
+            return spread
+        return interval - spread
+
+    def getNextInterval(self, pollInterval, interval, foundChanges):
+        """
+        Return the interval after a poll of a source configured to poll every
+        C{pollInterval} seconds, and polling every C{interval} seconds.
+        """
+        factor = self.config['max_interval_factor']
+        if foundChanges or factor <= 1:
+            return pollInterval
+        return min(interval * self.INTERVAL_BACKOFF, pollInterval * factor)
+
+    @defer.inlineCallbacks
+    def poll(self, source):
+        """
+        Poll C{source}, and adapt its interval to whether it found changes.
+        """
+        changesFound = source.changesFound
+        start = self._reactor.seconds()
+        yield defer.maybeDeferred(source.poll)
+        metrics.MetricTimeEvent.log('PollingChangeSource.poll',
+                                    self._reactor.seconds() - start)
+
+        if not source.countsChanges:
+            return
+        interval = self.getNextInterval(
+            source.pollInterval, source.currentPollInterval,
+            source.changesFound > changesFound)
+        if interval != source.currentPollInterval:
+            source.currentPollInterval = interval
+            source.doPoll.setInterval(interval)
+
+    def runProcess(self, fn, *args, **kwargs):
+        """
+        Call C{fn(*args, **kwargs)}, which runs a VCS process, once there is
+        room for it in the budget of C{c['polling']['max_processes']}.
+
+        @returns: the result of C{fn}, via Deferred
+        """
+        d = self._acquire()
+        d.addCallback(lambda _: fn(*args, **kwargs))
+
+        @d.addBoth
+        def release(res):
+            self.running -= 1
+            self._wakeUp()
+            return res
+        return d
+
+    def _acquire(self):
+        limit = self.config['max_processes']
+        if not self.waiting and (limit is None or self.running < limit):
+            self.running += 1
+            return defer.succeed(None)
+        d = defer.Deferred()
+        self.waiting.append((d, self._reactor.seconds()))
+        self._logQueueDepth()
+        return d
+
+    def _wakeUp(self):
+        limit = self.config['max_processes']
+        while self.waiting and (limit is None or self.running < limit):
+            d, since = self.waiting.popleft()
+            self._logQueueDepth()
+            metrics.MetricTimeEvent.log('PollCoordinator.process_wait',
+                                        self._reactor.seconds() - since)
+            self.running += 1
+            d.callback(None)
+
+    def _logQueueDepth(self):
+        metrics.MetricCountEvent.log('PollCoordinator.queued_processes',
+                                     len(self.waiting), absolute=True)
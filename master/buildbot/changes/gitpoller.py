@@ -40,6 +40,14 @@ class GitPoller(base.PollingChangeSource, StateMixin):
     """This source will poll a remote git repo for changes and submit
     them to the change master."""
 
+    countsChanges = True
+
+    # when more than BULK_LOG_THRESHOLD revisions are new, their metadata is
+    # read by a single 'git log' command for each batch of BULK_LOG_BATCH_SIZE
+    # revisions, instead of four commands for each revision
+    BULK_LOG_THRESHOLD = 10
+    BULK_LOG_BATCH_SIZE = 500
+
     compare_attrs = ("repourl", "branches", "workdir",
                      "pollInterval", "gitbin", "usetimestamps",
                      "category", "project", "pollAtLaunch",
@@ -299,6 +307,10 @@ class GitPoller(base.PollingChangeSource, StateMixin):
             log.msg('gitpoller: processing %d changes: %s from "%s" branch "%s"'
                     % (self.changeCount, revList, self.repourl, branch))
 
+        if len(revList) > self.BULK_LOG_THRESHOLD:
+            yield self._process_changes_bulk(revList, branch)
+            return
+
         for rev in revList:
             dl = defer.DeferredList([
                 self._get_commit_timestamp(rev),
@@ -317,23 +329,93 @@ class GitPoller(base.PollingChangeSource, StateMixin):
 
             timestamp, author, files, comments = [r[1] for r in results]
 
-            yield self.master.data.updates.addChange(
-                author=author, revision=ascii2unicode(rev), files=files,
-                comments=comments, when_timestamp=timestamp,
-                branch=ascii2unicode(self._removeHeads(branch)),
-                project=self.project, repository=ascii2unicode(self.repourl),
-                category=self.category, src=u'git')
+            yield self._addChange(rev, branch, timestamp, author, files,
+                                  comments)
 
-    def _dovccmd(self, command, args, path=None):
+    @defer.inlineCallbacks
+    def _process_changes_bulk(self, revList, branch):
+        for i in range(0, len(revList), self.BULK_LOG_BATCH_SIZE):
+            batch = revList[i:i + self.BULK_LOG_BATCH_SIZE]
+            commits = yield self._get_commits(batch)
+            for rev, timestamp, author, files, comments in commits:
+                yield self._addChange(rev, branch, timestamp, author, files,
+                                      comments)
+
+    def _get_commits(self, revs):
+        """
+        Read the metadata of C{revs} with a single C{git log} command.
+
+        @returns: list of (rev, timestamp, author, files, comments) tuples, in
+        the order of C{revs}, via Deferred
+        """
+        # each field is terminated by NUL; '-z' then adds another NUL after
+        # the header of each commit, and terminates each file name with NUL
+        # (without quoting it), after a newline for the first one
+        args = ['--no-walk=unsorted', '-z', '--name-only',
+                r'--format=%H%x00%ct%x00%aN <%aE>%x00%s%n%b%x00'] + \
+            list(revs) + ['--']
+        d = self._dovccmd('log', args, path=self.workdir, strip=False)
+        d.addCallback(self._parse_commits, revs)
+        return d
+
+    def _parse_commits(self, git_output, revs):
+        tokens = git_output.split('\0')
+        commits = []
+        pos = 0
+        for i, rev in enumerate(revs):
+            fields = tokens[pos:pos + 5]
+            if len(fields) < 5 or fields[0] != rev or fields[4]:
+                raise EnvironmentError(
+                    'could not parse the log of rev %s' % (rev,))
+            _, stamp, author, comments, _ = fields
+            pos += 5
+
+            # the file names run up to the next commit, which is a known rev
+            nextRev = revs[i + 1] if i + 1 < len(revs) else None
+            files = []
+            while pos < len(tokens) and tokens[pos] != nextRev:
+                name = tokens[pos]
+                if not files and name.startswith('\n'):
+                    name = name[1:]
+                if name:
+                    files.append(self._decode(name))
+                pos += 1
+
+            if self.usetimestamps:
+                try:
+                    timestamp = int(stamp)
+                except Exception as e:
+                    log.msg('gitpoller: caught exception converting output '
+                            '\'%s\' to timestamp' % stamp)
+                    raise e
+            else:
+                timestamp = None
+            author = self._decode(author)
+            if not author:
+                raise EnvironmentError('could not get commit author for rev')
+            commits.append((rev, timestamp, author, files,
+                            self._decode(comments.strip())))
+        return commits
+
+    def _addChange(self, rev, branch, timestamp, author, files, comments):
+        return self.addChange(
+            author=author, revision=ascii2unicode(rev), files=files,
+            comments=comments, when_timestamp=timestamp,
+            branch=ascii2unicode(self._removeHeads(branch)),
+            project=self.project, repository=ascii2unicode(self.repourl),
+            category=self.category, src=u'git')
+
+    def _dovccmd(self, command, args, path=None, strip=True):
         def encodeArg(arg):
             if isinstance(arg, list):
                 return [encodeArg(a) for a in arg]
             elif isinstance(arg, unicode):
                 return arg.encode("ascii")
             return arg
-        d = utils.getProcessOutputAndValue(encodeArg(self.gitbin),
-                                           encodeArg([command] + args),
-                                           path=encodeArg(path), env=os.environ)
+        d = self.runProcess(utils.getProcessOutputAndValue,
+                            encodeArg(self.gitbin),
+                            encodeArg([command] + args),
+                            path=encodeArg(path), env=os.environ)
 
         def _convert_nonzero_to_failure(res,
                                         command,
@@ -347,7 +429,9 @@ class GitPoller(base.PollingChangeSource, StateMixin):
                                    % (command, args, path, self.repourl, code, stderr))
                 raise EnvironmentError('command %s %s in %s on repourl %s failed with exit code %d: %s'
                                        % (command, args, path, self.repourl, code, stderr))
-            return stdout.strip()
+            if strip:
+                return stdout.strip()
+            return stdout
         d.addCallback(_convert_nonzero_to_failure,
                       command,
                       args,
@@ -35,6 +35,8 @@ class HgPoller(base.PollingChangeSource):
                      "pollInterval", "hgpoller", "usetimestamps",
                      "category", "project", "pollAtLaunch")
 
+    countsChanges = True
+
     db_class_name = 'HgPoller'
 
     def __init__(self, repourl, branch='default',
@@ -101,8 +103,9 @@ class HgPoller(base.PollingChangeSource):
             "{files % '{file}" + os.pathsep + "'}",
             '{desc|strip}'))]
         # Mercurial fails with status 255 if rev is unknown
-        d = utils.getProcessOutput(self.hgbin, args, path=self._absWorkdir(),
-                                   env=os.environ, errortoo=False)
+        d = self.runProcess(utils.getProcessOutput, self.hgbin, args,
+                            path=self._absWorkdir(), env=os.environ,
+                            errortoo=False)
 
         @d.addCallback
         def process(output):
@@ -134,9 +137,9 @@ class HgPoller(base.PollingChangeSource):
         if self._isRepositoryReady():
             return defer.succeed(None)
         log.msg('hgpoller: initializing working dir from %s' % self.repourl)
-        d = utils.getProcessOutputAndValue(self.hgbin,
-                                           ['init', self._absWorkdir()],
-                                           env=os.environ)
+        d = self.runProcess(utils.getProcessOutputAndValue, self.hgbin,
+                            ['init', self._absWorkdir()],
+                            env=os.environ)
         d.addCallback(self._convertNonZeroToFailure)
         d.addErrback(self._stopOnFailure)
         d.addCallback(lambda _: log.msg(
@@ -158,9 +161,9 @@ class HgPoller(base.PollingChangeSource):
         # We set errortoo=True to avoid an errback from the deferred.
         # The callback which will be added to this
         # deferred will not use the response.
-        d.addCallback(lambda _: utils.getProcessOutput(
-            self.hgbin, args, path=self._absWorkdir(),
-            env=os.environ, errortoo=True))
+        d.addCallback(lambda _: self.runProcess(
+            utils.getProcessOutput, self.hgbin, args,
+            path=self._absWorkdir(), env=os.environ, errortoo=True))
 
         return d
 
@@ -215,10 +218,10 @@ class HgPoller(base.PollingChangeSource):
         (if really buildbotting a branch that does not have any changeset
         yet, one shouldn't be surprised to get errors)
         """
-        d = utils.getProcessOutput(self.hgbin,
-                                   ['heads', self.branch,
-                                       '--template={rev}' + os.linesep],
-                                   path=self._absWorkdir(), env=os.environ, errortoo=False)
+        d = self.runProcess(utils.getProcessOutput, self.hgbin,
+                            ['heads', self.branch,
+                                '--template={rev}' + os.linesep],
+                            path=self._absWorkdir(), env=os.environ, errortoo=False)
 
         @d.addErrback
         def no_head_err(exc):
@@ -269,8 +272,9 @@ class HgPoller(base.PollingChangeSource):
         # two passes for hg log makes parsing simpler (comments is multi-lines)
         revListArgs = ['log', '-b', self.branch, '-r', revrange,
                        r'--template={rev}:{node}\n']
-        results = yield utils.getProcessOutput(self.hgbin, revListArgs,
-                                               path=self._absWorkdir(), env=os.environ, errortoo=False)
+        results = yield self.runProcess(utils.getProcessOutput, self.hgbin,
+                                        revListArgs, path=self._absWorkdir(),
+                                        env=os.environ, errortoo=False)
 
         revNodeList = [rn.split(':', 1) for rn in results.strip().split()]
 
@@ -279,7 +283,7 @@ class HgPoller(base.PollingChangeSource):
         for rev, node in revNodeList:
             timestamp, author, files, comments = yield self._getRevDetails(
                 node)
-            yield self.master.data.updates.addChange(
+            yield self.addChange(
                 author=author,
                 revision=unicode(node),
                 files=files,
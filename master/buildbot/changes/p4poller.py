@@ -100,6 +100,8 @@ class P4Source(base.PollingChangeSource, util.ComparableMixin):
                      "p4bin", "pollInterval", "pollAtLaunch",
                      "server_tz")
 
+    countsChanges = True
+
     env_vars = ["P4CLIENT", "P4PORT", "P4PASSWD", "P4USER",
                 "P4CHARSET", "PATH"]
 
@@ -167,7 +169,7 @@ class P4Source(base.PollingChangeSource, util.ComparableMixin):
     def _get_process_output(self, args):
         env = dict([(e, os.environ.get(e))
                     for e in self.env_vars if os.environ.get(e)])
-        d = utils.getProcessOutput(self.p4bin, args, env)
+        d = self.runProcess(utils.getProcessOutput, self.p4bin, args, env)
         return d
 
     def _acquireTicket(self, protocol):
@@ -319,7 +321,7 @@ class P4Source(base.PollingChangeSource, util.ComparableMixin):
                         branch_files[branch] = [file]
 
             for branch in branch_files:
-                yield self.master.data.updates.addChange(
+                yield self.addChange(
                     author=who,
                     files=branch_files[branch],
                     comments=comments,
@@ -73,6 +73,8 @@ class SVNPoller(base.PollingChangeSource, util.ComparableMixin):
     master.
     """
 
+    countsChanges = True
+
     compare_attrs = ("repourl", "split_file",
                      "svnuser", "svnpasswd", "project",
                      "pollInterval", "histmax",
@@ -196,7 +198,8 @@ class SVNPoller(base.PollingChangeSource, util.ComparableMixin):
 
     def getProcessOutput(self, args):
         # this exists so we can override it during the unit tests
-        d = utils.getProcessOutput(self.svnbin, args, self.environ)
+        d = self.runProcess(utils.getProcessOutput, self.svnbin, args,
+                            self.environ)
         return d
 
     def get_prefix(self):
@@ -417,7 +420,7 @@ class SVNPoller(base.PollingChangeSource, util.ComparableMixin):
     @defer.inlineCallbacks
     def submit_changes(self, changes):
         for chdict in changes:
-            yield self.master.data.updates.addChange(src=u'svn', **chdict)
+            yield self.addChange(src=u'svn', **chdict)
 
     def finished_ok(self, res):
         if self.cachepath:
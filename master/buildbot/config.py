@@ -178,6 +178,9 @@ class MasterConfig(util.ComparableMixin, WorkerAPICompatMixin):
         self.buildHorizon = None
         self.logCompressionLimit = 4 * 1024
         self.logCompressionMethod = 'gz'
+        self.logCompressionLevel = None
+        self.logCompressionDictionaries = False
+        self.logAppendDelay = 0
         self.logEncoding = 'utf-8'
         self.logMaxSize = None
         self.logMaxTailSize = None
@@ -211,6 +214,11 @@ class MasterConfig(util.ComparableMixin, WorkerAPICompatMixin):
         self.workers = []
         self._registerOldWorkerAttr("workers")
         self.change_sources = []
+        self.polling = dict(
+            max_processes=None,
+            jitter=0,
+            max_interval_factor=1,
+        )
         self.status = []
         self.user_managers = []
         self.revlink = default_revlink_matcher
@@ -228,9 +236,11 @@ class MasterConfig(util.ComparableMixin, WorkerAPICompatMixin):
         "buildbotURL", "buildCacheSize", "builders", "buildHorizon", "caches",
         "change_source", "codebaseGenerator", "changeCacheSize", "changeHorizon",
         'db', "db_poll_interval", "db_url", "eventHorizon",
+        "logAppendDelay", "logCompressionDictionaries", "logCompressionLevel",
         "logCompressionLimit", "logCompressionMethod", "logEncoding",
         "logHorizon", "logMaxSize", "logMaxTailSize", "manhole",
-        "collapseRequests", "metrics", "mq", "multiMaster", "prioritizeBuilders",
+        "collapseRequests", "metrics", "mq", "multiMaster", "polling",
+        "prioritizeBuilders",
         "projectName", "projectURL", "properties", "protocols", "revlink",
         "schedulers", "services", "status", "title", "titleURL",
         "user_managers", "validation", "www", "workers",
@@ -288,6 +298,7 @@ class MasterConfig(util.ComparableMixin, WorkerAPICompatMixin):
             config.load_builders(filename, config_dict)
             config.load_workers(filename, config_dict)
             config.load_change_sources(filename, config_dict)
+            config.load_polling(filename, config_dict)
             config.load_status(filename, config_dict)
             config.load_user_managers(filename, config_dict)
             config.load_www(filename, config_dict)
@@ -345,9 +356,9 @@ class MasterConfig(util.ComparableMixin, WorkerAPICompatMixin):
 
         self.logCompressionMethod = config_dict.get(
             'logCompressionMethod', 'gz')
-        if self.logCompressionMethod not in ('raw', 'bz2', 'gz', 'lz4'):
+        if self.logCompressionMethod not in ('raw', 'bz2', 'gz', 'lz4', 'zstd'):
             error(
-                "c['logCompressionMethod'] must be 'raw', 'bz2', 'gz' or 'lz4'")
+                "c['logCompressionMethod'] must be 'raw', 'bz2', 'gz', 'lz4' or 'zstd'")
 
         if self.logCompressionMethod == "lz4":
             try:
@@ -358,6 +369,34 @@ class MasterConfig(util.ComparableMixin, WorkerAPICompatMixin):
                 error(
                     "To set c['logCompressionMethod'] to 'lz4' you must install the lz4 library ('pip install lz4')")
 
+        if self.logCompressionMethod == "zstd":
+            try:
+                import zstandard
+                [zstandard]
+            except ImportError:
+                error(
+                    "To set c['logCompressionMethod'] to 'zstd' you must install the zstandard library ('pip install zstandard')")
+
+        copy_int_param('logCompressionLevel')
+        levels = {'gz': (0, 9), 'bz2': (1, 9), 'zstd': (1, 22)}
+        if self.logCompressionLevel is not None and \
+                self.logCompressionMethod in levels:
+            low, high = levels[self.logCompressionMethod]
+            if not low <= self.logCompressionLevel <= high:
+                error("c['logCompressionLevel'] must be between %d and %d "
+                      "for c['logCompressionMethod'] '%s'"
+                      % (low, high, self.logCompressionMethod))
+
+        copy_param('logCompressionDictionaries', check_type=bool,
+                   check_type_name='a boolean')
+        if self.logCompressionDictionaries and \
+                self.logCompressionMethod != 'zstd':
+            error("c['logCompressionDictionaries'] requires "
+                  "c['logCompressionMethod'] to be 'zstd'")
+
+        copy_param('logAppendDelay', check_type=(int, float),
+                   check_type_name='a number')
+
         copy_int_param('logMaxSize')
         copy_int_param('logMaxTailSize')
         copy_param('logEncoding')
@@ -460,7 +499,8 @@ class MasterConfig(util.ComparableMixin, WorkerAPICompatMixin):
 
         if 'db' in config_dict:
             db = config_dict['db']
-            if set(db.keys()) - set(['db_url', 'db_poll_interval']) and throwErrors:
+            if set(db.keys()) - set(['db_url', 'db_poll_interval',
+                                     'db_pool_min', 'db_pool_max']) and throwErrors:
                 error("unrecognized keys in c['db']")
             config_dict = db
 
@@ -478,6 +518,19 @@ class MasterConfig(util.ComparableMixin, WorkerAPICompatMixin):
     def load_db(self, filename, config_dict):
         self.db = dict(db_url=self.getDbUrlFromConfig(config_dict))
 
+        db = config_dict.get('db', {})
+        for name in ('db_pool_min', 'db_pool_max'):
+            if name not in db:
+                continue
+            v = db[name]
+            if not isinstance(v, int) or v < 1:
+                error("c['db']['%s'] must be a positive integer" % (name,))
+                continue
+            self.db[name] = v
+        if self.db.get('db_pool_min', 1) > self.db.get('db_pool_max', sys.maxsize):
+            error("c['db']['db_pool_min'] must not be greater than "
+                  "c['db']['db_pool_max']")
+
     def load_mq(self, filename, config_dict):
         from buildbot.mq import connector  # avoid circular imports
         if 'mq' in config_dict:
@@ -495,6 +548,11 @@ class MasterConfig(util.ComparableMixin, WorkerAPICompatMixin):
             error("unrecognized keys in c['mq']: %s"
                   % (', '.join(unk),))
 
+        size = self.mq.get('persistent_queue_size')
+        if size is not None and (not isinstance(size, int) or size < 1):
+            error("c['mq']['persistent_queue_size'] must be a positive "
+                  "integer")
+
     def load_metrics(self, filename, config_dict):
         # we don't try to validate metrics keys
         if 'metrics' in config_dict:
@@ -665,6 +723,32 @@ class MasterConfig(util.ComparableMixin, WorkerAPICompatMixin):
 
         self.change_sources = change_sources
 
+    def load_polling(self, filename, config_dict):
+        if 'polling' not in config_dict:
+            return
+        polling = config_dict['polling']
+        if not isinstance(polling, dict):
+            error("c['polling'] must be a dictionary")
+            return
+
+        unk = set(polling) - set(self.polling)
+        if unk:
+            error("unrecognized keys in c['polling']: %s"
+                  % (', '.join(sorted(unk)),))
+        self.polling.update(polling)
+
+        max_processes = self.polling['max_processes']
+        if max_processes is not None and \
+                (not isinstance(max_processes, int) or max_processes < 1):
+            error("c['polling']['max_processes'] must be a positive integer")
+        jitter = self.polling['jitter']
+        if not isinstance(jitter, (int, float)) or not 0 <= jitter <= 1:
+            error("c['polling']['jitter'] must be a number between 0 and 1")
+        factor = self.polling['max_interval_factor']
+        if not isinstance(factor, (int, float)) or factor < 1:
+            error("c['polling']['max_interval_factor'] must be a number "
+                  "greater than or equal to 1")
+
     def load_status(self, filename, config_dict):
         if 'status' not in config_dict:
             return
@@ -701,7 +785,8 @@ class MasterConfig(util.ComparableMixin, WorkerAPICompatMixin):
             return
         www_cfg = config_dict['www']
         allowed = set(['port', 'debug', 'json_cache_seconds',
-                       'rest_minimum_version', 'allowed_origins', 'jsonp',
+                       'rest_minimum_version', 'rest_cache_size',
+                       'allowed_origins', 'jsonp',
                        'plugins', 'auth', 'authz', 'avatar_methods', 'logfileName',
                        'logRotateLength', 'maxRotatedFiles', 'versions',
                        'change_hook_dialects', 'change_hook_auth',
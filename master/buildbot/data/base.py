@@ -13,13 +13,13 @@
 #
 # Copyright Buildbot Team Members
 
-import copy
 import re
 import UserList
 
 from twisted.internet import defer
 
 from buildbot.data import exceptions
+from buildbot.util import bbcollections
 
 
 class ResourceType(object):
@@ -58,8 +58,9 @@ class ResourceType(object):
 
     @staticmethod
     def sanitizeMessage(msg):
-        msg = copy.deepcopy(msg)
-        return msg
+        # the same message is shared by every routing key and consumer, so
+        # it is made read-only rather than copied for each of them
+        return bbcollections.freeze(msg)
 
     def produceEvent(self, msg, event):
         if msg is not None:
@@ -75,6 +76,8 @@ class Endpoint(object):
     rootLinkName = None
     isCollection = False
     isRaw = False
+    # a string field of the results that can be big enough to be streamed
+    streamingField = None
 
     def __init__(self, rtype, master):
         self.rtype = rtype
@@ -86,6 +89,12 @@ class Endpoint(object):
     def control(self, action, args, kwargs):
         raise exceptions.InvalidControlException
 
+    def isImmutable(self, data, kwargs):
+        # Return true if DATA, as returned by get(), will never change, so
+        # that it can be cached; this may return a Deferred.  By default,
+        # only single items that are complete are immutable.
+        return not self.isCollection and data.get('complete') is True
+
     def __repr__(self):
         return "endpoint for " + self.pathPatterns
 
@@ -169,6 +178,15 @@ class ListResult(UserList.UserList):
         return not (self == other)
 
 
+def keepPagination(rows, values):
+    """Return C{values}, converted from C{rows}, as a L{ListResult} with the
+    same pagination if the db layer returned C{rows} as a L{ListResult}"""
+    if isinstance(rows, ListResult):
+        return ListResult(values, offset=rows.offset, total=rows.total,
+                          limit=rows.limit)
+    return values
+
+
 def updateMethod(func):
     """Decorate this resourceType instance as an update method, made available
     at master.data.updates.$funcname"""
@@ -102,6 +102,13 @@ class BuildRequestsEndpoint(Db2DataMixin, base.Endpoint):
         /builders/n:builderid/buildrequests
     """
     rootLinkName = 'buildrequests'
+    fieldMapping = {
+        'buildrequestid': 'buildrequests.id',
+        'buildsetid': 'buildrequests.buildsetid',
+        'builderid': 'buildrequests.builderid',
+        'priority': 'buildrequests.priority',
+        'results': 'buildrequests.results',
+    }
 
     @defer.inlineCallbacks
     def get(self, resultSpec, kwargs):
@@ -118,13 +125,16 @@ class BuildRequestsEndpoint(Db2DataMixin, base.Endpoint):
             claimed = resultSpec.popBooleanFilter('claimed')
 
         bsid = resultSpec.popOneFilter('buildsetid', 'eq')
+        resultSpec.fieldMapping = self.fieldMapping
         buildrequests = yield self.master.db.buildrequests.getBuildRequests(
             builderid=builderid,
             complete=complete,
             claimed=claimed,
-            bsid=bsid)
-        defer.returnValue(
-            [(yield self.db2data(br)) for br in buildrequests])
+            bsid=bsid,
+            resultSpec=resultSpec)
+        defer.returnValue(base.keepPagination(
+            buildrequests,
+            [(yield self.db2data(br)) for br in buildrequests]))
 
 
 class BuildRequest(base.ResourceType):
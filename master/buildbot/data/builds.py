@@ -131,6 +131,16 @@ class BuildsEndpoint(Db2DataMixin, base.Endpoint):
         /workers/n:workerid/builds
     """
     rootLinkName = 'builds'
+    fieldMapping = {
+        'buildid': 'builds.id',
+        'number': 'builds.number',
+        'builderid': 'builds.builderid',
+        'buildrequestid': 'builds.buildrequestid',
+        'workerid': 'builds.workerid',
+        'masterid': 'builds.masterid',
+        'state_string': 'builds.state_string',
+        'results': 'builds.results',
+    }
 
     @defer.inlineCallbacks
     def get(self, resultSpec, kwargs):
@@ -138,11 +148,13 @@ class BuildsEndpoint(Db2DataMixin, base.Endpoint):
         # true or false, if there is a complete filter
         complete = resultSpec.popBooleanFilter("complete")
         buildrequestid = resultSpec.popIntegerFilter("buildrequestid")
+        resultSpec.fieldMapping = self.fieldMapping
         builds = yield self.master.db.builds.getBuilds(
             builderid=kwargs.get('builderid'),
             buildrequestid=kwargs.get('buildrequestid', buildrequestid),
             workerid=kwargs.get('workerid'),
-            complete=complete)
+            complete=complete,
+            resultSpec=resultSpec)
         # returns properties' list
         filters = resultSpec.popProperties()
         buildscol = []
@@ -156,7 +168,7 @@ class BuildsEndpoint(Db2DataMixin, base.Endpoint):
                 if filtered_properties:
                     data['properties'] = filtered_properties
             buildscol.append(data)
-        defer.returnValue(buildscol)
+        defer.returnValue(base.keepPagination(builds, buildscol))
 
 
 class Build(base.ResourceType):
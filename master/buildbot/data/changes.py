@@ -41,6 +41,23 @@ class FixerMixin(object):
             del change['sourcestampid']
         defer.returnValue(change)
 
+    @defer.inlineCallbacks
+    def _fixChanges(self, changes):
+        # like _fixChange, but getting all of the sourcestamps at once
+        ssids = sorted(set(ch['sourcestampid'] for ch in changes))
+        ssdicts = yield self.master.db.sourcestamps.getSourceStampsByIds(ssids)
+        sourcestampsbyid = dict(
+            (ssid, sourcestamps.db2data(ssdict) if ssdict else None)
+            for ssid, ssdict in zip(ssids, ssdicts))
+        fixed = []
+        for change in changes:
+            change = change.copy()
+            change['when_timestamp'] = datetime2epoch(change['when_timestamp'])
+            change['sourcestamp'] = sourcestampsbyid[
+                change.pop('sourcestampid')]
+            fixed.append(change)
+        defer.returnValue(fixed)
+
 
 class ChangeEndpoint(FixerMixin, base.Endpoint):
 
@@ -54,6 +71,10 @@ class ChangeEndpoint(FixerMixin, base.Endpoint):
         d.addCallback(self._fixChange)
         return d
 
+    def isImmutable(self, data, kwargs):
+        # changes are never modified once added
+        return True
+
 
 class ChangesEndpoint(FixerMixin, base.Endpoint):
 
@@ -64,6 +85,19 @@ class ChangesEndpoint(FixerMixin, base.Endpoint):
         /sourcestamps/n:ssid/changes
     """
     rootLinkName = 'changes'
+    fieldMapping = {
+        'changeid': 'changes.changeid',
+        'author': 'changes.author',
+        'comments': 'changes.comments',
+        'revision': 'changes.revision',
+        'when_timestamp': 'changes.when_timestamp',
+        'branch': 'changes.branch',
+        'category': 'changes.category',
+        'revlink': 'changes.revlink',
+        'repository': 'changes.repository',
+        'codebase': 'changes.codebase',
+        'project': 'changes.project',
+    }
 
     @defer.inlineCallbacks
     def get(self, resultSpec, kwargs):
@@ -78,15 +112,11 @@ class ChangesEndpoint(FixerMixin, base.Endpoint):
             else:
                 changes = []
         else:
-            # this special case is useful and implemented by the dbapi
-            # so give it a boost
-            if (resultSpec.order == ['-changeid'] and resultSpec.limit and
-                    resultSpec.offset is None):
-                changes = yield self.master.db.changes.getRecentChanges(resultSpec.limit)
-            else:
-                changes = yield self.master.db.changes.getChanges()
-        changes = [(yield self._fixChange(ch)) for ch in changes]
-        defer.returnValue(changes)
+            resultSpec.fieldMapping = self.fieldMapping
+            changes = yield self.master.db.changes.getChanges(
+                resultSpec=resultSpec)
+        defer.returnValue(base.keepPagination(
+            changes, (yield self._fixChanges(changes))))
 
 
 class Change(base.ResourceType):
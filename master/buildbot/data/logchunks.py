@@ -13,10 +13,87 @@
 #
 # Copyright Buildbot Team Members
 
+from collections import deque
+
 from twisted.internet import defer
 
 from buildbot.data import base
 from buildbot.data import types
+from buildbot.db.logs import LogsConnectorComponent
+
+
+class LiveLogTail(object):
+
+    """
+    The last lines of a log that is still being written, kept in memory so
+    that following the log does not need to go through the database.
+
+    Lines are numbered like in the database; at least C{size} characters of
+    the most recent lines are kept.  Lines too long for a database chunk are
+    truncated as the database does.
+    """
+
+    MAX_LINE_SIZE = LogsConnectorComponent.MAX_CHUNK_SIZE
+
+    def __init__(self, size, num_lines=0):
+        self.size = size
+        self.num_lines = num_lines
+        self.lines = deque()
+        self.chars = 0
+
+    @property
+    def first_line(self):
+        return self.num_lines - len(self.lines)
+
+    def append(self, content):
+        # content is newline-terminated, as given to appendLog
+        lines = content[:-1].split(u'\n')
+        # a character takes at most 4 bytes in UTF-8
+        if len(content) * 4 >= self.MAX_LINE_SIZE:
+            lines = [self._truncate(line) for line in lines]
+            self.chars += sum(len(line) + 1 for line in lines)
+        else:
+            self.chars += len(content)
+        self.lines.extend(lines)
+        self.num_lines += len(lines)
+        # len(line) + 1 accounts for the newline
+        while self.lines and self.chars - len(self.lines[0]) - 1 >= self.size:
+            self.chars -= len(self.lines.popleft()) + 1
+
+    def _truncate(self, line):
+        # keep the UTF-8 characters of the first MAX_LINE_SIZE bytes, like
+        # db.logs._splitBigChunk
+        if len(line) * 4 < self.MAX_LINE_SIZE:
+            return line
+        encoded = line.encode('utf-8')
+        if len(encoded) < self.MAX_LINE_SIZE:
+            return line
+        return encoded[:self.MAX_LINE_SIZE].decode('utf-8', 'ignore')
+
+    def getLines(self, first_line, last_line):
+        # return the lines in the given range, in the same format as
+        # db.logs.getLogLines, or None if some are not in memory anymore
+        offset = self.first_line
+        if first_line < offset:
+            return None
+        last_line = min(last_line, self.num_lines - 1)
+        if last_line < first_line:
+            return u''
+        lines = [self.lines[i]
+                 for i in range(first_line - offset, last_line - offset + 1)]
+        return u'\n'.join(lines) + u'\n'
+
+
+class LogChunkResult(dict):
+
+    """
+    The result of the log chunk endpoints, which remembers whether the log
+    was already complete when its lines were read.
+    """
+
+    def __init__(self, complete, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.complete = complete
 
 
 class LogChunkEndpointBase(base.BuildNestingMixin, base.Endpoint):
@@ -39,12 +116,19 @@ class LogChunkEndpointBase(base.BuildNestingMixin, base.Endpoint):
 
         defer.returnValue((logid, dbdict))
 
+    def isImmutable(self, data, kwargs):
+        # the contents of a finished log never change; whether the log is
+        # finished is read before its lines, as a log finishing in between
+        # would be cached with only some of its lines
+        return getattr(data, 'complete', False)
+
 
 class LogChunkEndpoint(LogChunkEndpointBase):
 
     # Note that this is a singular endpoint, even though it overrides the
     # offset/limit query params in ResultSpec
     isCollection = False
+    streamingField = 'content'
     pathPatterns = """
         /logs/n:logid/contents
         /steps/n:stepid/logs/i:log_slug/contents
@@ -64,12 +148,26 @@ class LogChunkEndpoint(LogChunkEndpointBase):
             resultSpec.limit - 1
         resultSpec.removePagination()
 
-        # get the number of lines, if necessary
-        if lastline is None:
-            if not dbdict:
-                dbdict = yield self.master.db.logs.getLog(logid)
-            if not dbdict:
+        # serve the tail of a running log from memory, if it is there
+        tail = self.rtype.liveTails.get(logid)
+        if tail is not None:
+            if lastline is None:
+                lastline = max(0, tail.num_lines - 1)
+            if firstline < 0 or lastline < 0 or firstline > lastline:
                 return
+            logLines = tail.getLines(firstline, lastline)
+            if logLines is not None:
+                # the log is still running
+                defer.returnValue(LogChunkResult(
+                    False, logid=logid, firstline=firstline,
+                    content=logLines))
+
+        # get the state of the log before its lines
+        if not dbdict:
+            dbdict = yield self.master.db.logs.getLog(logid)
+        if not dbdict:
+            return
+        if lastline is None:
             lastline = max(0, dbdict['num_lines'] - 1)
 
         # bounds checks
@@ -78,10 +176,9 @@ class LogChunkEndpoint(LogChunkEndpointBase):
 
         logLines = yield self.master.db.logs.getLogLines(
             logid, firstline, lastline)
-        defer.returnValue({
-            'logid': logid,
-            'firstline': firstline,
-            'content': logLines})
+        defer.returnValue(LogChunkResult(
+            dbdict['complete'], logid=logid, firstline=firstline,
+            content=logLines))
 
 
 class RawLogChunkEndpoint(LogChunkEndpointBase):
@@ -117,10 +214,11 @@ class RawLogChunkEndpoint(LogChunkEndpointBase):
         if dbdict['type'] == 's':
             logLines = "\n".join([line[1:] for line in logLines.splitlines()])
 
-        defer.returnValue({
-            'raw': logLines,
-            'mime-type': u'text/html' if dbdict['type'] == 'h' else u'text/plain',
-            'filename': dbdict['slug']})
+        defer.returnValue(LogChunkResult(
+            dbdict['complete'], {
+                'raw': logLines,
+                'mime-type': u'text/html' if dbdict['type'] == 'h' else u'text/plain',
+                'filename': dbdict['slug']}))
 
 
 class LogChunk(base.ResourceType):
@@ -130,8 +228,28 @@ class LogChunk(base.ResourceType):
     endpoints = [LogChunkEndpoint, RawLogChunkEndpoint]
     keyFields = ['stepid', 'logid']
 
+    # number of characters of each running log kept in memory
+    LIVE_TAIL_SIZE = 64 * 1024
+
     class EntityType(types.Entity):
         logid = types.Integer()
         firstline = types.Integer()
         content = types.String()
     entityType = EntityType(name)
+
+    def __init__(self, master):
+        base.ResourceType.__init__(self, master)
+        # logid -> LiveLogTail, for the logs written by this master that are
+        # not finished yet
+        self.liveTails = {}
+
+    def startLiveTail(self, logid):
+        self.liveTails[logid] = LiveLogTail(self.LIVE_TAIL_SIZE)
+
+    def appendToLiveTail(self, logid, content):
+        tail = self.liveTails.get(logid)
+        if tail is not None:
+            tail.append(content)
+
+    def stopLiveTail(self, logid):
+        self.liveTails.pop(logid, None)
@@ -69,21 +69,38 @@ class LogsEndpoint(EndpointMixin, base.BuildNestingMixin, base.Endpoint):
 
     isCollection = True
     pathPatterns = """
+        /logs
         /steps/n:stepid/logs
         /builds/n:buildid/steps/i:step_name/logs
         /builds/n:buildid/steps/n:step_number/logs
         /builders/n:builderid/builds/n:build_number/steps/i:step_name/logs
         /builders/n:builderid/builds/n:build_number/steps/n:step_number/logs
     """
+    fieldMapping = {
+        'logid': 'logs.id',
+        'name': 'logs.name',
+        'slug': 'logs.slug',
+        'stepid': 'logs.stepid',
+        'num_lines': 'logs.num_lines',
+        'type': 'logs.type',
+    }
 
     @defer.inlineCallbacks
     def get(self, resultSpec, kwargs):
-        stepid = yield self.getStepid(kwargs)
-        if not stepid:
-            defer.returnValue([])
-            return
-        logs = yield self.master.db.logs.getLogs(stepid=stepid)
-        defer.returnValue([(yield self.db2data(dbdict)) for dbdict in logs])
+        if kwargs:
+            stepid = yield self.getStepid(kwargs)
+            if not stepid:
+                defer.returnValue([])
+                return
+        else:
+            # /logs: the logs of all steps, usually filtered by stepid to get
+            # those of several steps at once
+            stepid = None
+        resultSpec.fieldMapping = self.fieldMapping
+        logs = yield self.master.db.logs.getLogs(stepid=stepid,
+                                                 resultSpec=resultSpec)
+        defer.returnValue(base.keepPagination(
+            logs, [(yield self.db2data(dbdict)) for dbdict in logs]))
 
 
 class Log(base.ResourceType):
@@ -124,13 +141,23 @@ class Log(base.ResourceType):
             except KeyError:
                 slug = identifiers.incrementIdentifier(50, slug)
                 continue
+            self.master.data.rtypes.logchunk.startLiveTail(logid)
             self.generateEvent(logid, "new")
             defer.returnValue(logid)
 
     @base.updateMethod
     @defer.inlineCallbacks
     def appendLog(self, logid, content):
-        res = yield self.master.db.logs.appendLog(logid=logid, content=content)
+        # the new lines can be read from memory right away; the database is
+        # only needed once they are out of the live tail
+        logchunks = self.master.data.rtypes.logchunk
+        logchunks.appendToLiveTail(logid, content)
+        try:
+            res = yield self.master.db.logs.appendLog(logid=logid, content=content)
+        except Exception:
+            # the line numbers of the tail can't be trusted anymore
+            logchunks.stopLiveTail(logid)
+            raise
         self.generateEvent(logid, "append")
         defer.returnValue(res)
 
@@ -138,6 +165,7 @@ class Log(base.ResourceType):
     @defer.inlineCallbacks
     def finishLog(self, logid):
         res = yield self.master.db.logs.finishLog(logid=logid)
+        self.master.data.rtypes.logchunk.stopLiveTail(logid)
         self.generateEvent(logid, "finished")
         defer.returnValue(res)
 
@@ -12,9 +12,13 @@
 # Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 # Copyright Buildbot Team Members
+import heapq
+
+import sqlalchemy as sa
 from future.utils import iteritems
 
 from buildbot.data import base
+from buildbot.db import NULL
 
 
 class FieldBase(object):
@@ -87,9 +91,45 @@ def nonecmp(a, b):
     return cmp(a, b)
 
 
+def _noneKey(k):
+    # a sort key for field k that, like nonecmp, puts None first
+    def key(d):
+        v = d[k]
+        return (v is not None, v)
+    return key
+
+
+class _Reversed(object):
+
+    # wraps a sort key so that it sorts in the opposite direction
+
+    __slots__ = ['key']
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __ne__(self, other):
+        return self.key != other.key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+
+_sql_operators = {
+    'lt': lambda col, v: col < v,
+    'le': lambda col, v: col <= v,
+    'gt': lambda col, v: col > v,
+    'ge': lambda col, v: col >= v,
+}
+
+
 class ResultSpec(object):
 
-    __slots__ = ['filters', 'fields', 'properties', 'order', 'limit', 'offset']
+    __slots__ = ['filters', 'fields', 'properties', 'order', 'limit', 'offset',
+                 'fieldMapping']
 
     def __init__(self, filters=None, fields=None, properties=None, order=None,
                  limit=None, offset=None):
@@ -99,6 +139,9 @@ class ResultSpec(object):
         self.order = order
         self.limit = limit
         self.offset = offset
+        # maps the fields that can be handled by the db layer to their
+        # column, as 'table.column'; set by the endpoint
+        self.fieldMapping = {}
 
     def __repr__(self):
         return "ResultSpec(**" + repr(dict(filters=self.filters, fields=self.fields, properties=self.properties,
@@ -159,6 +202,151 @@ class ResultSpec(object):
         del self.fields[i]
         return True
 
+    def _sqlColumns(self, query):
+        tables = dict((t.name, t) for t in query.locate_all_froms()
+                      if isinstance(t, sa.Table))
+        columns = {}
+        for field, name in iteritems(self.fieldMapping):
+            table, column = name.split('.')
+            if table in tables:
+                columns[field] = tables[table].c[column]
+        return columns
+
+    def _filterToSQL(self, f, col):
+        values = f.values
+        if len(values) == 1:
+            v = values[0]
+            if f.op == 'eq':
+                return col == v
+            if f.op == 'ne':
+                if v is not None and col.nullable:
+                    return sa.or_(col != v, col == NULL)
+                return col != v
+            if f.op in _sql_operators and v is not None:
+                clause = _sql_operators[f.op](col, v)
+                # like nonecmp, None is smaller than anything else
+                if col.nullable and f.op in ('lt', 'le'):
+                    clause = sa.or_(clause, col == NULL)
+                return clause
+        elif values and None not in values:
+            if f.op == 'eq':
+                return col.in_(values)
+            if f.op == 'ne':
+                if col.nullable:
+                    return sa.or_(~col.in_(values), col == NULL)
+                return ~col.in_(values)
+        # 'contains', and comparisons with None, are left to apply()
+        return None
+
+    def _orderToSQL(self, columns):
+        clauses = []
+        for k in self.order:
+            desc = k.startswith('-')
+            col = columns.get(k[1:] if desc else k)
+            if col is None:
+                return None
+            if col.nullable:
+                # like nonecmp, sort None before anything else
+                notnull = col.isnot(None)
+                clauses.append(notnull.desc() if desc else notnull.asc())
+            clauses.append(col.desc() if desc else col.asc())
+        return clauses
+
+    def applyToSQLQuery(self, query, order_by=()):
+        """
+        Apply the filters, order and pagination of this spec that can be
+        expressed in SQL to C{query}, using C{fieldMapping} to find the
+        columns.  Whatever is applied is removed from this spec, so that
+        L{apply} only handles the rest, in memory.
+
+        Pagination is only applied if every filter and the whole order could
+        be applied.  C{order_by} is the query's own order; it is used to break
+        ties, and should end with the primary key, so that pages are the same
+        from one query to the next.
+
+        Returns the new query, and a query counting its rows before
+        pagination, or None if the pagination was not applied.
+        """
+        columns = self._sqlColumns(query)
+
+        for f in self.filters[:]:
+            col = columns.get(f.field)
+            clause = self._filterToSQL(f, col) if col is not None else None
+            if clause is not None:
+                query = query.where(clause)
+                self.filters.remove(f)
+
+        order = []
+        if self.order:
+            order = self._orderToSQL(columns)
+            if order is None:
+                order = []
+            else:
+                self.order = None
+        order.extend(order_by)
+        if order:
+            query = query.order_by(*order)
+
+        count_query = None
+        if ((self.limit is not None or self.offset is not None) and
+                not self.filters and not self.order):
+            count_query = sa.select([sa.func.count()]).select_from(
+                query.order_by(None).alias('rows'))
+            if self.limit is not None:
+                query = query.limit(self.limit)
+            if self.offset is not None:
+                query = query.offset(self.offset)
+            self.removePagination()
+        return query, count_query
+
+    def thd_execute(self, conn, query, dictFromRow, order_by=()):
+        """
+        Run C{query} with as much of this spec as possible applied in SQL (see
+        L{applyToSQLQuery}), and return the list of C{dictFromRow(row)}.  If
+        the pagination was applied, this is a L{ListResult} carrying the
+        offset, limit and total number of results.
+        """
+        offset, limit = self.offset, self.limit
+        query, count_query = self.applyToSQLQuery(query, order_by)
+        rv = [dictFromRow(row) for row in conn.execute(query).fetchall()]
+        if count_query is not None:
+            total = conn.execute(count_query).scalar()
+            rv = base.ListResult(rv, offset=offset, total=total, limit=limit)
+        return rv
+
+    def _sortKeys(self):
+        # Return (field, descending) pairs for self.order
+        return [(k[1:], True) if k.startswith('-') else (k, False)
+                for k in self.order]
+
+    def _sortKey(self):
+        # Return a key function for self.order, and whether the sort should
+        # be reversed.  None sorts before anything else, as with nonecmp;
+        # when the keys do not all go in the same direction, the descending
+        # ones are wrapped in _Reversed.
+        order = self._sortKeys()
+        descending = [desc for _, desc in order]
+        if all(descending) or not any(descending):
+            if len(order) == 1:
+                return _noneKey(order[0][0]), descending[0]
+            fields = [k for k, _ in order]
+
+            def key(d):
+                return tuple((d[k] is not None, d[k]) for k in fields)
+            return key, descending[0]
+
+        def key(d):
+            return tuple(_Reversed((d[k] is not None, d[k])) if desc
+                         else (d[k] is not None, d[k])
+                         for k, desc in order)
+        return key, False
+
+    def _sort(self, data):
+        # Sort data in place; the sort is stable, so sorting on each key in
+        # turn, starting with the last one, avoids comparing _Reversed keys
+        for k, desc in reversed(self._sortKeys()):
+            data.sort(key=_noneKey(k), reverse=desc)
+
     def apply(self, data):
         if data is None:
             return data
@@ -184,18 +372,16 @@ class ResultSpec(object):
 
             # item collection
             if isinstance(data, base.ListResult):
-                # if pagination was applied, then fields, etc. must be empty
-                assert not fields and not order and not filters, \
-                    "endpoint must apply fields, order, and filters if it performs pagination"
+                # if pagination was applied, then order and filters must be
+                # empty; fields can still be selected
+                assert not order and not filters, \
+                    "endpoint must apply order and filters if it performs pagination"
                 offset, total = data.offset, data.total
                 limit = data.limit
             else:
                 offset, total = None, None
                 limit = None
 
-            if fields:
-                data = (applyFields(d) for d in data)
-
             # link the filters together and then flatten to list
             for f in self.filters:
                 data = f.apply(data)
@@ -204,31 +390,39 @@ class ResultSpec(object):
             if total is None:
                 total = len(data)
 
-            # precompute the ordering functions and sort
-            if self.order:
-                order = [(lambda a, b, k=k[1:]: nonecmp(b[k], a[k]))
-                         if k[0] == '-' else
-                         (lambda a, b, k=k: nonecmp(a[k], b[k]))
-                         for k in self.order]
-
-                def cmpFunc(a, b):
-                    for f in order:
-                        c = f(a, b)
-                        if c:
-                            return c
-                    return 0
-                data.sort(cmp=cmpFunc)
-
-            # finally, slice out the limit/offset
+            if fields and data:
+                # fields are only selected once the page is known, but
+                # filtering or sorting on fields that are not selected is
+                # still an error
+                for k in [f.field for f in filters] + [k.lstrip('-')
+                                                       for k in order or []]:
+                    if k not in fields:
+                        raise KeyError(k)
+
             if self.offset is not None or self.limit is not None:
                 if offset is not None or limit is not None:
                     raise AssertionError("endpoint must clear offset/limit")
-                end = ((self.offset or 0) + self.limit
-                       if self.limit is not None
-                       else None)
-                data = data[self.offset:end]
                 offset = self.offset
                 limit = self.limit
+                start = offset or 0
+                end = start + limit if limit is not None else None
+            else:
+                start = end = None
+
+            # sort, or only pick the smallest items if just the first page
+            # is needed, and slice out the limit/offset
+            if self.order:
+                if end is not None and end < len(data):
+                    key, reverse = self._sortKey()
+                    pick = heapq.nlargest if reverse else heapq.nsmallest
+                    data = pick(end, data, key=key)
+                else:
+                    self._sort(data)
+            if start is not None:
+                data = data[start:end]
+
+            if fields:
+                data = [applyFields(d) for d in data]
 
             rv = base.ListResult(data)
             rv.offset, rv.total = offset, total
@@ -20,7 +20,7 @@ from buildbot.data import patches
 from buildbot.data import types
 
 
-def _db2data(ss):
+def db2data(ss):
     data = {
         'ssid': ss['ssid'],
         'branch': ss['branch'],
@@ -54,7 +54,7 @@ class SourceStampEndpoint(base.Endpoint):
     def get(self, resultSpec, kwargs):
         ssdict = yield self.master.db.sourcestamps.getSourceStamp(
             kwargs['ssid'])
-        defer.returnValue(_db2data(ssdict) if ssdict else None)
+        defer.returnValue(db2data(ssdict) if ssdict else None)
 
 
 class SourceStampsEndpoint(base.Endpoint):
@@ -67,7 +67,7 @@ class SourceStampsEndpoint(base.Endpoint):
 
     @defer.inlineCallbacks
     def get(self, resultSpec, kwargs):
-        defer.returnValue([_db2data(ssdict) for ssdict in
+        defer.returnValue([db2data(ssdict) for ssdict in
                            (yield self.master.db.sourcestamps.getSourceStamps())])
 
 
@@ -74,6 +74,14 @@ class StepsEndpoint(Db2DataMixin, base.BuildNestingMixin, base.Endpoint):
         /builds/n:buildid/steps
         /builders/n:builderid/builds/n:build_number/steps
     """
+    fieldMapping = {
+        'stepid': 'steps.id',
+        'number': 'steps.number',
+        'name': 'steps.name',
+        'buildid': 'steps.buildid',
+        'state_string': 'steps.state_string',
+        'results': 'steps.results',
+    }
 
     @defer.inlineCallbacks
     def get(self, resultSpec, kwargs):
@@ -83,8 +91,11 @@ class StepsEndpoint(Db2DataMixin, base.BuildNestingMixin, base.Endpoint):
             buildid = yield self.getBuildid(kwargs)
             if buildid is None:
                 return
-        steps = yield self.master.db.steps.getSteps(buildid=buildid)
-        defer.returnValue([(yield self.db2data(dbdict)) for dbdict in steps])
+        resultSpec.fieldMapping = self.fieldMapping
+        steps = yield self.master.db.steps.getSteps(buildid=buildid,
+                                                    resultSpec=resultSpec)
+        defer.returnValue(base.keepPagination(
+            steps, [(yield self.db2data(dbdict)) for dbdict in steps]))
 
 
 class Step(base.ResourceType):
@@ -17,6 +17,8 @@ import hashlib
 import itertools
 
 import sqlalchemy as sa
+from future.utils import iteritems
+from twisted.internet import defer
 
 
 class DBConnectorComponent(object):
@@ -98,6 +100,29 @@ class DBConnectorComponent(object):
 
         return hashlib.sha1('\0'.join(map(encode, args))).hexdigest()
 
+    def getManyCached(self, cachedMethod, keys, thd_fetch):
+        # Return the results of the @cached method cachedMethod for each of
+        # keys, via Deferred.  The keys that are not in the cache are fetched
+        # all at once, with thd_fetch(conn, keys) returning a dictionary of
+        # the values that exist, and added to the cache.
+        cache = cachedMethod.cache
+        keys = list(keys)
+        missing = set(k for k in keys if k not in cache)
+        if missing:
+            d = self.db.pool.do(thd_fetch, sorted(missing))
+        else:
+            d = defer.succeed({})
+
+        @d.addCallback
+        def collect(fetched):
+            for k, v in iteritems(fetched):
+                cache.put(k, v)
+            return defer.gatherResults([
+                defer.succeed(fetched.get(k)) if k in missing
+                else cachedMethod(k)
+                for k in keys])
+        return d
+
     def doBatch(self, batch, batch_n=500):
         iterator = iter(batch)
         while True:
@@ -77,7 +77,7 @@ class BuildRequestsConnectorComponent(base.DBConnectorComponent):
         return self.db.pool.do(thd)
 
     def getBuildRequests(self, builderid=None, complete=None, claimed=None,
-                         bsid=None, branch=None, repository=None):
+                         bsid=None, branch=None, repository=None, resultSpec=None):
         def thd(conn):
             reqs_tbl = self.db.model.buildrequests
             claims_tbl = self.db.model.buildrequest_claims
@@ -110,10 +110,15 @@ class BuildRequestsConnectorComponent(base.DBConnectorComponent):
             if repository is not None:
                 q = q.where(sstamps_tbl.c.repository == repository)
 
+            def dictFromRow(row):
+                return self._brdictFromRow(row, self.db.master.masterid)
+            if resultSpec is not None:
+                return resultSpec.thd_execute(conn, q, dictFromRow,
+                                              order_by=[reqs_tbl.c.id])
+
             res = conn.execute(q)
 
-            return [self._brdictFromRow(row, self.db.master.masterid)
-                    for row in res.fetchall()]
+            return [dictFromRow(row) for row in res.fetchall()]
         return self.db.pool.do(thd)
 
     def claimBuildRequests(self, brids, claimed_at=None, _reactor=reactor):
@@ -92,7 +92,8 @@ class BuildsConnectorComponent(base.DBConnectorComponent):
 
         defer.returnValue(rv)
 
-    def getBuilds(self, builderid=None, buildrequestid=None, workerid=None, complete=None):
+    def getBuilds(self, builderid=None, buildrequestid=None, workerid=None, complete=None,
+                  resultSpec=None):
         def thd(conn):
             tbl = self.db.model.builds
             q = tbl.select()
@@ -107,6 +108,9 @@ class BuildsConnectorComponent(base.DBConnectorComponent):
                     q = q.where(tbl.c.complete_at != NULL)
                 else:
                     q = q.where(tbl.c.complete_at == NULL)
+            if resultSpec is not None:
+                return resultSpec.thd_execute(conn, q, self._builddictFromRow,
+                                              order_by=[tbl.c.id])
             res = conn.execute(q)
             return [self._builddictFromRow(row) for row in res.fetchall()]
         return self.db.pool.do(thd)
@@ -156,6 +156,19 @@ class BuildsetsConnectorComponent(base.DBConnectorComponent):
             return self._thd_row2dict(conn, row)
         return self.db.pool.do(thd)
 
+    def getSourceStampIdsForBuildsets(self, bsids):
+        def thd(conn):
+            tbl = self.db.model.buildset_sourcestamps
+            rv = dict((bsid, []) for bsid in bsids)
+            for batch in self.doBatch(bsids, 100):
+                q = sa.select([tbl.c.buildsetid, tbl.c.sourcestampid],
+                              whereclause=tbl.c.buildsetid.in_(batch))
+                q = q.order_by(tbl.c.id)
+                for row in conn.execute(q).fetchall():
+                    rv[row.buildsetid].append(row.sourcestampid)
+            return rv
+        return self.db.pool.do(thd)
+
     def getBuildsets(self, complete=None):
         def thd(conn):
             bs_tbl = self.db.model.buildsets
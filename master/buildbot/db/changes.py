@@ -16,6 +16,8 @@
 """
 Support for changes in the database
 """
+import re
+
 import sqlalchemy as sa
 from future.utils import iteritems
 from future.utils import itervalues
@@ -23,6 +25,7 @@ from twisted.internet import defer
 from twisted.internet import reactor
 from twisted.python import log
 
+from buildbot.data.base import keepPagination
 from buildbot.db import base
 from buildbot.util import datetime2epoch
 from buildbot.util import epoch2datetime
@@ -36,6 +39,10 @@ class ChDict(dict):
 class ChangesConnectorComponent(base.DBConnectorComponent):
     # Documentation is in developer/db.rst
 
+    # when the database can't follow the parents of a change with a recursive
+    # query, they are read this many at a time
+    PARENT_WALK_BATCH_SIZE = 100
+
     def getParentChangeIds(self, branch, repository, project, codebase):
         def thd(conn):
             changes_tbl = self.db.model.changes
@@ -166,6 +173,20 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
 
         return self.db.pool.do(thd)
 
+    def getChangesByIds(self, changeids):
+        return self.getManyCached(self.getChange, changeids,
+                                  self._thdGetChangesByIds)
+
+    def _thdGetChangesByIds(self, conn, changeids):
+        changes_tbl = self.db.model.changes
+        rows = []
+        for batch in self.doBatch(changeids, 100):
+            q = changes_tbl.select(
+                whereclause=changes_tbl.c.changeid.in_(batch))
+            rows.extend(conn.execute(q).fetchall())
+        return dict((chdict['changeid'], chdict) for chdict in
+                    self._chdicts_from_change_rows_thd(conn, rows))
+
     @defer.inlineCallbacks
     def getChangesForBuild(self, buildid):
         assert buildid > 0
@@ -197,18 +218,108 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
             # Careful; toChanges[cb] may be None from getChangeFromSSid
             toCbChange = toChanges.get(cb) or {}
             if change and change['changeid'] != toCbChange.get('changeid'):
+                changeids = yield self._getChangeChain(
+                    change['changeid'], toCbChange.get('changeid'))
                 changes.append(change)
-                while ((toChanges.get(cb, {}).get('changeid') not in change['parent_changeids']) and
-                       change['parent_changeids']):
-                    # For the moment, a Change only have 1 parent.
-                    change = yield self.master.db.changes.getChange(change['parent_changeids'][0])
-                    # http://trac.buildbot.net/ticket/3461 sometimes,
-                    # parent_changeids could be corrupted
-                    if change is None:
-                        break
-                    changes.append(change)
+                parents = yield self.getChangesByIds(changeids[1:])
+                changes.extend(ch for ch in parents if ch is not None)
         defer.returnValue(changes)
 
+    def _getChangeChain(self, changeid, stopid):
+        """
+        Return the ids of the change CHANGEID and of its ancestors, following
+        parent_changeids until the parent is STOPID, or is missing.  This is
+        done with a single recursive query if the database supports it.
+        """
+        def thd(conn):
+            if self._thdSupportsRecursiveQueries(conn):
+                parents = self._thdGetParentsRecursive(conn, changeid, stopid)
+            else:
+                parents = self._thdGetParentsBatched(conn, changeid, stopid)
+
+            chain = []
+            seen = set()
+            current = changeid
+            # http://trac.buildbot.net/ticket/3461 sometimes, parent_changeids
+            # could be corrupted: stop at missing changes, and at loops
+            while current in parents and current not in seen:
+                chain.append(current)
+                seen.add(current)
+                # For the moment, a Change only have 1 parent.
+                current = parents[current]
+                if current is None or current == stopid:
+                    break
+            return chain
+        return self.db.pool.do(thd)
+
+    def _thdSupportsRecursiveQueries(self, conn):
+        dialect = conn.dialect
+        version = dialect.server_version_info or ()
+        if dialect.name == 'sqlite':
+            return version >= (3, 8, 3)
+        if dialect.name == 'postgresql':
+            return version >= (8, 4)
+        if dialect.name == 'mysql':
+            # the parsed server_version_info does not reliably say whether
+            # this is MariaDB, so look at the raw version string instead
+            raw = conn.execute(sa.text('SELECT VERSION()')).scalar() or ''
+            mariadb = re.search(r'(\d+)\.(\d+)\.\d+-MariaDB', raw)
+            if mariadb:
+                return tuple(int(v) for v in mariadb.groups()) >= (10, 2)
+            return version >= (8, 0)
+        return False
+
+    def _thdGetParentsRecursive(self, conn, changeid, stopid):
+        # returns {changeid: parent changeid} for the whole chain
+        tbl = self.db.model.changes
+        chain = sa.select([tbl.c.changeid, tbl.c.parent_changeids],
+                          whereclause=(tbl.c.changeid == changeid))
+        chain = chain.cte('chain', recursive=True)
+        parents = tbl.alias('parents')
+        q = sa.select([parents.c.changeid, parents.c.parent_changeids],
+                      whereclause=(parents.c.changeid ==
+                                   chain.c.parent_changeids))
+        if stopid is not None:
+            q = q.where(chain.c.parent_changeids != stopid)
+        # UNION, rather than UNION ALL, stops at loops
+        chain = chain.union(q)
+        res = conn.execute(sa.select([chain.c.changeid,
+                                      chain.c.parent_changeids]))
+        # python2's sqlite3 does not describe the columns of an empty result
+        # if the query does not start with SELECT
+        if not res.returns_rows:
+            return {}
+        return dict((row.changeid, row.parent_changeids) for row in res)
+
+    def _thdGetParentsBatched(self, conn, changeid, stopid):
+        # returns {changeid: parent changeid} for the whole chain; the
+        # parents of a change are older changes of the same branch, so the
+        # chain is read a batch of those at a time
+        tbl = self.db.model.changes
+        parents = {}
+        seen = set()
+        current = changeid
+        while current is not None and current != stopid and current not in seen:
+            if current not in parents:
+                row = conn.execute(tbl.select(
+                    whereclause=(tbl.c.changeid == current))).fetchone()
+                if not row:
+                    break
+                q = sa.select([tbl.c.changeid, tbl.c.parent_changeids],
+                              whereclause=((tbl.c.branch == row.branch) &
+                                           (tbl.c.repository == row.repository) &
+                                           (tbl.c.project == row.project) &
+                                           (tbl.c.codebase == row.codebase) &
+                                           (tbl.c.changeid <= current)),
+                              order_by=sa.desc(tbl.c.changeid),
+                              limit=self.PARENT_WALK_BATCH_SIZE)
+                for r in conn.execute(q):
+                    parents[r.changeid] = r.parent_changeids
+                parents[row.changeid] = row.parent_changeids
+            seen.add(current)
+            current = parents[current]
+        return parents
+
     def getChangeFromSSid(self, sourcestampid):
         assert sourcestampid >= 0
 
@@ -253,17 +364,18 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
         d = self.db.pool.do(thd)
 
         # then turn those into changes, using the cache
-        @d.addCallback
-        def get_changes(changeids):
-            return defer.gatherResults([self.getChange(changeid)
-                                        for changeid in changeids])
+        d.addCallback(self.getChangesByIds)
         return d
 
-    def getChanges(self):
+    def getChanges(self, resultSpec=None):
         def thd(conn):
             # get the changeids from the 'changes' table
             changes_tbl = self.db.model.changes
             q = sa.select([changes_tbl.c.changeid])
+            if resultSpec is not None:
+                return resultSpec.thd_execute(conn, q,
+                                              lambda row: row.changeid,
+                                              order_by=[changes_tbl.c.changeid])
             rp = conn.execute(q)
             changeids = [row.changeid for row in rp]
             rp.close()
@@ -273,8 +385,9 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
         # then turn those into changes, using the cache
         @d.addCallback
         def get_changes(changeids):
-            return defer.gatherResults([self.getChange(changeid)
-                                        for changeid in changeids])
+            d = self.getChangesByIds(changeids)
+            d.addCallback(lambda chdicts: keepPagination(changeids, chdicts))
+            return d
         return d
 
     def getChangesCount(self):
@@ -339,36 +452,39 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
     def _chdict_from_change_row_thd(self, conn, ch_row):
         # This method must be run in a db.pool thread, and returns a chdict
         # given a row from the 'changes' table
+        return self._chdicts_from_change_rows_thd(conn, [ch_row])[0]
+
+    def _chdicts_from_change_rows_thd(self, conn, ch_rows):
+        # This method must be run in a db.pool thread, and returns the
+        # chdicts of rows from the 'changes' table, fetching their files and
+        # properties with a few queries
         change_files_tbl = self.db.model.change_files
         change_properties_tbl = self.db.model.change_properties
 
-        if ch_row.parent_changeids:
-            parent_changeids = [ch_row.parent_changeids]
-        else:
-            parent_changeids = []
-
-        chdict = ChDict(
-            changeid=ch_row.changeid,
-            parent_changeids=parent_changeids,
-            author=ch_row.author,
-            files=[],  # see below
-            comments=ch_row.comments,
-            revision=ch_row.revision,
-            when_timestamp=epoch2datetime(ch_row.when_timestamp),
-            branch=ch_row.branch,
-            category=ch_row.category,
-            revlink=ch_row.revlink,
-            properties={},  # see below
-            repository=ch_row.repository,
-            codebase=ch_row.codebase,
-            project=ch_row.project,
-            sourcestampid=int(ch_row.sourcestampid))
-
-        query = change_files_tbl.select(
-            whereclause=(change_files_tbl.c.changeid == ch_row.changeid))
-        rows = conn.execute(query)
-        for r in rows:
-            chdict['files'].append(r.filename)
+        chdicts = []
+        for ch_row in ch_rows:
+            if ch_row.parent_changeids:
+                parent_changeids = [ch_row.parent_changeids]
+            else:
+                parent_changeids = []
+
+            chdicts.append(ChDict(
+                changeid=ch_row.changeid,
+                parent_changeids=parent_changeids,
+                author=ch_row.author,
+                files=[],  # see below
+                comments=ch_row.comments,
+                revision=ch_row.revision,
+                when_timestamp=epoch2datetime(ch_row.when_timestamp),
+                branch=ch_row.branch,
+                category=ch_row.category,
+                revlink=ch_row.revlink,
+                properties={},  # see below
+                repository=ch_row.repository,
+                codebase=ch_row.codebase,
+                project=ch_row.project,
+                sourcestampid=int(ch_row.sourcestampid)))
+        byid = dict((chdict['changeid'], chdict) for chdict in chdicts)
 
         # and properties must be given without a source, so strip that, but
         # be flexible in case users have used a development version where the
@@ -382,14 +498,21 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
                 v, s = vs, "Change"
             return v, s
 
-        query = change_properties_tbl.select(
-            whereclause=(change_properties_tbl.c.changeid == ch_row.changeid))
-        rows = conn.execute(query)
-        for r in rows:
-            try:
-                v, s = split_vs(json.loads(r.property_value))
-                chdict['properties'][r.property_name] = (v, s)
-            except ValueError:
-                pass
-
-        return chdict
+        for batch in self.doBatch(list(byid), 100):
+            query = change_files_tbl.select(
+                whereclause=(change_files_tbl.c.changeid.in_(batch)))
+            rows = conn.execute(query)
+            for r in rows:
+                byid[r.changeid]['files'].append(r.filename)
+
+            query = change_properties_tbl.select(
+                whereclause=(change_properties_tbl.c.changeid.in_(batch)))
+            rows = conn.execute(query)
+            for r in rows:
+                try:
+                    v, s = split_vs(json.loads(r.property_value))
+                    byid[r.changeid]['properties'][r.property_name] = (v, s)
+                except ValueError:
+                    pass
+
+        return chdicts
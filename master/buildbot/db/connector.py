@@ -119,8 +119,11 @@ class DBConnector(WorkerAPICompatMixin, service.ReconfigurableServiceMixin,
         # set up the engine and pool
         self._engine = enginestrategy.create_engine(db_url,
                                                     basedir=self.basedir)
+        db_config = self.master.config.db
         self.pool = pool.DBThreadPool(
-            self._engine, reactor=self.master.reactor, verbose=verbose)
+            self._engine, reactor=self.master.reactor, verbose=verbose,
+            min_size=db_config.get('db_pool_min', 1),
+            max_size=db_config.get('db_pool_max'))
 
         # make sure the db is up to date, unless specifically asked not to
         if check_version:
@@ -134,9 +137,19 @@ class DBConnector(WorkerAPICompatMixin, service.ReconfigurableServiceMixin,
         # double-check -- the master ensures this in config checks
         assert self.configured_url == new_config.db['db_url']
 
+        if self.pool is not None:
+            self.pool.setPoolSize(min_size=new_config.db.get('db_pool_min', 1),
+                                  max_size=new_config.db.get('db_pool_max'))
+
         return service.ReconfigurableServiceMixin.reconfigServiceWithBuildbotConfig(self,
                                                                                     new_config)
 
+    @defer.inlineCallbacks
+    def stopService(self):
+        # write the log appends held back by c['logAppendDelay']
+        yield self.logs.flushAppends()
+        yield service.AsyncMultiService.stopService(self)
+
     def _doCleanup(self):
         """
         Perform any periodic database cleanup tasks.
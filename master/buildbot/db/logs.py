@@ -12,17 +12,22 @@
 # Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 # Copyright Buildbot Team Members
+import threading
+
 import sqlalchemy as sa
+from future.utils import iteritems
 from future.utils import itervalues
 from twisted.internet import defer
+from twisted.python import failure
 from twisted.python import log
 
 from buildbot.db import base
+from buildbot.util import lru
 
 
-def dumps_gzip(data):
+def dumps_gzip(data, level=9):
     import zlib
-    return zlib.compress(data, 9)
+    return zlib.compress(data, level)
 
 
 def read_gzip(data):
@@ -30,7 +35,7 @@ def read_gzip(data):
     return zlib.decompress(data)
 
 
-def dumps_lz4(data):
+def dumps_lz4(data, level=None):
     import lz4
     return lz4.dumps(data)
 
@@ -40,9 +45,9 @@ def read_lz4(data):
     return lz4.loads(data)
 
 
-def dumps_bz2(data):
+def dumps_bz2(data, level=9):
     import bz2
-    return bz2.compress(data, 9)
+    return bz2.compress(data, level)
 
 
 def read_bz2(data):
@@ -50,19 +55,153 @@ def read_bz2(data):
     return bz2.decompress(data)
 
 
+def dumps_zstd(data, level=3, dictionary=None):
+    import zstandard
+    if dictionary is None:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return zstandard.ZstdCompressor(level=level,
+                                    dict_data=dictionary).compress(data)
+
+
+def read_zstd(data, dictionary=None):
+    import zstandard
+    if dictionary is None:
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(data)
+
+
+def zstd_dictionary_id(data):
+    import zstandard
+    return zstandard.get_frame_parameters(data).dict_id
+
+
+class LogChunkIndex(object):
+
+    """
+    The decoded content of a single log chunk, along with the offset at which
+    each of its lines starts, so that any range of lines can be sliced out
+    without scanning the content again.
+    """
+
+    __slots__ = ('content', 'offsets', '__weakref__')
+
+    def __init__(self, content):
+        self.content = content
+        offsets = [0]
+        append = offsets.append
+        offset = 0
+        for line in content.split(u'\n'):
+            offset += len(line) + 1
+            append(offset)
+        # the last entry points past the end of the content
+        offsets.pop()
+        self.offsets = offsets
+
+    def getLines(self, first, last):
+        """
+        Return lines FIRST through LAST (inclusive, relative to the beginning
+        of the chunk), without a trailing newline.
+        """
+        offsets = self.offsets
+        start = offsets[first]
+        if last + 1 < len(offsets):
+            return self.content[start:offsets[last + 1] - 1]
+        return self.content[start:]
+
+
 class LogsConnectorComponent(base.DBConnectorComponent):
 
     # Postgres and MySQL will both allow bigger sizes than this.  The limit
     # for MySQL appears to be max_packet_size (default 1M).
     MAX_CHUNK_SIZE = 65536
-    COMPRESSION_MODE = {"raw": {"id": 0, "dumps": lambda x: x, "read": lambda x: x},
+    COMPRESSION_MODE = {"raw": {"id": 0, "dumps": lambda x, level=None: x, "read": lambda x: x},
                         "gz": {"id": 1, "dumps": dumps_gzip, "read": read_gzip},
                         "bz2": {"id": 2, "dumps": dumps_bz2, "read": read_bz2},
-                        "lz4": {"id": 3, "dumps": dumps_lz4, "read": read_lz4}}
+                        "lz4": {"id": 3, "dumps": dumps_lz4, "read": read_lz4},
+                        "zstd": {"id": 4, "dumps": dumps_zstd, "read": read_zstd}}
     COMPRESSION_BYID = dict((x["id"], x) for x in itervalues(COMPRESSION_MODE))
+    # chunks compressed with zstd and a builder's trained dictionary; the
+    # frame header carries the dictionary's ID (see _thdGetDictionary)
+    ZSTD_DICTIONARY_ID = 5
+    # zstd reserves dictionary IDs below this value for public dictionaries;
+    # a log_dictionaries row with id N is stored as dictionary N + this value
+    ZSTD_DICTIONARY_ID_BASE = 32768
+    # training parameters for per-builder dictionaries: a dictionary is
+    # trained from the first finished log of a builder with at least
+    # DICTIONARY_MIN_SAMPLES bytes of content, using at most
+    # DICTIONARY_MAX_SAMPLES bytes of it in pieces of DICTIONARY_SAMPLE_SIZE
+    DICTIONARY_SIZE = 32 * 1024
+    DICTIONARY_SAMPLE_SIZE = 4 * 1024
+    DICTIONARY_MIN_SAMPLES = 256 * 1024
+    DICTIONARY_MAX_SAMPLES = 4 * 1024 * 1024
+    # number of decoded chunks (and their line offsets) kept in memory, so
+    # that paging through a big log does not decompress and rescan the same
+    # chunk on every request
+    CHUNK_INDEX_CACHE_SIZE = 32
+    # compressLog reads this many chunks per query, and swaps this many
+    # merged chunks per transaction, so that its memory use does not depend
+    # on the size of the log
+    COMPRESS_PAGE_SIZE = 16
+    COMPRESS_BATCH_SIZE = 16
+    # when c['logAppendDelay'] is set, pending appends are written as soon as
+    # they add up to this many characters, even before the delay expires
+    APPEND_FLUSH_SIZE = 16 * MAX_CHUNK_SIZE
     total_raw_bytes = 0
     total_compressed_bytes = 0
 
+    def __init__(self, connector):
+        base.DBConnectorComponent.__init__(self, connector)
+        # the cache is shared by all of the pool threads
+        self._chunkIndexLock = threading.Lock()
+        self._chunkIndexCache = lru.LRUCache(lambda key: None,
+                                             self.CHUNK_INDEX_CACHE_SIZE)
+        # write-behind state for appendLog; see _flushAppends
+        self._pendingAppends = []
+        self._pendingAppendBytes = 0
+        self._pendingAppendWaiters = []
+        self._flushingAppends = None
+        self._flushingAppendWaiters = []
+        self._appendFlushTimer = None
+        # zstd dictionaries, by zstd dictionary ID, shared by the pool threads
+        self._dictionaryLock = threading.Lock()
+        self._dictionaries = {}
+
+    def _thdGetChunkIndexes(self, conn, logid, rows):
+        # a chunk's line range uniquely identifies its content: lines are
+        # never rewritten, only regrouped into different chunks by
+        # compressLog, so no invalidation is needed.  Only the chunks that
+        # are not already indexed are fetched from the database.  Returns
+        # None if compressLog regrouped some of ROWS in the meantime, in
+        # which case the chunks must be listed again.
+        keys = [(logid, row.first_line, row.last_line) for row in rows]
+        with self._chunkIndexLock:
+            indexes = [self._chunkIndexCache.get(key) for key in keys]
+        missing = [key[1] for key, index in zip(keys, indexes)
+                   if index is None]
+        if not missing:
+            return indexes
+
+        tbl = self.db.model.logchunks
+        fetched = {}
+        for batch in self.doBatch(missing, 100):
+            q = sa.select([tbl.c.first_line, tbl.c.last_line,
+                           tbl.c.content, tbl.c.compressed])
+            q = q.where(tbl.c.logid == logid)
+            q = q.where(tbl.c.first_line.in_(batch))
+            for row in conn.execute(q):
+                data = self._thdDecompress(conn, row.compressed, row.content)
+                fetched[(logid, row.first_line, row.last_line)] = \
+                    LogChunkIndex(data.decode('utf-8'))
+
+        with self._chunkIndexLock:
+            for key, index in iteritems(fetched):
+                self._chunkIndexCache.put(key, index)
+        if any(index is None and key not in fetched
+               for key, index in zip(keys, indexes)):
+            return None
+        return [index if index is not None else fetched[key]
+                for key, index in zip(keys, indexes)]
+
     def _getLog(self, whereclause):
         def thd(conn):
             q = self.db.model.logs.select(whereclause=whereclause)
@@ -83,12 +222,15 @@ class LogsConnectorComponent(base.DBConnectorComponent):
         tbl = self.db.model.logs
         return self._getLog((tbl.c.slug == slug) & (tbl.c.stepid == stepid))
 
-    def getLogs(self, stepid=None):
+    def getLogs(self, stepid=None, resultSpec=None):
         def thd(conn):
             tbl = self.db.model.logs
             q = tbl.select()
             if stepid is not None:
                 q = q.where(tbl.c.stepid == stepid)
+            if resultSpec is not None:
+                return resultSpec.thd_execute(conn, q, self._logdictFromRow,
+                                              order_by=[tbl.c.id])
             q = q.order_by(tbl.c.id)
             res = conn.execute(q)
             return [self._logdictFromRow(row) for row in res.fetchall()]
@@ -98,32 +240,24 @@ class LogsConnectorComponent(base.DBConnectorComponent):
         def thd(conn):
             # get a set of chunks that completely cover the requested range
             tbl = self.db.model.logchunks
-            q = sa.select([tbl.c.first_line, tbl.c.last_line,
-                           tbl.c.content, tbl.c.compressed])
+            q = sa.select([tbl.c.first_line, tbl.c.last_line])
             q = q.where(tbl.c.logid == logid)
             q = q.where(tbl.c.first_line <= last_line)
             q = q.where(tbl.c.last_line >= first_line)
             q = q.order_by(tbl.c.first_line)
+            indexes = None
+            while indexes is None:
+                rows = conn.execute(q).fetchall()
+                indexes = self._thdGetChunkIndexes(conn, logid, rows)
             rv = []
-            for row in conn.execute(q):
-                # Retrieve associated "reader" and extract the data
-                data = self.COMPRESSION_BYID[
-                    row.compressed]["read"](row.content)
-                content = data.decode('utf-8')
-
-                if row.first_line < first_line:
-                    idx = -1
-                    count = first_line - row.first_line
-                    for _ in xrange(count):
-                        idx = content.index('\n', idx + 1)
-                    content = content[idx + 1:]
-                if row.last_line > last_line:
-                    idx = len(content) + 1
-                    count = row.last_line - last_line
-                    for _ in xrange(count):
-                        idx = content.rindex('\n', 0, idx)
-                    content = content[:idx]
-                rv.append(content)
+            for row, index in zip(rows, indexes):
+                if row.first_line >= first_line and row.last_line <= last_line:
+                    rv.append(index.content)
+                    continue
+                # jump straight to the requested lines within the chunk
+                rv.append(index.getLines(
+                    max(first_line, row.first_line) - row.first_line,
+                    min(last_line, row.last_line) - row.first_line))
             return u'\n'.join(rv) + u'\n' if rv else u''
         return self.db.pool.do(thd)
 
@@ -141,7 +275,7 @@ class LogsConnectorComponent(base.DBConnectorComponent):
                     "log with slug '%r' already exists in this step" % (slug,))
         return self.db.pool.do(thd)
 
-    def thdCompressChunk(self, chunk):
+    def thdCompressChunk(self, chunk, dictionary=None):
         # Set the default compressed mode to "raw" id
         compressed_id = self.COMPRESSION_MODE["raw"]["id"]
         self.total_raw_bytes += len(chunk)
@@ -149,17 +283,119 @@ class LogsConnectorComponent(base.DBConnectorComponent):
         if self.master.config.logCompressionMethod != "raw":
             compressed_mode = self.COMPRESSION_MODE[
                 self.master.config.logCompressionMethod]
-            compressed_chunk = compressed_mode["dumps"](chunk)
+            kwargs = {}
+            if self.master.config.logCompressionLevel is not None:
+                kwargs['level'] = self.master.config.logCompressionLevel
+            if dictionary is not None:
+                kwargs['dictionary'] = dictionary
+            compressed_chunk = compressed_mode["dumps"](chunk, **kwargs)
             # Is it useful to compress the chunk?
             if len(chunk) > len(compressed_chunk):
                 compressed_id = compressed_mode["id"]
+                if dictionary is not None:
+                    compressed_id = self.ZSTD_DICTIONARY_ID
                 chunk = compressed_chunk
         self.total_compressed_bytes += len(chunk)
         return chunk, compressed_id
 
-    def thdSplitAndAppendChunk(self, conn, logid, content, first_line):
+    def _thdDecompress(self, conn, compressed_id, content):
+        if compressed_id == self.ZSTD_DICTIONARY_ID:
+            dictionary = self._thdGetDictionary(
+                conn, zstd_dictionary_id(content))
+            return read_zstd(content, dictionary)
+        return self.COMPRESSION_BYID[compressed_id]["read"](content)
+
+    def _thdGetDictionary(self, conn, dict_id):
+        # dictionaries are never modified once stored, so they can be cached
+        # for the lifetime of the master
+        with self._dictionaryLock:
+            if dict_id in self._dictionaries:
+                return self._dictionaries[dict_id]
+        import zstandard
+        tbl = self.db.model.log_dictionaries
+        q = sa.select([tbl.c.content])
+        q = q.where(tbl.c.id == dict_id - self.ZSTD_DICTIONARY_ID_BASE)
+        res = conn.execute(q)
+        row = res.fetchone()
+        res.close()
+        if not row:
+            raise RuntimeError("missing zstd dictionary %d" % (dict_id,))
+        dictionary = zstandard.ZstdCompressionDict(row.content)
+        with self._dictionaryLock:
+            self._dictionaries[dict_id] = dictionary
+        return dictionary
+
+    def _thdGetBuilderDictionary(self, conn, logid, samples):
+        """
+        Return the zstd dictionary to compress the given log with: the
+        latest dictionary of the log's builder, or a new one trained from
+        SAMPLES (an iterable of byte strings) if the builder has none.
+        Returns None if there is not enough data to train a dictionary.
+        """
+        import zstandard
+        logs_tbl = self.db.model.logs
+        steps_tbl = self.db.model.steps
+        builds_tbl = self.db.model.builds
+        q = sa.select([builds_tbl.c.builderid])
+        q = q.where(logs_tbl.c.id == logid)
+        q = q.where(steps_tbl.c.id == logs_tbl.c.stepid)
+        q = q.where(builds_tbl.c.id == steps_tbl.c.buildid)
+        res = conn.execute(q)
+        row = res.fetchone()
+        res.close()
+        if not row:
+            return None
+        builderid = row.builderid
+
+        tbl = self.db.model.log_dictionaries
+        q = sa.select([sa.func.max(tbl.c.id)])
+        q = q.where(tbl.c.builderid == builderid)
+        dictid = conn.execute(q).scalar()
+        if dictid is not None:
+            return self._thdGetDictionary(
+                conn, dictid + self.ZSTD_DICTIONARY_ID_BASE)
+
+        pieces = []
+        size = 0
+        for sample in samples:
+            for i in range(0, len(sample), self.DICTIONARY_SAMPLE_SIZE):
+                pieces.append(sample[i:i + self.DICTIONARY_SAMPLE_SIZE])
+            size += len(sample)
+            if size >= self.DICTIONARY_MAX_SAMPLES:
+                break
+        if size < self.DICTIONARY_MIN_SAMPLES:
+            return None
+
+        # the dictionary ID is embedded in the trained dictionary, so the row
+        # is inserted first to allocate it
+        transaction = conn.begin()
+        try:
+            r = conn.execute(tbl.insert(), dict(builderid=builderid,
+                                                content=b''))
+            dictid = r.inserted_primary_key[0]
+            try:
+                dictionary = zstandard.train_dictionary(
+                    self.DICTIONARY_SIZE, pieces, k=1024, d=8,
+                    dict_id=dictid + self.ZSTD_DICTIONARY_ID_BASE)
+            except zstandard.ZstdError as e:
+                log.msg("could not train a log dictionary for builder %d: %s"
+                        % (builderid, e))
+                transaction.rollback()
+                return None
+            conn.execute(tbl.update(whereclause=(tbl.c.id == dictid)),
+                         content=dictionary.as_bytes())
+        except Exception:
+            transaction.rollback()
+            raise
+        transaction.commit()
+        with self._dictionaryLock:
+            self._dictionaries[dictionary.dict_id()] = dictionary
+        return dictionary
+
+    def _splitChunkRows(self, logid, content, first_line):
         # Break the content up into chunks.  This takes advantage of the
         # fact that no character but u'\n' maps to b'\n' in UTF-8.
+        rows = []
         remaining = content
         chunk_first_line = last_line = first_line
         while remaining:
@@ -167,12 +403,16 @@ class LogsConnectorComponent(base.DBConnectorComponent):
             last_line = chunk_first_line + chunk.count('\n')
 
             chunk, compressed_id = self.thdCompressChunk(chunk)
-            conn.execute(self.db.model.logchunks.insert(),
-                         dict(logid=logid, first_line=chunk_first_line,
-                              last_line=last_line, content=chunk,
-                              compressed=compressed_id))
+            rows.append(dict(logid=logid, first_line=chunk_first_line,
+                             last_line=last_line, content=chunk,
+                             compressed=compressed_id))
             chunk_first_line = last_line + 1
+        return rows, last_line
 
+    def thdSplitAndAppendChunk(self, conn, logid, content, first_line):
+        rows, last_line = self._splitChunkRows(logid, content, first_line)
+        if rows:
+            conn.execute(self.db.model.logchunks.insert(), rows)
         conn.execute(self.db.model.logs.update(whereclause=(self.db.model.logs.c.id == logid)),
                      num_lines=last_line + 1)
         return first_line, last_line
@@ -195,11 +435,152 @@ class LogsConnectorComponent(base.DBConnectorComponent):
                                            content=content.encode('utf-8'),
                                            first_line=row[0])
 
+    def thdAppendLogs(self, conn, appends):
+        """
+        Append several (logid, content) pairs at once, in order, using a
+        single query to look up the logs, a single multi-row insert for all
+        of the new chunks, and one update per log.  Returns the (first_line,
+        last_line) tuple for each append, or None for a missing log.
+        """
+        tbl = self.db.model.logs
+        num_lines = {}
+        logids = list(set(logid for logid, _ in appends))
+        for batch in self.doBatch(logids, 100):
+            q = sa.select([tbl.c.id, tbl.c.num_lines])
+            q = q.where(tbl.c.id.in_(batch))
+            for row in conn.execute(q):
+                num_lines[row.id] = row.num_lines
+
+        # consecutive appends to the same log are stored as one piece of
+        # content, so they share chunks
+        results = []
+        first_lines = {}
+        contents = {}
+        for logid, content in appends:
+            if logid not in num_lines:
+                results.append(None)  # ignore a missing log
+                continue
+            assert content[-1] == u'\n'
+            first_line = num_lines[logid]
+            first_lines.setdefault(logid, first_line)
+            num_lines[logid] = first_line + content.count(u'\n')
+            results.append((first_line, num_lines[logid] - 1))
+            contents.setdefault(logid, []).append(content)
+
+        rows = []
+        for logid, content in iteritems(contents):
+            # chunks omit the trailing newline
+            content = u''.join(content)[:-1].encode('utf-8')
+            rows.extend(self._splitChunkRows(
+                logid, content, first_lines[logid])[0])
+
+        transaction = conn.begin()
+        try:
+            if rows:
+                conn.execute(self.db.model.logchunks.insert(), rows)
+            for logid in contents:
+                conn.execute(tbl.update(whereclause=(tbl.c.id == logid)),
+                             num_lines=num_lines[logid])
+        except Exception:
+            transaction.rollback()
+            raise
+        transaction.commit()
+        return results
+
     def appendLog(self, logid, content):
-        def thd(conn):
-            return self.thdAppendLog(conn, logid, content)
+        delay = self.master.config.logAppendDelay
+        if not delay:
+            def thd(conn):
+                return self.thdAppendLog(conn, logid, content)
+            return self.db.pool.do(thd)
+
+        # write-behind: hold the append for up to `delay` seconds, so that
+        # it is written along with any other appends made in the meantime
+        d = defer.Deferred()
+        self._pendingAppends.append((logid, content, d))
+        self._pendingAppendBytes += len(content)
+        if self._pendingAppendBytes >= self.APPEND_FLUSH_SIZE:
+            self._scheduleAppendFlush(0)
+        else:
+            self._scheduleAppendFlush(delay)
+        return d
+
+    def _scheduleAppendFlush(self, delay):
+        # flush after DELAY seconds, or right away if DELAY is 0
+        if self._flushingAppends is not None:
+            # _flushAppends will reschedule itself when done
+            return
+        if not delay:
+            if self._appendFlushTimer is not None:
+                self._appendFlushTimer.cancel()
+            self._flushAppends()
+        elif self._appendFlushTimer is None:
+            self._appendFlushTimer = self.master.reactor.callLater(
+                delay, self._flushAppends)
 
-        return self.db.pool.do(thd)
+    @defer.inlineCallbacks
+    def _flushAppends(self):
+        self._appendFlushTimer = None
+        appends = self._flushingAppends = self._pendingAppends
+        waiters = self._flushingAppendWaiters = self._pendingAppendWaiters
+        self._pendingAppends = []
+        self._pendingAppendWaiters = []
+        self._pendingAppendBytes = 0
+
+        try:
+            results = yield self.db.pool.do(
+                self.thdAppendLogs,
+                [(logid, content) for logid, content, _ in appends])
+        except Exception:
+            f = failure.Failure()
+            for _, _, d in appends:
+                d.errback(f)
+        else:
+            for (_, _, d), res in zip(appends, results):
+                d.callback(res)
+        finally:
+            self._flushingAppends = None
+            self._flushingAppendWaiters = []
+            for d in waiters:
+                d.callback(None)
+
+        if self._pendingAppends:
+            self._scheduleAppendFlush(
+                0 if self._pendingAppendWaiters or
+                self._pendingAppendBytes >= self.APPEND_FLUSH_SIZE
+                else self.master.config.logAppendDelay)
+
+    @defer.inlineCallbacks
+    def flushAppends(self):
+        """
+        Write every append held back by C{logAppendDelay}, without waiting
+        for the delay to expire; called when the connector stops.
+
+        @returns: Deferred
+        """
+        while self._pendingAppends or self._flushingAppends is not None:
+            d = defer.Deferred()
+            if self._flushingAppends is not None:
+                self._flushingAppendWaiters.append(d)
+            else:
+                self._pendingAppendWaiters.append(d)
+                # cancels the flush timer
+                self._scheduleAppendFlush(0)
+            yield d
+
+    def _waitForAppends(self, logid):
+        # wait until every append to this log made so far is written
+        if any(l == logid for l, _, _ in self._pendingAppends):
+            d = defer.Deferred()
+            self._pendingAppendWaiters.append(d)
+            self._scheduleAppendFlush(0)
+            return d
+        if self._flushingAppends is not None and \
+                any(l == logid for l, _, _ in self._flushingAppends):
+            d = defer.Deferred()
+            self._flushingAppendWaiters.append(d)
+            return d
+        return defer.succeed(None)
 
     def _splitBigChunk(self, content, logid):
         """
@@ -233,63 +614,107 @@ class LogsConnectorComponent(base.DBConnectorComponent):
         else:
             return truncline, content[i + 1:]
 
+    @defer.inlineCallbacks
     def finishLog(self, logid):
         def thd(conn):
             tbl = self.db.model.logs
             q = tbl.update(whereclause=(tbl.c.id == logid))
             conn.execute(q, complete=1)
-        return self.db.pool.do(thd)
+        # make sure every chunk is written before the log is marked complete
+        yield self._waitForAppends(logid)
+        yield self.db.pool.do(thd)
 
-    @defer.inlineCallbacks
-    def compressLog(self, logid):
-        def thd(conn):
-            # get the set of chunks
-            tbl = self.db.model.logchunks
-            q = sa.select([tbl.c.first_line, tbl.c.last_line, sa.func.length(tbl.c.content),
+    def _thdIterChunks(self, conn, logid):
+        """
+        Yield the chunks of a log in order, as (row, uncompressed content)
+        tuples, reading only COMPRESS_PAGE_SIZE rows at a time.
+        """
+        tbl = self.db.model.logchunks
+        next_line = 0
+        while True:
+            q = sa.select([tbl.c.first_line, tbl.c.last_line, tbl.c.content,
                            tbl.c.compressed])
             q = q.where(tbl.c.logid == logid)
+            q = q.where(tbl.c.first_line >= next_line)
             q = q.order_by(tbl.c.first_line)
-            rows = conn.execute(q)
-            uncompressed_length = 0
-            numchunks = 0
-            totlength = 0
+            q = q.limit(self.COMPRESS_PAGE_SIZE)
+            rows = conn.execute(q).fetchall()
+            if not rows:
+                return
             for row in rows:
-                if row.compressed == 0:
-                    uncompressed_length += row.length_1
-                totlength += row.length_1
-                numchunks += 1
-
-            # do nothing if its not worth.
-            # if uncompressed_length < 200 and numchunks < 4:
-            #    return
-            q = sa.select(
-                [tbl.c.first_line, tbl.c.last_line, tbl.c.content, tbl.c.compressed])
-            q = q.where(tbl.c.logid == logid)
-            q = q.order_by(tbl.c.first_line)
-            rows = conn.execute(q)
-            wholelog = ""
-            for row in rows:
-                wholelog += self.COMPRESSION_BYID[row.compressed][
-                    "read"](row.content).decode('utf-8') + "\n"
-
-            if len(wholelog) == 0:
-                return 0
-
-            transaction = conn.begin()
-            d = tbl.delete()
-            d = d.where(tbl.c.logid == logid)
-            conn.execute(d)
-            conn.execute(self.db.model.logs.update(whereclause=(self.db.model.logs.c.id == logid)),
-                         num_lines=0)
-            self.thdAppendLog(conn, logid, wholelog)
-            transaction.commit()
-            q = sa.select([sa.func.sum(sa.func.length(tbl.c.content))])
+                yield row, self._thdDecompress(conn, row.compressed,
+                                               row.content)
+            next_line = rows[-1].first_line + 1
+
+    def _thdGroupChunks(self, conn, logid):
+        """
+        Yield lists of consecutive chunks whose merged content (joined with
+        newlines) still fits in a single chunk.
+        """
+        group = []
+        size = -1
+        for row, content in self._thdIterChunks(conn, logid):
+            if group and size + 1 + len(content) >= self.MAX_CHUNK_SIZE:
+                yield group
+                group = []
+                size = -1
+            group.append((row, content))
+            size += 1 + len(content)
+        if group:
+            yield group
+
+    def _thdReplaceChunks(self, conn, logid, replacements):
+        # swap a batch of old chunks for their merged versions atomically, so
+        # that readers always see the complete log
+        tbl = self.db.model.logchunks
+        old_first_lines = [first_line
+                           for first_lines, _ in replacements
+                           for first_line in first_lines]
+        transaction = conn.begin()
+        for batch in self.doBatch(old_first_lines, 100):
+            q = tbl.delete()
             q = q.where(tbl.c.logid == logid)
-            newsize = conn.execute(q).fetchone()[0]
-            return len(wholelog) - newsize
+            q = q.where(tbl.c.first_line.in_(batch))
+            conn.execute(q)
+        conn.execute(tbl.insert(), [newchunk for _, newchunk in replacements])
+        transaction.commit()
 
-        saved = yield self.db.pool.do(thd)
-        defer.returnValue(saved)
+    def compressLog(self, logid):
+        def thd(conn):
+            target_id = self.COMPRESSION_MODE[
+                self.master.config.logCompressionMethod]["id"]
+            dictionary = None
+            if self.master.config.logCompressionDictionaries:
+                dictionary = self._thdGetBuilderDictionary(
+                    conn, logid,
+                    (content for _, content in self._thdIterChunks(conn, logid)))
+                if dictionary is not None:
+                    target_id = self.ZSTD_DICTIONARY_ID
+            saved = 0
+            replacements = []
+            for group in self._thdGroupChunks(conn, logid):
+                first_row = group[0][0]
+                # a lone chunk already compressed the right way is left as is
+                if len(group) == 1 and first_row.compressed == target_id:
+                    continue
+                chunk, compressed_id = self.thdCompressChunk(
+                    b'\n'.join(content for _, content in group), dictionary)
+                if len(group) == 1 and first_row.compressed == compressed_id:
+                    continue
+                saved += sum(len(row.content) for row, _ in group)
+                saved -= len(chunk)
+                replacements.append((
+                    [row.first_line for row, _ in group],
+                    dict(logid=logid, first_line=first_row.first_line,
+                         last_line=group[-1][0].last_line, content=chunk,
+                         compressed=compressed_id)))
+                if len(replacements) >= self.COMPRESS_BATCH_SIZE:
+                    self._thdReplaceChunks(conn, logid, replacements)
+                    replacements = []
+            if replacements:
+                self._thdReplaceChunks(conn, logid, replacements)
+            return saved
+        return self.db.pool.do(thd)
 
     def _logdictFromRow(self, row):
         rv = dict(row)
@@ -0,0 +1,44 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import sqlalchemy as sa
+
+from buildbot.util import sautils
+
+
+def upgrade(migrate_engine):
+    metadata = sa.MetaData()
+    metadata.bind = migrate_engine
+
+    sautils.Table('builders', metadata,
+                  sa.Column('id', sa.Integer, primary_key=True),
+                  # ..
+                  )
+
+    # zstd dictionaries used to compress the log chunks of a builder
+    log_dictionaries = sautils.Table(
+        'log_dictionaries', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('builderid', sa.Integer, sa.ForeignKey('builders.id'),
+                  nullable=False),
+        sa.Column('content', sa.LargeBinary(65536), nullable=False),
+    )
+
+    # create the new table
+    log_dictionaries.create()
+
+    # and an Index on it.
+    idx = sa.Index('log_dictionaries_builderid', log_dictionaries.c.builderid)
+    idx.create()
@@ -184,6 +184,16 @@ class Model(base.DBConnectorComponent):
         sa.Column('compressed', sa.SmallInteger, nullable=False),
     )
 
+    # zstd dictionaries trained from the logs of a builder, used to compress
+    # log chunks with compressed = 5
+    log_dictionaries = sautils.Table(
+        'log_dictionaries', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('builderid', sa.Integer, sa.ForeignKey('builders.id'),
+                  nullable=False),
+        sa.Column('content', sa.LargeBinary(65536), nullable=False),
+    )
+
     # buildsets
 
     # This table contains input properties for buildsets
@@ -701,6 +711,7 @@ class Model(base.DBConnectorComponent):
     sa.Index('logs_slug', logs.c.stepid, logs.c.slug, unique=True)
     sa.Index('logchunks_firstline', logchunks.c.logid, logchunks.c.first_line)
     sa.Index('logchunks_lastline', logchunks.c.logid, logchunks.c.last_line)
+    sa.Index('log_dictionaries_builderid', log_dictionaries.c.builderid)
 
     # MySQL creates indexes for foreign keys, and these appear in the
     # reflection.  This is a list of (table, index) names that should be
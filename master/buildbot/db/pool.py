@@ -15,6 +15,8 @@
 from __future__ import print_function
 
 import inspect
+import os
+import sys
 import time
 import traceback
 
@@ -67,6 +69,8 @@ def timed_do_fn(f):
                 return callable(*args, **kwargs)
             finally:
                 log.msg("%s - thd end" % (descr,))
+        # so that the operation is still named after the callable
+        callable_wrap.__wrapped__ = callable
         d = f(callable_wrap, *args, **kwargs)
 
         @d.addBoth
@@ -83,9 +87,23 @@ def timed_do_fn(f):
 
 class DBThreadPool(object):
 
+    """
+    Run database operations in a pool of threads.
+
+    The pool starts with C{min_size} threads, grows up to C{max_size} threads
+    as operations queue up, and shrinks back when threads are left idle.  The
+    time operations wait for a thread, the time they take to execute (per
+    calling connector method), and the number of retries they needed are
+    reported through L{buildbot.process.metrics}.
+    """
+
     running = False
 
-    def __init__(self, engine, reactor, verbose=False):
+    # how often, at most, to consider giving idle threads back
+    SHRINK_INTERVAL = 60
+
+    def __init__(self, engine, reactor, verbose=False, min_size=1,
+                 max_size=None):
         # verbose is used by upgrade scripts, and if it is set we should print
         # messages about versions and other warnings
         log_msg = log.msg
@@ -96,17 +114,28 @@ class DBThreadPool(object):
 
         self.reactor = reactor
 
-        pool_size = 5
-
         # If the engine has an C{optimal_thread_pool_size} attribute, then the
-        # maxthreads of the thread pool will be set to that value.  This is
-        # most useful for SQLite in-memory connections, where exactly one
-        # connection (and thus thread) should be used.
-        if hasattr(engine, 'optimal_thread_pool_size'):
-            pool_size = engine.optimal_thread_pool_size
-
-        self._pool = threadpool.ThreadPool(minthreads=1,
-                                           maxthreads=pool_size,
+        # maxthreads of the thread pool will be limited to that value, as
+        # more threads than connections would just wait for a connection.
+        # This is most useful for SQLite in-memory connections, where exactly
+        # one connection (and thus thread) should be used.
+        self._engine_size = getattr(engine, 'optimal_thread_pool_size', None)
+        self.min_size = self.max_size = None
+        self._setSizeLimits(min_size, max_size)
+
+        # operations submitted and not finished yet, and the largest number
+        # of them since the pool last shrank
+        self._pending = 0
+        self._peak_pending = 0
+        self._size = self.min_size
+        self._last_shrink = time.time()
+        # code object -> name of the method it belongs to, and the modules
+        # whose methods are already in there
+        self._method_names = {}
+        self._named_modules = set()
+
+        self._pool = threadpool.ThreadPool(minthreads=self.min_size,
+                                           maxthreads=self._size,
                                            name='DBThreadPool')
 
         self.engine = engine
@@ -128,6 +157,49 @@ class DBThreadPool(object):
             self.do = timed_do_fn(self.do)
             self.do_with_engine = timed_do_fn(self.do_with_engine)
 
+    def _setSizeLimits(self, min_size, max_size):
+        if max_size is None:
+            max_size = self._engine_size or 5
+        elif self._engine_size is not None and max_size > self._engine_size:
+            log.msg("DBThreadPool: limiting the pool to %d threads, the "
+                    "number of database connections" % (self._engine_size,))
+            max_size = self._engine_size
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+
+    def setPoolSize(self, min_size=1, max_size=None):
+        """Change the limits of the pool size; this takes effect
+        immediately."""
+        self._setSizeLimits(min_size, max_size)
+        self._resize(max(self.min_size, min(self._size, self.max_size)),
+                     force=True)
+
+    def _resize(self, size, force=False):
+        if size == self._size and not force:
+            return
+        self._size = size
+        self._pool.adjustPoolsize(minthreads=self.min_size, maxthreads=size)
+        metrics.MetricCountEvent.log("DBThreadPool.threads", size,
+                                     absolute=True)
+
+    def _grow(self):
+        # called whenever an operation is submitted: give it a thread of its
+        # own if we can
+        if self._pending > self._size and self._size < self.max_size:
+            self._resize(min(self._pending, self.max_size))
+
+    def _shrink(self):
+        # called whenever an operation finishes: every SHRINK_INTERVAL, give
+        # back the threads that were not needed since the last time
+        now = time.time()
+        if now - self._last_shrink < self.SHRINK_INTERVAL:
+            return
+        self._last_shrink = now
+        size = max(self.min_size, self._peak_pending)
+        self._peak_pending = self._pending
+        if size < self._size:
+            self._resize(size)
+
     def _start(self):
         self._start_evt = None
         if not self.running:
@@ -159,12 +231,13 @@ class DBThreadPool(object):
     BACKOFF_MULT = 1.05
     MAX_OPERATIONALERROR_TIME = 3600 * 24  # one day
 
-    def __thd(self, with_engine, callable, args, kwargs):
+    def __thd(self, with_engine, stats, callable, args, kwargs):
         # try to call callable(arg, *args, **kwargs) repeatedly until no
         # OperationalErrors occur, where arg is either the engine (with_engine)
-        # or a connection (not with_engine)
+        # or a connection (not with_engine).  The start time and the number
+        # of retries are recorded in stats, for the reactor thread to report.
         backoff = self.BACKOFF_START
-        start = time.time()
+        start = stats['started'] = time.time()
         while True:
             if with_engine:
                 arg = self.engine
@@ -185,8 +258,7 @@ class DBThreadPool(object):
                                     'query retries'.format(self.MAX_OPERATIONALERROR_TIME)))
                         raise
 
-                    metrics.MetricCountEvent.log(
-                        "DBThreadPool.retry-on-OperationalError")
+                    stats['retries'] += 1
                     # sleep (remember, we're in a thread..)
                     time.sleep(backoff)
                     backoff *= self.BACKOFF_MULT
@@ -198,16 +270,106 @@ class DBThreadPool(object):
             finally:
                 if not with_engine:
                     arg.close()
+                stats['finished'] = time.time()
             break
         return rv
 
+    def _getMethodName(self, callable):
+        # name the connector method CALLABLE belongs to, e.g.
+        # 'buildrequests.claimBuildRequests' for the thd function defined
+        # in it, or for the method itself; wrappers of the callable set
+        # __wrapped__, like functools.wraps does
+        while hasattr(callable, '__wrapped__'):
+            callable = callable.__wrapped__
+        code = getattr(callable, '__code__', None)
+        if code is None:
+            return 'unknown'
+        name = self._method_names.get(code)
+        if name is None:
+            self._nameModuleMethods(getattr(callable, '__module__', None))
+            name = self._method_names.get(code)
+        if name is None:
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            name = self._method_names[code] = "%s.%s" % (module, code.co_name)
+        return name
+
+    def _nameModuleMethods(self, modname):
+        # map the code of each function and method of a module, and of the
+        # functions nested in them or wrapped by their decorators, to the
+        # method's name
+        if modname in self._named_modules or modname not in sys.modules:
+            return
+        self._named_modules.add(modname)
+        module = sys.modules[modname]
+        prefix = modname.rsplit('.', 1)[-1]
+        seen = set()
+
+        def addCode(code, name):
+            self._method_names.setdefault(code, name)
+            for const in code.co_consts:
+                if inspect.iscode(const):
+                    addCode(const, name)
+
+        def addFunction(fn, name):
+            fn = getattr(fn, '__func__', fn)
+            if not inspect.isfunction(fn) or id(fn) in seen:
+                return
+            seen.add(id(fn))
+            addCode(fn.__code__, name)
+            for cell in fn.__closure__ or ():
+                try:
+                    addFunction(cell.cell_contents, name)
+                except ValueError:
+                    # an empty cell
+                    pass
+
+        for attr, value in list(vars(module).items()):
+            if inspect.isclass(value) and value.__module__ == modname:
+                for clsattr, clsvalue in list(vars(value).items()):
+                    addFunction(clsvalue, "%s.%s" % (prefix, clsattr))
+            else:
+                addFunction(value, "%s.%s" % (prefix, attr))
+
+    def _defer(self, with_engine, method, callable, args, kwargs):
+        stats = dict(submitted=time.time(), started=None, finished=None,
+                     retries=0)
+        self._pending += 1
+        self._peak_pending = max(self._peak_pending, self._pending)
+        self._grow()
+        d = threads.deferToThreadPool(self.reactor, self._pool,
+                                      self.__thd, with_engine, stats,
+                                      callable, args, kwargs)
+
+        @d.addBoth
+        def report(x):
+            # metrics are logged from the reactor thread, where their
+            # observers expect to run
+            self._pending -= 1
+            self._shrink()
+            if stats['started'] is not None:
+                metrics.MetricTimeEvent.log(
+                    "DBThreadPool.queue-wait",
+                    stats['started'] - stats['submitted'])
+                metrics.MetricTimeEvent.log(
+                    "DBThreadPool.execute.%s" % (method,),
+                    stats['finished'] - stats['started'])
+            if stats['retries']:
+                metrics.MetricCountEvent.log(
+                    "DBThreadPool.retry-on-OperationalError",
+                    stats['retries'])
+                metrics.MetricCountEvent.log(
+                    "DBThreadPool.retry-on-OperationalError.%s" % (method,),
+                    stats['retries'])
+            return x
+        return d
+
     def do(self, callable, *args, **kwargs):
-        return threads.deferToThreadPool(self.reactor, self._pool,
-                                         self.__thd, False, callable, args, kwargs)
+        return self._defer(False, self._getMethodName(callable),
+                           callable, args, kwargs)
 
     def do_with_engine(self, callable, *args, **kwargs):
-        return threads.deferToThreadPool(self.reactor, self._pool,
-                                         self.__thd, True, callable, args, kwargs)
+        return self._defer(True, self._getMethodName(callable),
+                           callable, args, kwargs)
 
     def get_sqlite_version(self):
         import sqlite3
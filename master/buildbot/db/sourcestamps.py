@@ -97,6 +97,19 @@ class SourceStampsConnectorComponent(base.DBConnectorComponent):
             return ssdict
         return self.db.pool.do(thd)
 
+    def getSourceStampsByIds(self, ssids):
+        return self.getManyCached(self.getSourceStamp, ssids,
+                                  self._thdGetSourceStampsByIds)
+
+    def _thdGetSourceStampsByIds(self, conn, ssids):
+        tbl = self.db.model.sourcestamps
+        rv = {}
+        for batch in self.doBatch(ssids, 100):
+            q = tbl.select(whereclause=tbl.c.id.in_(batch))
+            for row in conn.execute(q).fetchall():
+                rv[row.id] = self._rowToSsdict_thd(conn, row)
+        return rv
+
     def getSourceStampsForBuild(self, buildid):
         assert buildid > 0
 
@@ -52,11 +52,14 @@ class StepsConnectorComponent(base.DBConnectorComponent):
             return rv
         return self.db.pool.do(thd)
 
-    def getSteps(self, buildid):
+    def getSteps(self, buildid, resultSpec=None):
         def thd(conn):
             tbl = self.db.model.steps
             q = tbl.select()
             q = q.where(tbl.c.buildid == buildid)
+            if resultSpec is not None:
+                return resultSpec.thd_execute(conn, q, self._stepdictFromRow,
+                                              order_by=[tbl.c.number])
             q = q.order_by(tbl.c.number)
             res = conn.execute(q)
             return [self._stepdictFromRow(row) for row in res.fetchall()]
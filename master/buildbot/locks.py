@@ -12,10 +12,16 @@
 # Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 # Copyright Buildbot Team Members
+import bisect
+import collections
+
+from future.utils import iteritems
 from twisted.internet import defer
+from twisted.internet import reactor
 from twisted.python import log
 
 from buildbot import util
+from buildbot.process import metrics
 from buildbot.util import subscription
 from buildbot.util.eventual import eventually
 from buildbot.worker_transition import WorkerAPICompatMixin
@@ -23,9 +29,12 @@ from buildbot.worker_transition import deprecatedWorkerModuleAttribute
 from buildbot.worker_transition import reportDeprecatedWorkerNameUsage
 
 if False:  # for debugging
-    debuglog = log.msg
+    def debuglog(m, *args):
+        log.msg(m % args if args else m)
 else:
-    debuglog = lambda m: None
+    # the arguments are only formatted when debugging, since formatting the
+    # owners of a busy lock is expensive
+    debuglog = lambda m, *args: None
 
 
 class BaseLock:
@@ -37,16 +46,29 @@ class BaseLock:
     We maintain the wait queue in FIFO order, and ensure that counting waiters
     in the queue behind exclusive waiters cannot acquire the lock. This ensures
     that exclusive waiters are not starved.
+
+    The numbers of owners are kept up to date as the lock is claimed and
+    released, and each waiter is numbered as it enters the queue, so that
+    finding the waiters ahead of a requester does not scan the queue.
     """
     description = "<BaseLock>"
 
+    _reactor = reactor  # for tests
+
     def __init__(self, name, maxCount=1):
         # Name of the lock
         self.name = name
-        # Current queue, tuples (waiter, LockAccess, deferred)
-        self.waiting = []
-        # Current owners, tuples (owner, LockAccess)
-        self.owners = []
+        # Current queue, in FIFO order: owner -> (LockAccess, deferred,
+        # sequence number, time at which the owner started waiting)
+        self.waiting = collections.OrderedDict()
+        # sorted sequence numbers of all waiters, and of exclusive waiters
+        self._waitingSeqs = []
+        self._exclusiveWaitingSeqs = []
+        self._nextSeq = 0
+        # Current owners, (owner, LockAccess) -> number of claims
+        self.owners = {}
+        self._numExclusive = 0
+        self._numCounting = 0
         # maximal number of counting owners
         self.maxCount = maxCount
 
@@ -62,39 +84,77 @@ class BaseLock:
 
             @return: Tuple (number exclusive owners, number counting owners)
         """
-        num_excl, num_counting = 0, 0
-        for owner in self.owners:
-            if owner[1].mode == 'exclusive':
-                num_excl = num_excl + 1
-            else:  # mode == 'counting'
-                num_counting = num_counting + 1
-
+        num_excl, num_counting = self._numExclusive, self._numCounting
         assert (num_excl == 1 and num_counting == 0) \
             or (num_excl == 0 and num_counting <= self.maxCount)
         return num_excl, num_counting
 
+    def _getWaitersAhead(self, requester):
+        """ Return the number of waiters ahead of the requester in the wait
+            queue, and whether one of them wants exclusive access.
+        """
+        if requester in self.waiting:
+            seq = self.waiting[requester][2]
+            num_ahead = bisect.bisect_left(self._waitingSeqs, seq)
+            exclusive_ahead = bool(self._exclusiveWaitingSeqs) \
+                and self._exclusiveWaitingSeqs[0] < seq
+        else:
+            num_ahead = len(self._waitingSeqs)
+            exclusive_ahead = bool(self._exclusiveWaitingSeqs)
+        return num_ahead, exclusive_ahead
+
+    def _addWaiter(self, owner, access, d):
+        if owner in self.waiting:
+            # keep the place of the owner in the queue
+            old_access, _, seq, since = self.waiting[owner]
+            if old_access.mode != access.mode:
+                if access.mode == 'exclusive':
+                    bisect.insort(self._exclusiveWaitingSeqs, seq)
+                else:
+                    self._removeSeq(self._exclusiveWaitingSeqs, seq)
+        else:
+            seq = self._nextSeq
+            self._nextSeq += 1
+            since = self._reactor.seconds()
+            # new sequence numbers are the largest ones
+            self._waitingSeqs.append(seq)
+            if access.mode == 'exclusive':
+                self._exclusiveWaitingSeqs.append(seq)
+        self.waiting[owner] = (access, d, seq, since)
+
+    def _removeWaiter(self, owner):
+        """ Remove the owner from the wait queue, if it is waiting.
+
+            @return: the time at which the owner started waiting, or None
+        """
+        if owner not in self.waiting:
+            return None
+        access, _, seq, since = self.waiting.pop(owner)
+        self._removeSeq(self._waitingSeqs, seq)
+        if access.mode == 'exclusive':
+            self._removeSeq(self._exclusiveWaitingSeqs, seq)
+        return since
+
+    @staticmethod
+    def _removeSeq(seqs, seq):
+        del seqs[bisect.bisect_left(seqs, seq)]
+
     def isAvailable(self, requester, access):
         """ Return a boolean whether the lock is available for claiming """
-        debuglog("%s isAvailable(%s, %s): self.owners=%r"
-                 % (self, requester, access, self.owners))
+        debuglog("%s isAvailable(%s, %s): self.owners=%r",
+                 self, requester, access, self.owners)
         num_excl, num_counting = self._getOwnersCount()
 
-        # Find all waiters ahead of the requester in the wait queue
-        for idx, waiter in enumerate(self.waiting):
-            if waiter[0] == requester:
-                w_index = idx
-                break
-        else:
-            w_index = len(self.waiting)
-        ahead = self.waiting[:w_index]
+        # Find the waiters ahead of the requester in the wait queue
+        num_ahead, exclusive_ahead = self._getWaitersAhead(requester)
 
         if access.mode == 'counting':
             # Wants counting access
-            return num_excl == 0 and num_counting + len(ahead) < self.maxCount \
-                and all([w[1].mode == 'counting' for w in ahead])
+            return num_excl == 0 and num_counting + num_ahead < self.maxCount \
+                and not exclusive_ahead
         else:
             # Wants exclusive access
-            return num_excl == 0 and num_counting == 0 and len(ahead) == 0
+            return num_excl == 0 and num_counting == 0 and num_ahead == 0
 
     def claim(self, owner, access):
         """ Claim the lock (lock must be available) """
@@ -104,8 +164,16 @@ class BaseLock:
 
         assert isinstance(access, LockAccess)
         assert access.mode in ['counting', 'exclusive']
-        self.waiting = [w for w in self.waiting if w[0] != owner]
-        self.owners.append((owner, access))
+        since = self._removeWaiter(owner)
+        if since is not None:
+            metrics.MetricTimeEvent.log('Lock.wait.%s' % (self.name,),
+                                        self._reactor.seconds() - since)
+        entry = (owner, access)
+        self.owners[entry] = self.owners.get(entry, 0) + 1
+        if access.mode == 'exclusive':
+            self._numExclusive += 1
+        else:
+            self._numCounting += 1
         debuglog(" %s is claimed '%s'" % (self, access.mode))
 
     def subscribeToReleases(self, callback):
@@ -122,13 +190,21 @@ class BaseLock:
         if entry not in self.owners:
             debuglog("%s already released" % self)
             return
-        self.owners.remove(entry)
+        if self.owners[entry] == 1:
+            del self.owners[entry]
+        else:
+            self.owners[entry] -= 1
+        if access.mode == 'exclusive':
+            self._numExclusive -= 1
+        else:
+            self._numCounting -= 1
         # who can we wake up?
         # After an exclusive access, we may need to wake up several waiting.
         # Break out of the loop when the first waiting client should not be
         # awakened.
         num_excl, num_counting = self._getOwnersCount()
-        for i, (w_owner, w_access, d) in enumerate(self.waiting):
+        woken = []
+        for w_owner, (w_access, d, seq, since) in iteritems(self.waiting):
             if w_access.mode == 'counting':
                 if num_excl > 0 or num_counting == self.maxCount:
                     break
@@ -144,8 +220,9 @@ class BaseLock:
             # If the waiter has a deferred, wake it up and clear the deferred
             # from the wait queue entry to indicate that it has been woken.
             if d:
-                self.waiting[i] = (w_owner, w_access, None)
+                woken.append((w_owner, (w_access, None, seq, since)))
                 eventually(d.callback, self)
+        self.waiting.update(woken)
 
         # notify any listeners
         self.release_subs.deliver()
@@ -163,19 +240,15 @@ class BaseLock:
             return defer.succeed(self)
         d = defer.Deferred()
 
-        # Are we already in the wait queue?
-        w = [i for i, w in enumerate(self.waiting) if w[0] == owner]
-        if w:
-            self.waiting[w[0]] = (owner, access, d)
-        else:
-            self.waiting.append((owner, access, d))
+        # replaces the entry of the owner if it is already in the wait queue
+        self._addWaiter(owner, access, d)
         return d
 
     def stopWaitingUntilAvailable(self, owner, access, d):
         debuglog("%s stopWaitingUntilAvailable(%s)" % (self, owner))
         assert isinstance(access, LockAccess)
-        assert (owner, access, d) in self.waiting
-        self.waiting = [w for w in self.waiting if w[0] != owner]
+        assert owner in self.waiting and self.waiting[owner][:2] == (access, d)
+        self._removeWaiter(owner)
 
     def isOwner(self, owner, access):
         return (owner, access) in self.owners
@@ -207,15 +280,15 @@ class RealWorkerLock:
 
     def getLock(self, worker):
         workername = worker.workername
-        if workername not in self.locks:
+        lock = self.locks.get(workername)
+        if lock is None:
             maxCount = self.maxCountForWorker.get(workername,
                                                   self.maxCount)
             lock = self.locks[workername] = BaseLock(self.name, maxCount)
             desc = "<WorkerLock(%s, %s)[%s] %d>" % (self.name, maxCount,
                                                     workername, id(lock))
             lock.description = desc
-            self.locks[workername] = lock
-        return self.locks[workername]
+        return lock
 
 
 class LockAccess(util.ComparableMixin):
@@ -33,6 +33,7 @@ from buildbot import config
 from buildbot import interfaces
 from buildbot import monkeypatches
 from buildbot.changes import changes
+from buildbot.changes.coordinator import PollCoordinator
 from buildbot.changes.manager import ChangeManager
 from buildbot.data import connector as dataconnector
 from buildbot.db import connector as dbconnector
@@ -44,6 +45,7 @@ from buildbot.process import metrics
 from buildbot.process.botmaster import BotMaster
 from buildbot.process.builder import BuilderControl
 from buildbot.process.users.manager import UserManagerManager
+from buildbot.schedulers.dispatcher import ChangeDispatcher
 from buildbot.schedulers.manager import SchedulerManager
 from buildbot.status.master import Status
 from buildbot.util import ascii2unicode
@@ -154,12 +156,18 @@ class BuildMaster(service.ReconfigurableServiceMixin, service.MasterService,
         self.workers = workermanager.WorkerManager(self)
         self.workers.setServiceParent(self)
 
+        self.poll_coordinator = PollCoordinator()
+        self.poll_coordinator.setServiceParent(self)
+
         self.change_svc = ChangeManager()
         self.change_svc.setServiceParent(self)
 
         self.botmaster = BotMaster()
         self.botmaster.setServiceParent(self)
 
+        self.change_dispatcher = ChangeDispatcher()
+        self.change_dispatcher.setServiceParent(self)
+
         self.scheduler_manager = SchedulerManager()
         self.scheduler_manager.setServiceParent(self)
 
@@ -22,7 +22,8 @@ class MQConnector(service.ReconfigurableServiceMixin, service.AsyncMultiService)
     classes = {
         'simple': {
             'class': "buildbot.mq.simple.SimpleMQ",
-            'keys': set(['debug']),
+            'keys': set(['debug', 'persistent_queue_size',
+                         'persistent_queue_spool']),
         },
         'wamp': {
             'class': "buildbot.mq.wamp.WampMQ",
@@ -13,35 +13,126 @@
 #
 # Copyright Buildbot Team Members
 
+import cPickle
+import collections
+import hashlib
+import itertools
+import os
 import pprint
+import re
 
 from twisted.internet import defer
+from twisted.python import failure
 from twisted.python import log
 
 from buildbot.mq import base
+from buildbot.process import metrics
 from buildbot.util import service
-from buildbot.util import tuplematch
+
+
+class _RoutingNode(object):
+
+    # one level of the routing trie: children are keyed by the filter
+    # element at this depth, with None standing for the wildcard branch;
+    # qrefs holds the consumers whose filter ends here
+
+    __slots__ = ['children', 'qrefs']
+
+    def __init__(self):
+        self.children = {}
+        self.qrefs = []
 
 
 class SimpleMQ(service.ReconfigurableServiceMixin, base.MQBase):
 
     def __init__(self):
         base.MQBase.__init__(self)
-        self.qrefs = []
+        # routing tries, keyed by the length of the filter
+        self.routes = {}
         self.persistent_qrefs = {}
         self.debug = False
+        self.persistent_queue_size = None
+        self.persistent_queue_spool = None
+        self._serial = itertools.count()
 
     def reconfigServiceWithBuildbotConfig(self, new_config):
         self.debug = new_config.mq.get('debug', False)
+        self.persistent_queue_size = new_config.mq.get(
+            'persistent_queue_size')
+        spool = new_config.mq.get('persistent_queue_spool')
+        if spool:
+            spool = os.path.join(self.master.basedir, spool)
+        self.persistent_queue_spool = spool
         return service.ReconfigurableServiceMixin.reconfigServiceWithBuildbotConfig(self,
                                                                                     new_config)
 
     def produce(self, routingKey, data):
         if self.debug:
             log.msg("MSG: %s\n%s" % (routingKey, pprint.pformat(data)))
-        for qref in self.qrefs:
-            if tuplematch.matchTuple(routingKey, qref.filter):
-                qref.invoke(routingKey, data)
+        for qref in self.matchingQrefs(routingKey):
+            qref.invoke(routingKey, data)
+
+    def matchingQrefs(self, routingKey):
+        """Return the consumers whose filter matches C{routingKey}, in the
+        order they started consuming"""
+        node = self.routes.get(len(routingKey))
+        if node is None:
+            return []
+        nodes = [node]
+        for k in routingKey:
+            next_nodes = []
+            for node in nodes:
+                children = node.children
+                child = children.get(None)
+                if child is not None:
+                    next_nodes.append(child)
+                if k is not None:
+                    child = children.get(k)
+                    if child is not None:
+                        next_nodes.append(child)
+            if not next_nodes:
+                return []
+            nodes = next_nodes
+        if len(nodes) == 1:
+            return list(nodes[0].qrefs)
+        qrefs = [qref for node in nodes for qref in node.qrefs]
+        qrefs.sort(key=lambda qref: qref.serial)
+        return qrefs
+
+    def addRoute(self, qref):
+        qref.serial = next(self._serial)
+        node = self.routes.get(len(qref.filter))
+        if node is None:
+            node = self.routes[len(qref.filter)] = _RoutingNode()
+        for f in qref.filter:
+            child = node.children.get(f)
+            if child is None:
+                child = node.children[f] = _RoutingNode()
+            node = child
+        node.qrefs.append(qref)
+
+    def removeRoute(self, qref):
+        root = self.routes.get(len(qref.filter))
+        if root is None:
+            return
+        path = [root]
+        for f in qref.filter:
+            node = path[-1].children.get(f)
+            if node is None:
+                return
+            path.append(node)
+        try:
+            path[-1].qrefs.remove(qref)
+        except ValueError:
+            return
+        # prune the branches that no longer lead to any consumer
+        for i in range(len(qref.filter), 0, -1):
+            node = path[i]
+            if node.qrefs or node.children:
+                return
+            del path[i - 1].children[qref.filter[i - 1]]
+        if not root.children and not root.qrefs:
+            del self.routes[len(qref.filter)]
 
     def startConsuming(self, callback, filter, persistent_name=None):
         if any(not isinstance(k, str) and k is not None for k in filter):
@@ -51,52 +142,211 @@ class SimpleMQ(service.ReconfigurableServiceMixin, base.MQBase):
                 qref = self.persistent_qrefs[persistent_name]
                 qref.startConsuming(callback)
             else:
-                qref = PersistentQueueRef(self, callback, filter)
-                self.qrefs.append(qref)
+                qref = PersistentQueueRef(self, callback, filter,
+                                          persistent_name)
+                self.addRoute(qref)
                 self.persistent_qrefs[persistent_name] = qref
         else:
             qref = QueueRef(self, callback, filter)
-            self.qrefs.append(qref)
+            self.addRoute(qref)
         return defer.succeed(qref)
 
+    def stopService(self):
+        # messages queued for persistent consumers do not survive a restart,
+        # so there is no point in keeping their spool files around
+        for qref in self.persistent_qrefs.values():
+            if qref.spool is not None:
+                qref.spool.close()
+                qref.spool = None
+        return base.MQBase.stopService(self)
+
+    def getSpoolPath(self, persistent_name):
+        if isinstance(persistent_name, unicode):
+            persistent_name = persistent_name.encode('utf-8')
+        safe_name = re.sub(r'[^\w.-]', '_', persistent_name)[:64]
+        digest = hashlib.sha1(persistent_name).hexdigest()[:8]
+        return os.path.join(self.persistent_queue_spool,
+                            '%s-%s.spool' % (safe_name, digest))
+
 
 class QueueRef(base.QueueRef):
 
-    __slots__ = ['mq', 'filter']
+    __slots__ = ['mq', 'filter', 'serial']
 
     def __init__(self, mq, callback, filter):
         base.QueueRef.__init__(self, callback)
         self.mq = mq
-        self.filter = filter
+        self.filter = tuple(filter)
+        self.serial = None
 
     def stopConsuming(self):
         self.callback = None
-        try:
-            self.mq.qrefs.remove(self)
-        except ValueError:
-            pass
+        self.mq.removeRoute(self)
 
 
 class PersistentQueueRef(QueueRef):
 
-    __slots__ = ['active', 'queue']
+    """
+    A queue that keeps receiving messages while its consumer is stopped, and
+    replays them when the consumer starts again.
 
-    def __init__(self, mq, callback, filter):
+    At most C{persistent_queue_size} messages are kept in memory.  Past that,
+    messages are appended to a spool file if C{persistent_queue_spool} is
+    configured.  Otherwise, the oldest messages are dropped while the
+    consumer is stopped, and are all kept while it replays them.  The replay
+    reads the spool lazily, and waits for each Deferred returned by the
+    consumer before delivering the next message.  New messages are queued
+    behind the replay, so they are delivered in order.
+    """
+
+    __slots__ = ['name', 'active', 'consumer', 'queue', 'spool', 'replaying',
+                 'dropped']
+
+    # number of spooled messages read back into memory at once
+    SPOOL_READ_SIZE = 100
+
+    # the depth and spilled-bytes metrics are reported every this many
+    # queued messages, and whenever the consumer stops or catches up
+    METRICS_INTERVAL = 100
+
+    def __init__(self, mq, callback, filter, name=None):
         QueueRef.__init__(self, mq, callback, filter)
-        self.queue = []
+        self.name = name
+        self.active = True
+        self.consumer = callback
+        self.queue = collections.deque()
+        self.spool = None
+        self.replaying = False
+        self.dropped = 0
+
+    @property
+    def depth(self):
+        depth = len(self.queue)
+        if self.spool is not None:
+            depth += self.spool.count
+        return depth
 
     def startConsuming(self, callback):
-        self.callback = callback
+        self.consumer = callback
         self.active = True
 
         # invoke for every message that was missed
-        queue, self.queue = self.queue, []
-        for routingKey, data in queue:
-            self.invoke(routingKey, data)
+        if self.depth:
+            self.callback = self.addToQueue
+            if not self.replaying:
+                self._replay()
+        else:
+            self.callback = callback
 
     def stopConsuming(self):
         self.callback = self.addToQueue
         self.active = False
+        self._reportMetrics()
 
     def addToQueue(self, routingKey, data):
-        self.queue.append((routingKey, data))
+        limit = self.mq.persistent_queue_size
+        spooling = self.spool is not None and self.spool.count
+        full = limit is not None and len(self.queue) >= limit
+        if not spooling and not full:
+            self.queue.append((routingKey, data))
+        elif spooling or self.mq.persistent_queue_spool:
+            if self.spool is None:
+                self.spool = _Spool(self.mq.getSpoolPath(self.name))
+            self.spool.write((routingKey, data))
+        elif self.active:
+            # the consumer is replaying the queue; new messages are not lost
+            # just because it has not caught up yet
+            self.queue.append((routingKey, data))
+        else:
+            self.queue.popleft()
+            self.queue.append((routingKey, data))
+            if self.dropped % 1000 == 0:
+                log.msg("persistent queue %r is full; dropping its oldest "
+                        "messages" % (self.name,))
+            self.dropped += 1
+        if self.depth % self.METRICS_INTERVAL == 0:
+            self._reportMetrics()
+
+    def _nextMessage(self):
+        if not self.queue and self.spool is not None and self.spool.count:
+            self.queue.extend(self.spool.read(self.SPOOL_READ_SIZE))
+        if self.queue:
+            return self.queue.popleft()
+
+    @defer.inlineCallbacks
+    def _replay(self):
+        self.replaying = True
+        try:
+            while self.active:
+                msg = self._nextMessage()
+                if msg is None:
+                    # caught up: deliver new messages directly again
+                    self.callback = self.consumer
+                    break
+                try:
+                    x = self.consumer(*msg)
+                    if isinstance(x, defer.Deferred):
+                        yield x
+                except Exception:
+                    log.err(failure.Failure(),
+                            'while invoking %r' % (self.consumer,))
+        finally:
+            self.replaying = False
+            self._reportMetrics()
+
+    def _reportMetrics(self):
+        if self.name is None:
+            return
+        metrics.MetricCountEvent.log('mq.persistent.%s.depth' % self.name,
+                                     self.depth, absolute=True)
+        spilled = self.spool.size if self.spool is not None else 0
+        metrics.MetricCountEvent.log(
+            'mq.persistent.%s.spilled_bytes' % self.name,
+            spilled, absolute=True)
+
+
+class _Spool(object):
+
+    # append-only file of pickled (routingKey, data) messages, read back in
+    # order; the file is removed once every message has been read
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.count = 0
+        self.readPos = 0
+        self.writePos = 0
+
+    @property
+    def size(self):
+        # bytes of messages that are still waiting to be read
+        return self.writePos - self.readPos
+
+    def write(self, msg):
+        if self.file is None:
+            dirname = os.path.dirname(self.path)
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            self.file = open(self.path, 'w+b')
+        self.file.seek(self.writePos)
+        cPickle.dump(msg, self.file, cPickle.HIGHEST_PROTOCOL)
+        self.writePos = self.file.tell()
+        self.count += 1
+
+    def read(self, count):
+        self.file.seek(self.readPos)
+        msgs = []
+        while self.count and len(msgs) < count:
+            msgs.append(cPickle.load(self.file))
+            self.count -= 1
+        self.readPos = self.file.tell()
+        if not self.count:
+            self.close()
+        return msgs
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            os.remove(self.path)
+        self.count = self.readPos = self.writePos = 0
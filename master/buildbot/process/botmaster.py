@@ -40,6 +40,10 @@ class BotMaster(service.ReconfigurableServiceMixin, service.AsyncMultiService):
 
         self.builders = {}
         self.builderNames = []
+        # buildersById maps builderids to the same Builder instances, for the
+        # builders whose id is known; it is updated as builders are added and
+        # removed on reconfig
+        self.buildersById = {}
         # builders maps Builder names to instances of bb.p.builder.Builder,
         # which is the master-side object that defines and controls a build.
 
@@ -131,17 +135,13 @@ class BotMaster(service.ReconfigurableServiceMixin, service.AsyncMultiService):
 
     @defer.inlineCallbacks
     def startService(self):
-        @defer.inlineCallbacks
         def buildRequestAdded(key, msg):
-            builderid = msg['builderid']
-            buildername = None
-            # convert builderid to buildername
-            for builder in itervalues(self.builders):
-                if builderid == (yield builder.getBuilderId()):
-                    buildername = builder.name
-                    break
-            if buildername:
-                self.maybeStartBuildsForBuilder(buildername)
+            # the distributor must know about the request before it is asked
+            # to start builds
+            self.brd.buildRequestEvent(key, msg)
+            builder = self.buildersById.get(msg['builderid'])
+            if builder is not None:
+                self.maybeStartBuildsForBuilder(builder.name)
 
         # consume both 'new' and 'unclaimed' build requests
         startConsuming = self.master.mq.startConsuming
@@ -197,6 +197,9 @@ class BotMaster(service.ReconfigurableServiceMixin, service.AsyncMultiService):
                 builder = old_by_name[n]
 
                 del self.builders[n]
+                for builderid, b in list(self.buildersById.items()):
+                    if b is builder:
+                        del self.buildersById[builderid]
                 builder.master = None
                 builder.botmaster = None
 
@@ -211,6 +214,9 @@ class BotMaster(service.ReconfigurableServiceMixin, service.AsyncMultiService):
                 builder.master = self.master
                 yield builder.setServiceParent(self)
 
+                builderid = yield builder.getBuilderId()
+                self.buildersById[builderid] = builder
+
         self.builderNames = list(self.builders)
 
         yield self.master.data.updates.updateBuilderList(
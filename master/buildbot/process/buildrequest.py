@@ -41,23 +41,81 @@ class BuildRequestCollapser(object):
     def __init__(self, master, brids):
         self.master = master
         self.brids = brids
+        # the unclaimed buildrequests of each builder, their index by collapse
+        # signature, and the collapse signatures of the buildsets, loaded once
+        # for all of the brids
+        self._unclaimedBrs = {}
+        self._collapseIndexes = {}
+        self._signatures = {}
 
     @defer.inlineCallbacks
     def _getUnclaimedBrs(self, builderid):
-        # Retrieve the list of Brs for all unclaimed builds
-        unclaim_brs = yield self.master.data.get(('builders',
-                                                  builderid,
-                                                  'buildrequests'),
-                                                 [resultspec.Filter('claimed',
-                                                                    'eq',
-                                                                    [False])])
-        # sort by submitted_at, so the first is the oldest
-        unclaim_brs.sort(key=lambda brd: brd['submitted_at'])
-        defer.returnValue(unclaim_brs)
+        if builderid not in self._unclaimedBrs:
+            # Retrieve the list of Brs for all unclaimed builds
+            unclaim_brs = yield self.master.data.get(
+                ('builders', builderid, 'buildrequests'),
+                [resultspec.Filter('claimed', 'eq', [False])])
+            # sort by submitted_at, so the first is the oldest
+            unclaim_brs.sort(key=lambda brd: brd['submitted_at'])
+            self._unclaimedBrs[builderid] = unclaim_brs
+        defer.returnValue(self._unclaimedBrs[builderid])
+
+    @defer.inlineCallbacks
+    def _getSignatures(self, bsids):
+        missing = [bsid for bsid in set(bsids) if bsid not in self._signatures]
+        if missing:
+            ssidsByBsid = yield self.master.db.buildsets.\
+                getSourceStampIdsForBuildsets(missing)
+            ssids = sorted(set(ssid for bsSsids in itervalues(ssidsByBsid)
+                               for ssid in bsSsids))
+            ssdicts = yield self.master.db.sourcestamps.getSourceStampsByIds(
+                ssids)
+            ssdicts = dict(zip(ssids, ssdicts))
+            for bsid, bsSsids in iteritems(ssidsByBsid):
+                self._signatures[bsid] = BuildRequest.collapseSignature(
+                    [ssdicts[ssid] for ssid in bsSsids])
+        defer.returnValue(dict((bsid, self._signatures[bsid])
+                               for bsid in bsids))
+
+    @defer.inlineCallbacks
+    def _getCollapseIndex(self, builderid):
+        # index the unclaimed buildrequests of a builder by the collapse
+        # signature of their buildset, and by buildset
+        if builderid not in self._collapseIndexes:
+            unclaim_brs = yield self._getUnclaimedBrs(builderid)
+            signatures = yield self._getSignatures(
+                [brd['buildsetid'] for brd in unclaim_brs])
+            bySignature = {}
+            byBuildset = {}
+            for brd in unclaim_brs:
+                signature = signatures[brd['buildsetid']]
+                if signature is not None:
+                    bySignature.setdefault(signature, []).append(brd)
+                byBuildset.setdefault(brd['buildsetid'], []).append(brd)
+            self._collapseIndexes[builderid] = (bySignature, byBuildset)
+        defer.returnValue(self._collapseIndexes[builderid])
+
+    @defer.inlineCallbacks
+    def _getDefaultCollapsibleBrs(self, builderid, br):
+        # the unclaimed buildrequests that BuildRequest.canBeCollapsed would
+        # accept: those of the same buildset, or with the same signature
+        bySignature, byBuildset = yield self._getCollapseIndex(builderid)
+        signatures = yield self._getSignatures([br['buildsetid']])
+        signature = signatures[br['buildsetid']]
+
+        brs = list(byBuildset.get(br['buildsetid'], []))
+        if signature is not None:
+            brs.extend(brd for brd in bySignature.get(signature, [])
+                       if brd['buildsetid'] != br['buildsetid'])
+        brs.sort(key=lambda brd: brd['submitted_at'])
+        defer.returnValue([brd for brd in brs
+                           if brd['buildrequestid'] != br['buildrequestid']])
 
     @defer.inlineCallbacks
     def collapse(self):
+        from buildbot.process.builder import Builder  # avoid circular imports
         collapseBRs = []
+        collapsedBrids = set()
 
         for brid in self.brids:
             # Get the BuildRequest object
@@ -75,12 +133,23 @@ class BuildRequestCollapser(object):
             if not collapseRequestsFn or not unclaim_brs:
                 continue
 
-            for unclaim_br in unclaim_brs:
-                if unclaim_br['buildrequestid'] == br['buildrequestid']:
-                    continue
-
-                canCollapse = yield collapseRequestsFn(self.master, bldr, br, unclaim_br)
-                if canCollapse is True:
+            if collapseRequestsFn is Builder._defaultCollapseRequestFn:
+                # the default strategy only compares the sourcestamps of the
+                # buildsets, so the matching requests can be looked up
+                brs = yield self._getDefaultCollapsibleBrs(builderid, br)
+            else:
+                brs = []
+                for unclaim_br in unclaim_brs:
+                    if unclaim_br['buildrequestid'] == br['buildrequestid']:
+                        continue
+
+                    canCollapse = yield collapseRequestsFn(self.master, bldr, br, unclaim_br)
+                    if canCollapse is True:
+                        brs.append(unclaim_br)
+
+            for unclaim_br in brs:
+                if unclaim_br['buildrequestid'] not in collapsedBrids:
+                    collapsedBrids.add(unclaim_br['buildrequestid'])
                     collapseBRs.append(unclaim_br)
 
         brids = [b['buildrequestid'] for b in collapseBRs]
@@ -288,6 +357,23 @@ class BuildRequest(object):
 
         defer.returnValue(True)
 
+    @staticmethod
+    def collapseSignature(ssdicts):
+        """
+        Returns a signature of the sourcestamps of a buildset (as ssdicts),
+        such that the buildrequests of two different buildsets can be
+        collapsed by L{canBeCollapsed} if and only if the signatures of their
+        buildsets are equal, and not None.
+        """
+        sources = {}
+        for ss in ssdicts:
+            # anything with a patch won't be collapsed
+            if ss is None or ss['patch_body']:
+                return None
+            sources[ss['codebase']] = (ss['revision'], ss['repository'],
+                                       ss['branch'], ss['project'])
+        return frozenset(iteritems(sources))
+
     def mergeSourceStampsWith(self, others):
         """ Returns one merged sourcestamp for every codebase """
         # get all codebases from all requests
@@ -12,8 +12,10 @@
 # Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 # Copyright Buildbot Team Members
+import heapq
 import random
 
+from future.utils import itervalues
 from twisted.internet import defer
 from twisted.internet import reactor
 from twisted.python import log
@@ -26,6 +28,80 @@ from buildbot.util import epoch2datetime
 from buildbot.util import service
 
 
+class UnclaimedBuildRequestQueue(object):
+
+    """
+    The unclaimed build requests of a single builder, as a heap ordered by
+    C{submitted_at} (oldest first).
+
+    Removal is lazy: discarded entries stay in the heap until they reach its
+    top, or until they outnumber the live ones and the heap is rebuilt.
+    """
+
+    def __init__(self, brdicts=()):
+        self._heap = []
+        # brid -> heap entry; an entry that is not in here is stale
+        self._entries = {}
+        for brdict in brdicts:
+            self.add(brdict)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, brid):
+        return brid in self._entries
+
+    def get(self, brid):
+        entry = self._entries.get(brid)
+        if entry is None:
+            return None
+        return entry[2]
+
+    def add(self, brdict):
+        brid = brdict['buildrequestid']
+        entry = self._entries.get(brid)
+        if entry is not None:
+            # already queued; just refresh the brdict
+            entry[2] = brdict
+            return
+        entry = [brdict['submitted_at'], brid, brdict]
+        self._entries[brid] = entry
+        heapq.heappush(self._heap, entry)
+
+    def discard(self, brid):
+        if self._entries.pop(brid, None) is None:
+            return
+        if len(self._heap) > 2 * len(self._entries) + 32:
+            self._heap = list(itervalues(self._entries))
+            heapq.heapify(self._heap)
+
+    def peek(self):
+        # return the oldest brdict, or None if the queue is empty
+        heap = self._heap
+        while heap and self._entries.get(heap[0][1]) is not heap[0]:
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        return heap[0][2]
+
+    def oldestSubmittedAt(self):
+        brdict = self.peek()
+        if brdict is None:
+            return None
+        return brdict['submitted_at']
+
+    def brdicts(self):
+        # all brdicts, oldest first
+        return [entry[2] for entry in sorted(itervalues(self._entries))]
+
+
+@defer.inlineCallbacks
+def fetchUnclaimedBuildRequestQueue(master, builderid):
+    brdicts = yield master.data.get(('builders', builderid, 'buildrequests'),
+                                    [resultspec.Filter('claimed', 'eq', [False])])
+    defer.returnValue(UnclaimedBuildRequestQueue(brdicts))
+
+
 class BuildChooserBase(object):
     #
     # WARNING: This API is experimental and in active development.
@@ -43,12 +119,20 @@ class BuildChooserBase(object):
     # The default implementation of this class implements a default
     # chooseNextBuild() that delegates out to two other functions:
     #   * bc.popNextBuild() - get the next (worker, breq) pair
+    #
+    # Unclaimed build requests come from self.unclaimedQueue, which the
+    # distributor shares between the successive choosers of a builder and
+    # keeps up to date from buildrequest events. Requests the chooser takes
+    # off that queue are kept in self.takenBrdicts until the distributor
+    # either forgets them (because they started) or puts them back with
+    # restoreBuildRequests().
 
     def __init__(self, bldr, master):
         self.bldr = bldr
         self.master = master
         self.breqCache = {}
-        self.unclaimedBrdicts = None
+        self.unclaimedQueue = None
+        self.takenBrdicts = {}
 
     @defer.inlineCallbacks
     def chooseNextBuild(self):
@@ -67,25 +151,39 @@ class BuildChooserBase(object):
         # it's just one breq
         raise NotImplementedError("Subclasses must implement this!")
 
+    def forgetBuildRequests(self, brids):
+        # The given requests are taken care of, and must not be put back
+        for brid in brids:
+            self.takenBrdicts.pop(brid, None)
+
+    def restoreBuildRequests(self):
+        # Put the requests this chooser took, but did not start, back on the
+        # queue, for the next chooser to try
+        if self.unclaimedQueue is not None:
+            for brdict in itervalues(self.takenBrdicts):
+                self.unclaimedQueue.add(brdict)
+        self.takenBrdicts = {}
+
     # - Helper functions that are generally useful to all subclasses -
     @defer.inlineCallbacks
     def _fetchUnclaimedBrdicts(self):
-        # Sets up a cache of all the unclaimed brdicts. The cache is
-        # saved at self.unclaimedBrdicts cache. If the cache already
-        # exists, this function does nothing. If a refetch is desired, set
-        # the self.unclaimedBrdicts to None before calling."""
-        if self.unclaimedBrdicts is None:
-            # TODO: use order of the DATA API
-            brdicts = yield self.master.data.get(('builders',
-                                                  (yield self.bldr.getBuilderId()),
-                                                  'buildrequests'),
-                                                 [resultspec.Filter('claimed',
-                                                                    'eq',
-                                                                    [False])])
-            # sort by submitted_at, so the first is the oldest
-            brdicts.sort(key=lambda brd: brd['submitted_at'])
-            self.unclaimedBrdicts = brdicts
-        defer.returnValue(self.unclaimedBrdicts)
+        # Make sure self.unclaimedQueue is set up. The distributor normally
+        # provides it; otherwise, fetch the unclaimed brdicts from the data
+        # API.
+        if self.unclaimedQueue is None:
+            self.unclaimedQueue = yield fetchUnclaimedBuildRequestQueue(
+                self.master, (yield self.bldr.getBuilderId()))
+        defer.returnValue(self.unclaimedQueue)
+
+    def _peekUnclaimedBrdict(self):
+        # Return the oldest brdict this chooser has not taken yet. The
+        # requests it took may have come back (e.g. with an 'unclaimed'
+        # event), but they will be restored anyway, so drop them.
+        while True:
+            brdict = self.unclaimedQueue.peek()
+            if brdict is None or brdict['buildrequestid'] not in self.takenBrdicts:
+                return brdict
+            self.unclaimedQueue.discard(brdict['buildrequestid'])
 
     @defer.inlineCallbacks
     def _getBuildRequestForBrdict(self, brdict):
@@ -101,27 +199,23 @@ class BuildChooserBase(object):
 
     def _getBrdictForBuildRequest(self, breq):
         # Turn a BuildRequest back into a brdict. This operates from the
-        # cache, which must be set up once via _fetchUnclaimedBrdicts
+        # queue, which must be set up once via _fetchUnclaimedBrdicts
 
         if breq is None:
             return None
 
-        brid = breq.id
-        for brdict in self.unclaimedBrdicts:
-            if brid == brdict['buildrequestid']:
-                return brdict
-        return None
+        return self.unclaimedQueue.get(breq.id)
 
     def _removeBuildRequest(self, breq):
-        # Remove a BuildrRequest object (and its brdict)
-        # from the caches
+        # Take a BuildRequest object (and its brdict) off the queue
 
         if breq is None:
             return
 
         brdict = self._getBrdictForBuildRequest(breq)
         if brdict is not None:
-            self.unclaimedBrdicts.remove(brdict)
+            self.unclaimedQueue.discard(breq.id)
+            self.takenBrdicts[breq.id] = brdict
 
         if breq.id in self.breqCache:
             del self.breqCache[breq.id]
@@ -130,7 +224,8 @@ class BuildChooserBase(object):
         # Retrieve the list of BuildRequest objects for all unclaimed builds
         return defer.gatherResults([
             self._getBuildRequestForBrdict(brdict)
-            for brdict in self.unclaimedBrdicts])
+            for brdict in self.unclaimedQueue.brdicts()
+            if brdict['buildrequestid'] not in self.takenBrdicts])
 
 
 class BasicBuildChooser(BuildChooserBase):
@@ -219,7 +314,8 @@ class BasicBuildChooser(BuildChooserBase):
     def _getNextUnclaimedBuildRequest(self):
         # ensure the cache is there
         yield self._fetchUnclaimedBrdicts()
-        if not self.unclaimedBrdicts:
+        brdict = self._peekUnclaimedBrdict()
+        if brdict is None:
             defer.returnValue(None)
             return
 
@@ -236,7 +332,6 @@ class BasicBuildChooser(BuildChooserBase):
                 nextBreq = None
         else:
             # otherwise just return the first build
-            brdict = self.unclaimedBrdicts[0]
             nextBreq = yield self._getBuildRequestForBrdict(brdict)
 
         defer.returnValue(nextBreq)
@@ -299,6 +394,11 @@ class BuildRequestDistributor(service.AsyncMultiService):
     are still working on the previous build request, then this class will
     correctly re-prioritize invocations of builders' C{maybeStartBuild}
     methods.
+
+    The unclaimed build requests of each builder are fetched once, then kept
+    in an L{UnclaimedBuildRequestQueue} that is maintained from buildrequest
+    events, so that the database is only consulted again to claim requests,
+    or when a claim reveals that the queue is out of date.
     """
 
     BuildChooser = BasicBuildChooser
@@ -313,11 +413,33 @@ class BuildRequestDistributor(service.AsyncMultiService):
         # sorted list of names of builders that need their maybeStartBuild
         # method invoked.
         self._pending_builders = []
+        # names of builders waiting to be sorted into the pending builders by
+        # a call that has not acquired pending_builders_lock yet, or None, and
+        # the Deferred of that call
+        self._queued_builders = None
+        self._queued_reset = None
         self.activity_lock = defer.DeferredLock()
         self.active = False
 
         self._pendingMSBOCalls = []
 
+        # builderid -> UnclaimedBuildRequestQueue
+        self._unclaimedQueues = {}
+        self.buildrequest_consumers = []
+
+    @defer.inlineCallbacks
+    def startService(self):
+        self._unclaimedQueues = {}
+        # 'new' and 'unclaimed' requests are handed to us by the botmaster,
+        # before it asks us to start builds for them; consuming those here
+        # too could deliver them after they were claimed already
+        for event in ('claimed', 'complete'):
+            consumer = yield self.master.mq.startConsuming(
+                self.buildRequestEvent,
+                ('buildrequests', None, event))
+            self.buildrequest_consumers.append(consumer)
+        yield service.AsyncMultiService.startService(self)
+
     @defer.inlineCallbacks
     def stopService(self):
         # Lots of stuff happens asynchronously here, so we need to let it all
@@ -333,6 +455,51 @@ class BuildRequestDistributor(service.AsyncMultiService):
         if self._pendingMSBOCalls:
             yield defer.DeferredList(self._pendingMSBOCalls)
 
+        # we will miss events while stopped, so the queues can't be trusted
+        # anymore
+        for consumer in self.buildrequest_consumers:
+            consumer.stopConsuming()
+        self.buildrequest_consumers = []
+        self._unclaimedQueues = {}
+
+    def buildRequestEvent(self, key, msg):
+        # only track builders whose queue has been fetched already; the
+        # others will get an up-to-date queue when it is first needed
+        queue = self._unclaimedQueues.get(msg['builderid'])
+        if queue is None:
+            return
+        if msg['claimed'] or msg['complete']:
+            queue.discard(msg['buildrequestid'])
+        else:
+            queue.add(msg)
+
+    @defer.inlineCallbacks
+    def _getUnclaimedQueue(self, bldr):
+        builderid = yield bldr.getBuilderId()
+        queue = self._unclaimedQueues.get(builderid)
+        if queue is None:
+            queue = yield fetchUnclaimedBuildRequestQueue(self.master,
+                                                          builderid)
+            # another fetch may have completed in the meantime
+            queue = self._unclaimedQueues.setdefault(builderid, queue)
+        defer.returnValue(queue)
+
+    @defer.inlineCallbacks
+    def _resetUnclaimedQueue(self, bldr):
+        builderid = yield bldr.getBuilderId()
+        self._unclaimedQueues.pop(builderid, None)
+
+    @defer.inlineCallbacks
+    def _getOldestRequestTime(self, bldr):
+        # use the queue when we have one, rather than asking the builder to
+        # query the database
+        queue = self._unclaimedQueues.get((yield bldr.getBuilderId()))
+        if queue is None:
+            time = yield bldr.getOldestRequestTime()
+        else:
+            time = queue.oldestSubmittedAt()
+        defer.returnValue(time)
+
     def maybeStartBuildsOn(self, new_builders):
         """
         Try to start any builds that can be started right now.  This function
@@ -359,12 +526,28 @@ class BuildRequestDistributor(service.AsyncMultiService):
         existing_pending = set(self._pending_builders)
 
         # if we won't add any builders, there's nothing to do
-        if new_builders < existing_pending:
+        if new_builders <= existing_pending:
             return defer.succeed(None)
 
+        # if a call is already waiting to sort the pending builders, let it
+        # sort these builders too, so that a burst of calls only sorts the
+        # builders once; the callers still wait for it to be done
+        if self._queued_builders is not None:
+            self._queued_builders.update(new_builders)
+            d = defer.Deferred()
+
+            @self._queued_reset.addBoth
+            def fire(res):
+                d.callback(None)
+                return res
+            return d
+        self._queued_builders = new_builders
+
         # reset the list of pending builders
         @defer.inlineCallbacks
-        def resetPendingBuildersList(new_builders):
+        def resetPendingBuildersList():
+            new_builders = self._queued_builders
+            self._queued_builders = None
             try:
                 # re-fetch existing_pending, in case it has changed
                 # while acquiring the lock
@@ -383,8 +566,9 @@ class BuildRequestDistributor(service.AsyncMultiService):
                 log.err(Failure(),
                         "while attempting to start builds on %s" % self.name)
 
-        return self.pending_builders_lock.run(
-            resetPendingBuildersList, new_builders)
+        self._queued_reset = self.pending_builders_lock.run(
+            resetPendingBuildersList)
+        return self._queued_reset
 
     @defer.inlineCallbacks
     def _defaultSorter(self, master, builders):
@@ -394,8 +578,7 @@ class BuildRequestDistributor(service.AsyncMultiService):
         # into sys.maxint so that it sorts to the end
 
         def xform(bldr):
-            d = defer.maybeDeferred(lambda:
-                                    bldr.getOldestRequestTime())
+            d = self._getOldestRequestTime(bldr)
             d.addCallback(lambda time:
                           (((time is None) and None or time), bldr))
             return d
@@ -488,33 +671,45 @@ class BuildRequestDistributor(service.AsyncMultiService):
     def _maybeStartBuildsOnBuilder(self, bldr, _reactor=reactor):
         # create a chooser to give us our next builds
         # this object is temporary and will go away when we're done
-        bc = self.createBuildChooser(bldr, self.master)
+        bc = yield self.createBuildChooser(bldr, self.master)
 
-        while True:
-            worker, breqs = yield bc.chooseNextBuild()
-            if not worker or not breqs:
-                break
+        try:
+            while True:
+                worker, breqs = yield bc.chooseNextBuild()
+                if not worker or not breqs:
+                    break
 
-            # claim brid's
-            brids = [br.id for br in breqs]
-            claimed_at_epoch = _reactor.seconds()
-            claimed_at = epoch2datetime(claimed_at_epoch)
-            if not (yield self.master.data.updates.claimBuildRequests(
-                    brids, claimed_at=claimed_at)):
-                # some brids were already claimed, so start over
-                bc = self.createBuildChooser(bldr, self.master)
-                continue
-
-            buildStarted = yield bldr.maybeStartBuild(worker, breqs)
-            if not buildStarted:
-                yield self.master.data.updates.unclaimBuildRequests(brids)
-                # try starting builds again.  If we still have a working worker,
-                # then this may re-claim the same buildrequests
-                self.botmaster.maybeStartBuildsForBuilder(self.name)
+                # claim brid's
+                brids = [br.id for br in breqs]
+                claimed_at_epoch = _reactor.seconds()
+                claimed_at = epoch2datetime(claimed_at_epoch)
+                if not (yield self.master.data.updates.claimBuildRequests(
+                        brids, claimed_at=claimed_at)):
+                    # some brids were already claimed, so our queue is out
+                    # of date; refetch it and start over
+                    yield self._resetUnclaimedQueue(bldr)
+                    bc = yield self.createBuildChooser(bldr, self.master)
+                    continue
+
+                buildStarted = yield bldr.maybeStartBuild(worker, breqs)
+                if buildStarted:
+                    bc.forgetBuildRequests(brids)
+                else:
+                    # the requests will be put back on the queue below
+                    yield self.master.data.updates.unclaimBuildRequests(brids)
+                    # try starting builds again.  If we still have a working worker,
+                    # then this may re-claim the same buildrequests
+                    self.botmaster.maybeStartBuildsForBuilder(self.name)
+        finally:
+            bc.restoreBuildRequests()
 
+    @defer.inlineCallbacks
     def createBuildChooser(self, bldr, master):
-        # just instantiate the build chooser requested
-        return self.BuildChooser(bldr, master)
+        # instantiate the build chooser requested, and hand it the queue of
+        # unclaimed requests for this builder
+        bc = self.BuildChooser(bldr, master)
+        bc.unclaimedQueue = yield self._getUnclaimedQueue(bldr)
+        defer.returnValue(bc)
 
     def _quiet(self):
         # shim for tests
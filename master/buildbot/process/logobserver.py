@@ -66,20 +66,48 @@ class LogLineObserver(LogObserver):
         """
         self.max_length = max_length
 
-    def _lineReceived(self, data, delimiter, funcReceived):
-        for line in data.rstrip().split(delimiter):
-            if len(line) > self.max_length:
-                continue
-            funcReceived(line)
+    def _splitLines(self, data, delimiter):
+        return [line for line in data.rstrip().split(delimiter)
+                if len(line) <= self.max_length]
 
     def outReceived(self, data):
-        self._lineReceived(data, self.stdoutDelimiter, self.outLineReceived)
+        self.outLinesReceived(self._splitLines(data, self.stdoutDelimiter))
 
     def errReceived(self, data):
-        self._lineReceived(data, self.stderrDelimiter, self.errLineReceived)
+        self.errLinesReceived(self._splitLines(data, self.stderrDelimiter))
 
     def headerReceived(self, data):
-        self._lineReceived(data, self.headerDelimiter, self.headerLineReceived)
+        self.headerLinesReceived(
+            self._splitLines(data, self.headerDelimiter))
+
+    def _isOverridden(self, funcReceived, baseFuncReceived):
+        return getattr(funcReceived, '__func__', None) is not \
+            getattr(baseFuncReceived, '__func__', baseFuncReceived)
+
+    def _adaptLines(self, lines, funcReceived, baseFuncReceived):
+        # don't call the line method for each line if it does nothing
+        if not self._isOverridden(funcReceived, baseFuncReceived):
+            return
+        for line in lines:
+            funcReceived(line)
+
+    def outLinesReceived(self, lines):
+        """This will be called with the list of complete stdout lines (not
+        including the delimiter) of each chunk of the log.  By default, it
+        calls outLineReceived for each line; override this in your observer
+        to handle the lines of a chunk at once."""
+        self._adaptLines(lines, self.outLineReceived,
+                         LogLineObserver.outLineReceived)
+
+    def errLinesReceived(self, lines):
+        """Like outLinesReceived, for the lines of stderr."""
+        self._adaptLines(lines, self.errLineReceived,
+                         LogLineObserver.errLineReceived)
+
+    def headerLinesReceived(self, lines):
+        """Like outLinesReceived, for the header lines."""
+        self._adaptLines(lines, self.headerLineReceived,
+                         LogLineObserver.headerLineReceived)
 
     def outLineReceived(self, line):
         """This will be called with complete stdout lines (not including the
@@ -114,6 +142,19 @@ class LineConsumerLogObserver(LogLineObserver):
         self.feed = self.generator.send
         self.feed(input)
 
+    def _feedLines(self, stream, lines):
+        for line in lines:
+            self.feed((stream, line))
+
+    def outLinesReceived(self, lines):
+        self._feedLines('o', lines)
+
+    def errLinesReceived(self, lines):
+        self._feedLines('e', lines)
+
+    def headerLinesReceived(self, lines):
+        self._feedLines('h', lines)
+
     def outLineReceived(self, line):
         self.feed(('o', line))
 
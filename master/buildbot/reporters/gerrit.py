@@ -276,6 +276,8 @@ class GerritStatusPush(service.BuildbotService):
     def buildStarted(self, key, build):
         if self.startCB is None:
             return
+        # messages are read-only, and we add the details to the build
+        build = build.copy()
         yield self.getBuildDetails(build)
         if self.isBuildReported(build):
             result = yield self.startCB(build['builder']['name'], build, self.startArg)
@@ -285,6 +287,7 @@ class GerritStatusPush(service.BuildbotService):
     def buildComplete(self, key, build):
         if self.reviewCB is None:
             return
+        build = build.copy()
         yield self.getBuildDetails(build)
         if self.isBuildReported(build):
             result = yield self.reviewCB(build['builder']['name'], build, build['results'], self.master, self.reviewArg)
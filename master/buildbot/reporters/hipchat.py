@@ -36,11 +36,11 @@ class HipChatStatusPush(HttpStatusPushBase):
 
     @defer.inlineCallbacks
     def buildStarted(self, key, build):
-        yield self.send(build, key[2])
+        yield self.send(build.copy(), key[2])
 
     @defer.inlineCallbacks
     def buildFinished(self, key, build):
-        yield self.send(build, key[2])
+        yield self.send(build.copy(), key[2])
 
     @defer.inlineCallbacks
     def getBuildDetailsAndSendMessage(self, build, key):
@@ -73,10 +73,11 @@ class HttpStatusPushBase(service.BuildbotService):
         self.session.close()
 
     def buildStarted(self, key, build):
-        return self.getMoreInfoAndSend(build)
+        # messages are read-only, and we add the details to the build
+        return self.getMoreInfoAndSend(build.copy())
 
     def buildFinished(self, key, build):
-        return self.getMoreInfoAndSend(build)
+        return self.getMoreInfoAndSend(build.copy())
 
     def filterBuilds(self, build):
         if self.builders is not None:
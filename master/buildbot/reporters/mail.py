@@ -251,6 +251,8 @@ class MailNotifier(service.BuildbotService):
     def buildComplete(self, key, build):
         if self.buildSetSummary:
             return
+        # messages are read-only, and we add the details to the build
+        build = build.copy()
         br = yield self.master.data.get(("buildrequests", build['buildrequestid']))
         buildset = yield self.master.data.get(("buildsets", br['buildsetid']))
         yield utils.getDetailsForBuilds(
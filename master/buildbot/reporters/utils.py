@@ -22,18 +22,52 @@ from buildbot.process.results import RETRY
 from buildbot.util import flatten
 
 
+# the number of log contents that getDetailsForBuilds fetches at once; they
+# can be big, so they are not all requested in parallel
+MAX_PARALLEL_LOG_FETCHES = 8
+
+# getDetailsForBuilds gets the logs of this many steps per data API call
+LOGS_STEPS_BATCH_SIZE = 100
+
+
 @defer.inlineCallbacks
 def getPreviousBuild(master, build):
     # naive n-1 algorithm. Still need to define what we should skip
     # SKIP builds? forced builds? rebuilds?
     # dont hesitate to contribute improvments to that algorithm
-    n = build['number'] - 1
-    while n >= 0:
-        prev = yield master.data.get(("builders", build['builderid'], "builds", n))
-        if prev['results'] != RETRY:
-            defer.returnValue(prev)
-        n -= 1
-    defer.returnValue(None)
+    prevs = yield master.data.get(
+        ("builders", build['builderid'], "builds"),
+        filters=[resultspec.Filter('number', 'lt', [build['number']]),
+                 resultspec.Filter('results', 'ne', [RETRY])],
+        order=['-number'], limit=1)
+    defer.returnValue(prevs[0] if prevs else None)
+
+
+@defer.inlineCallbacks
+def getLogsForSteps(master, steps, wantContents=False):
+    # set the 'logs' of each of the step dicts, getting the logs of many
+    # steps with each data API call
+    stepsbyid = {}
+    for s in steps:
+        s['logs'] = []
+        stepsbyid[s['stepid']] = s
+    stepids = sorted(stepsbyid)
+    batches = yield defer.gatherResults([
+        master.data.get(("logs",), filters=[
+            resultspec.Filter('stepid', 'eq',
+                              stepids[i:i + LOGS_STEPS_BATCH_SIZE])])
+        for i in range(0, len(stepids), LOGS_STEPS_BATCH_SIZE)])
+    logs = flatten(batches, types=(list, UserList))
+    for l in sorted(logs, key=lambda l: l['logid']):
+        stepsbyid[l['stepid']]['logs'].append(l)
+
+    if wantContents:
+        sem = defer.DeferredSemaphore(MAX_PARALLEL_LOG_FETCHES)
+        contents = yield defer.gatherResults([
+            sem.run(master.data.get, ("logs", l['logid'], 'contents'))
+            for l in logs])
+        for l, content in zip(logs, contents):
+            l['content'] = content
 
 
 @defer.inlineCallbacks
@@ -104,10 +138,9 @@ def getDetailsForBuilds(master, buildset, builds, wantProperties=False, wantStep
             [master.data.get(("builds", build['buildid'], 'steps'))
              for build in builds])
         if wantLogs:
-            for s in flatten(buildsteps, types=(list, UserList)):
-                s['logs'] = yield master.data.get(("steps", s['stepid'], 'logs'))
-                for l in s['logs']:
-                    l['content'] = yield master.data.get(("logs", l['logid'], 'contents'))
+            yield getLogsForSteps(master,
+                                  flatten(buildsteps, types=(list, UserList)),
+                                  wantContents=True)
 
     else:  # we still need a list for the big zip
         buildsteps = range(len(builds))
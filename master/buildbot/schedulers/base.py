@@ -20,7 +20,6 @@ from zope.interface import implements
 
 from buildbot import config
 from buildbot import interfaces
-from buildbot.changes import changes
 from buildbot.process.properties import Properties
 from buildbot.util.service import ClusteredBuildbotService
 from buildbot.util.state import StateMixin
@@ -123,25 +122,21 @@ class BaseScheduler(ClusteredBuildbotService, StateMixin):
                               onlyImportant=False):
         assert fileIsImportant is None or callable(fileIsImportant)
 
-        # register for changes with the data API
+        # register for changes with the master's change dispatcher, which
+        # loads each change once for all of the schedulers
         assert not self._change_consumer
-        self._change_consumer = yield self.master.mq.startConsuming(
-            lambda k, m: self._changeCallback(k, m, fileIsImportant,
-                                              change_filter, onlyImportant),
-            ('changes', None, 'new'))
+        self._change_consumer = yield self.master.change_dispatcher.subscribe(
+            lambda change: self._changeCallback(change, fileIsImportant,
+                                                change_filter, onlyImportant),
+            change_filter)
 
-    @defer.inlineCallbacks
-    def _changeCallback(self, key, msg, fileIsImportant, change_filter,
+    def _changeCallback(self, change, fileIsImportant, change_filter,
                         onlyImportant):
 
         # ignore changes delivered while we're not running
         if not self._change_consumer:
             return
 
-        # get a change object, since the API requires it
-        chdict = yield self.master.db.changes.getChange(msg['changeid'])
-        change = yield changes.Change.fromChdict(self.master, chdict)
-
         # filter it
         if change_filter and not change_filter.filter_change(change):
             return
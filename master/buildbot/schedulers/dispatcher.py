@@ -0,0 +1,158 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import itertools
+
+from future.utils import itervalues
+from twisted.internet import defer
+from twisted.python import log
+
+from buildbot.changes import changes
+from buildbot.util import service
+
+
+class ChangeSubscription(object):
+
+    """
+    A scheduler's subscription to the changes of a L{ChangeDispatcher}; like
+    the result of C{mq.startConsuming}, it has a C{stopConsuming} method.
+    """
+
+    def __init__(self, dispatcher, callback, change_filter, order):
+        self.dispatcher = dispatcher
+        self.callback = callback
+        self.change_filter = change_filter
+        self.order = order
+
+    def stopConsuming(self):
+        self.dispatcher._unsubscribe(self)
+
+
+class ChangeDispatcher(service.AsyncService):
+
+    """
+    Deliver the new changes of a master to its schedulers.  The master has
+    one of these as its C{change_dispatcher} service.
+
+    A single message queue consumer loads each change from the database, and
+    makes a L{Change} of it, for all of the schedulers.  The change is then
+    only delivered to the schedulers whose change filter could accept it: the
+    filters that check a change attribute against a list of values are
+    indexed by that attribute, so that they are not evaluated for changes
+    that they would reject anyway.
+    """
+
+    # attributes used to index change filters, in order of preference
+    INDEXED_ATTRIBUTES = ('branch', 'project', 'repository', 'codebase')
+
+    name = 'change_dispatcher'
+
+    def __init__(self):
+        self.consumer = None
+        self.subscriptions = set()
+        # subscriptions with no indexed check, and those with one, as
+        # {attribute: {value: set of subscriptions}}
+        self.unindexed = set()
+        self.index = dict((attr, {}) for attr in self.INDEXED_ATTRIBUTES)
+        self._order = itertools.count()
+        self._consumer_lock = defer.DeferredLock()
+
+    @defer.inlineCallbacks
+    def subscribe(self, callback, change_filter=None):
+        """
+        Call C{callback(change)} with each new change that C{change_filter}
+        might accept (the callback must still apply the filter itself).
+
+        @returns: L{ChangeSubscription} via Deferred
+        """
+        sub = ChangeSubscription(self, callback, change_filter,
+                                 next(self._order))
+        self.subscriptions.add(sub)
+        attr, values = self._getIndexKey(change_filter)
+        if attr is None:
+            self.unindexed.add(sub)
+        else:
+            for value in values:
+                self.index[attr].setdefault(value, set()).add(sub)
+        yield self._consumer_lock.run(self._updateConsumer)
+        defer.returnValue(sub)
+
+    def _unsubscribe(self, sub):
+        if sub not in self.subscriptions:
+            return
+        self.subscriptions.remove(sub)
+        self.unindexed.discard(sub)
+        for byvalue in itervalues(self.index):
+            for value, subs in list(byvalue.items()):
+                subs.discard(sub)
+                if not subs:
+                    del byvalue[value]
+        d = self._consumer_lock.run(self._updateConsumer)
+        d.addErrback(log.err, 'while stopping to consume changes')
+
+    @defer.inlineCallbacks
+    def _updateConsumer(self):
+        # consume changes if, and only if, there are subscriptions
+        if self.subscriptions and not self.consumer:
+            self.consumer = yield self.master.mq.startConsuming(
+                self._changeCallback, ('changes', None, 'new'))
+        elif not self.subscriptions and self.consumer:
+            self.consumer.stopConsuming()
+            self.consumer = None
+
+    def _getIndexKey(self, change_filter):
+        # return the attribute by which to index a change filter, and the
+        # values it accepts, or (None, None)
+        checks = getattr(change_filter, 'checks', None)
+        if not isinstance(checks, dict):
+            return None, None
+        for attr in self.INDEXED_ATTRIBUTES:
+            filt_list = checks.get(attr, (None,))[0]
+            if filt_list is not None:
+                try:
+                    return attr, set(filt_list)
+                except TypeError:
+                    # unhashable values
+                    return None, None
+        return None, None
+
+    def getSubscriptionsForChange(self, change):
+        subs = set(self.unindexed)
+        for attr, byvalue in self.index.items():
+            value = getattr(change, attr, '')
+            try:
+                subs.update(byvalue.get(value, ()))
+            except TypeError:
+                # unhashable value: check every filter indexed by attr
+                for s in itervalues(byvalue):
+                    subs.update(s)
+        return sorted(subs, key=lambda sub: sub.order)
+
+    @defer.inlineCallbacks
+    def _changeCallback(self, key, msg):
+        try:
+            chdict = yield self.master.db.changes.getChange(msg['changeid'])
+            change = yield changes.Change.fromChdict(self.master, chdict)
+        except Exception:
+            log.err(None, 'while loading change %s' % (msg.get('changeid'),))
+            return
+        for sub in self.getSubscriptionsForChange(change):
+            # an earlier callback may have unsubscribed this one
+            if sub not in self.subscriptions:
+                continue
+            try:
+                sub.callback(change)
+            except Exception:
+                log.err(None, 'while delivering change %s' % (change.number,))
@@ -112,41 +112,57 @@ class MtrLogObserver(LogLineObserver):
         d = loog.waitUntilFinished()
         d.addCallback(lambda l: self.closeTestFail())
 
-    def outLineReceived(self, line):
-        stripLine = line.strip("\r\n")
-        m = self._line_re.search(stripLine)
-        if m:
-            testname, variant, worker, result, info = m.groups()
-            self.closeTestFail()
-            self.numTests += 1
-            self.step.setProgress('tests', self.numTests)
-
-            if result == "fail":
-                if variant is None:
-                    variant = ""
-                else:
-                    variant = variant[2:-1]
-                self.openTestFail(
-                    testname, variant, result, info, stripLine + "\n")
-
+    def outLinesReceived(self, lines):
+        # subclasses overriding outLineReceived still get every line
+        if self._isOverridden(self.outLineReceived,
+                              MtrLogObserver.outLineReceived):
+            for line in lines:
+                self.outLineReceived(line)
         else:
-            m = self._line_re3.search(stripLine)
+            self._processOutLines(lines)
 
+    def _processOutLines(self, lines):
+        numTests = self.numTests
+        for line in lines:
+            stripLine = line.strip("\r\n")
+            m = self._line_re.search(stripLine)
             if m:
-                stuff = m.group(1)
-                self.closeTestFail()
-                testList = stuff.split(" ")
-                self.doCollectWarningTests(testList)
-            elif (self._line_re2.search(stripLine) or
-                  self._line_re4.search(stripLine) or
-                  self._line_re5.search(stripLine) or
-                  stripLine == "Test suite timeout! Terminating..." or
-                  stripLine.startswith("mysql-test-run: *** ERROR: Not all tests completed") or
-                  (stripLine.startswith("------------------------------------------------------------")
-                   and self.testFail is not None)):
+                testname, variant, worker, result, info = m.groups()
                 self.closeTestFail()
+                self.numTests += 1
+
+                if result == "fail":
+                    if variant is None:
+                        variant = ""
+                    else:
+                        variant = variant[2:-1]
+                    self.openTestFail(
+                        testname, variant, result, info, stripLine + "\n")
+
             else:
-                self.addTestFailOutput(stripLine + "\n")
+                m = self._line_re3.search(stripLine)
+
+                if m:
+                    stuff = m.group(1)
+                    self.closeTestFail()
+                    testList = stuff.split(" ")
+                    self.doCollectWarningTests(testList)
+                elif (self._line_re2.search(stripLine) or
+                      self._line_re4.search(stripLine) or
+                      self._line_re5.search(stripLine) or
+                      stripLine == "Test suite timeout! Terminating..." or
+                      stripLine.startswith("mysql-test-run: *** ERROR: Not all tests completed") or
+                      (stripLine.startswith("------------------------------------------------------------")
+                       and self.testFail is not None)):
+                    self.closeTestFail()
+                else:
+                    self.addTestFailOutput(stripLine + "\n")
+        # report the progress once for the whole chunk
+        if self.numTests != numTests:
+            self.step.setProgress('tests', self.numTests)
+
+    def outLineReceived(self, line):
+        self._processOutLines([line])
 
     def openTestFail(self, testname, variant, result, info, line):
         self.testFail = MtrTestFailData(
@@ -99,6 +99,7 @@ class HLint(ShellCommand):
 
 class TrialTestCaseCounter(logobserver.LogLineObserver):
     _line_re = re.compile(r'^(?:Doctest: )?([\w\.]+) \.\.\. \[([^\]]+)\]$')
+    _ran_re = re.compile(r'Ran (\d+) tests')
 
     def __init__(self):
         logobserver.LogLineObserver.__init__(self)
@@ -112,7 +113,16 @@ class TrialTestCaseCounter(logobserver.LogLineObserver):
                        'unexpectedSuccesses': 0,
                        }
 
-    def outLineReceived(self, line):
+    def outLinesReceived(self, lines):
+        # subclasses overriding outLineReceived still get every line
+        if self._isOverridden(self.outLineReceived,
+                              TrialTestCaseCounter.outLineReceived):
+            for line in lines:
+                self.outLineReceived(line)
+        else:
+            self._processOutLines(lines)
+
+    def _processOutLines(self, lines):
         # different versions of Twisted emit different per-test lines with
         # the bwverbose reporter.
         #  2.0.0: testSlave (buildbot.test.test_runner.Create) ... [OK]
@@ -122,44 +132,51 @@ class TrialTestCaseCounter(logobserver.LogLineObserver):
         # Note that doctests create lines line this:
         #  Doctest: viff.field.GF ... [OK]
 
-        if line.startswith("=" * 40):
-            self.finished = True
-        if not self.finished:
-            m = self._line_re.search(line.strip())
-            if m:
-                testname, result = m.groups()
-                self.numTests += 1
-                self.step.setProgress('tests', self.numTests)
-
-        out = re.search(r'Ran (\d+) tests', line)
-        if out:
-            self.counts['total'] = int(out.group(1))
-        if (line.startswith("OK") or
-            line.startswith("FAILED ") or
-                line.startswith("PASSED")):
-            # the extra space on FAILED_ is to distinguish the overall
-            # status from an individual test which failed. The lack of a
-            # space on the OK is because it may be printed without any
-            # additional text (if there are no skips,etc)
-            out = re.search(r'failures=(\d+)', line)
-            if out:
-                self.counts['failures'] = int(out.group(1))
-            out = re.search(r'errors=(\d+)', line)
-            if out:
-                self.counts['errors'] = int(out.group(1))
-            out = re.search(r'skips=(\d+)', line)
+        numTests = self.numTests
+        for line in lines:
+            if line.startswith("=" * 40):
+                self.finished = True
+            if not self.finished:
+                m = self._line_re.search(line.strip())
+                if m:
+                    testname, result = m.groups()
+                    self.numTests += 1
+
+            out = self._ran_re.search(line)
             if out:
-                self.counts['skips'] = int(out.group(1))
-            out = re.search(r'expectedFailures=(\d+)', line)
-            if out:
-                self.counts['expectedFailures'] = int(out.group(1))
-            out = re.search(r'unexpectedSuccesses=(\d+)', line)
-            if out:
-                self.counts['unexpectedSuccesses'] = int(out.group(1))
-            # successes= is a Twisted-2.0 addition, and is not currently used
-            out = re.search(r'successes=(\d+)', line)
-            if out:
-                self.counts['successes'] = int(out.group(1))
+                self.counts['total'] = int(out.group(1))
+            if (line.startswith("OK") or
+                line.startswith("FAILED ") or
+                    line.startswith("PASSED")):
+                # the extra space on FAILED_ is to distinguish the overall
+                # status from an individual test which failed. The lack of a
+                # space on the OK is because it may be printed without any
+                # additional text (if there are no skips,etc)
+                out = re.search(r'failures=(\d+)', line)
+                if out:
+                    self.counts['failures'] = int(out.group(1))
+                out = re.search(r'errors=(\d+)', line)
+                if out:
+                    self.counts['errors'] = int(out.group(1))
+                out = re.search(r'skips=(\d+)', line)
+                if out:
+                    self.counts['skips'] = int(out.group(1))
+                out = re.search(r'expectedFailures=(\d+)', line)
+                if out:
+                    self.counts['expectedFailures'] = int(out.group(1))
+                out = re.search(r'unexpectedSuccesses=(\d+)', line)
+                if out:
+                    self.counts['unexpectedSuccesses'] = int(out.group(1))
+                # successes= is a Twisted-2.0 addition, not currently used
+                out = re.search(r'successes=(\d+)', line)
+                if out:
+                    self.counts['successes'] = int(out.group(1))
+        # report the progress once for the whole chunk
+        if self.numTests != numTests:
+            self.step.setProgress('tests', self.numTests)
+
+    def outLineReceived(self, line):
+        self._processOutLines([line])
 
 UNSPECIFIED = ()  # since None is a valid choice
 
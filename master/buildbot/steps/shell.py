@@ -14,6 +14,8 @@
 # Copyright Buildbot Team Members
 import inspect
 import re
+import sre_constants
+import sre_parse
 
 from future.utils import iteritems
 from twisted.python import failure
@@ -375,6 +377,167 @@ class Configure(ShellCommand):
     command = ["./configure"]
 
 
+def _compilePattern(pattern):
+    if pattern is not None and isinstance(pattern, basestring):
+        pattern = re.compile(pattern)
+    return pattern
+
+
+def _requiredLiteral(regex):
+    """
+    Return the longest ASCII literal that any match of C{regex} must contain,
+    or None if there is no such literal we can find.
+    """
+    if regex.flags & (re.LOCALE | re.VERBOSE):
+        return None
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except Exception:
+        return None
+
+    def ops(items):
+        # the items of a sequence, with those of its groups inlined
+        for op, av in items:
+            if op == sre_constants.SUBPATTERN and len(av) in (2, 4) \
+                    and not any(av[1:-1]):
+                for item in ops(av[-1]):
+                    yield item
+            else:
+                yield op, av
+
+    longest, run = '', []
+    for op, av in ops(parsed):
+        if op == sre_constants.LITERAL and av < 128:
+            run.append(chr(av))
+            continue
+        longest = max(longest, ''.join(run), key=len)
+        run = []
+    longest = max(longest, ''.join(run), key=len)
+    return longest or None
+
+
+def _combinePatterns(regexes):
+    """
+    Return a regular expression that matches wherever one of C{regexes}
+    matches, or None if they cannot be combined.
+    """
+    if not regexes or not all(hasattr(r, 'pattern') for r in regexes):
+        return None
+    flags = set(r.flags for r in regexes)
+    if len(flags) != 1 or any(r.groups for r in regexes):
+        return None
+    flags = flags.pop()
+    if flags & re.VERBOSE or any(re.search(r'\(\?[aiLmsux]', r.pattern)
+                                 for r in regexes):
+        return None
+
+    # only whether a search finds a match matters, so unbounded wildcards at
+    # either end of the patterns, and duplicate patterns, can be left out
+    patterns = []
+    for regex in regexes:
+        pattern = regex.pattern
+        if (pattern.startswith('.*') and
+                pattern[2:3] not in ('*', '+', '?', '{')):
+            pattern = pattern[2:]
+        if pattern.endswith('.*') and not pattern.endswith('\\.*'):
+            pattern = pattern[:-2]
+        if pattern not in patterns:
+            patterns.append(pattern)
+    try:
+        return re.compile('|'.join('(?:%s)' % p for p in patterns), flags)
+    except (re.error, TypeError):
+        return None
+
+
+class _WarningCountingLogObserver(logobserver.LogObserver):
+
+    """
+    Find the warnings in the log of a L{WarningCountingShellCommand}, a chunk
+    at a time.
+
+    Each pattern of the step yields a literal that its matches must contain,
+    if it has one.  Only the lines of a chunk that contain one of these
+    literals are matched against the patterns, the same way as
+    L{WarningCountingShellCommand.warningLogConsumer} matches every line.
+    """
+
+    # the same limit as LogLineObserver
+    max_length = 16384
+
+    def __init__(self):
+        self.warningRe = None
+
+    def _compile(self):
+        step = self.step
+        self.warningRe = _compilePattern(step.warningPattern)
+        self.directoryEnterRe = _compilePattern(step.directoryEnterPattern)
+        self.directoryLeaveRe = _compilePattern(step.directoryLeavePattern)
+
+        # lines that contain none of the required literals can't match
+        self.prefilters = []
+        for regex in (self.warningRe, self.directoryEnterRe,
+                      self.directoryLeaveRe):
+            if regex is None:
+                continue
+            literal = _requiredLiteral(regex)
+            if literal is None:
+                self.prefilters = None
+                break
+            self.prefilters.append(re.compile(
+                re.escape(literal), regex.flags & (re.IGNORECASE | re.UNICODE)))
+
+        step.loggedWarnings = []
+
+    def _candidateLines(self, data):
+        # map the start of each line containing a literal to its end
+        lines = {}
+        for prefilter in self.prefilters:
+            pos = 0
+            while True:
+                match = prefilter.search(data, pos)
+                if not match:
+                    break
+                start = data.rfind('\n', 0, match.start()) + 1
+                end = data.find('\n', match.start())
+                if end == -1:
+                    end = len(data)
+                lines[start] = end
+                pos = end + 1
+        return [data[begin:lines[begin]] for begin in sorted(lines)]
+
+    def _linesReceived(self, data):
+        if self.warningRe is None:
+            self._compile()
+        data = data.rstrip()
+        if self.prefilters is None:
+            lines = data.split('\n')
+        else:
+            lines = self._candidateLines(data)
+        for line in lines:
+            if len(line) > self.max_length:
+                continue
+            self._lineReceived(line)
+
+    outReceived = errReceived = headerReceived = _linesReceived
+
+    def _lineReceived(self, line):
+        step = self.step
+        if self.directoryEnterRe:
+            match = self.directoryEnterRe.search(line)
+            if match:
+                step.directoryStack.append(match.group(1))
+                return
+        if (self.directoryLeaveRe and
+            step.directoryStack and
+                self.directoryLeaveRe.search(line)):
+            step.directoryStack.pop()
+            return
+
+        match = self.warningRe.match(line)
+        if match:
+            step.maybeAddWarning(step.loggedWarnings, line, match)
+
+
 class WarningCountingShellCommand(ShellCommand, CompositeStepMixin):
     renderables = ['suppressionFile']
 
@@ -423,14 +586,21 @@ class WarningCountingShellCommand(ShellCommand, CompositeStepMixin):
                          "is not specified")
 
         self.suppressions = []
+        self._suppressionsRe = None
+        self._suppressionsReCount = 0
         self.directoryStack = []
 
         self.warnCount = 0
         self.loggedWarnings = []
 
-        self.addLogObserver(
-            'stdio',
-            logobserver.LineConsumerLogObserver(self.warningLogConsumer))
+        # subclasses overriding warningLogConsumer get each line of the log
+        if (type(self).warningLogConsumer ==
+                WarningCountingShellCommand.warningLogConsumer):
+            observer = _WarningCountingLogObserver()
+        else:
+            observer = logobserver.LineConsumerLogObserver(
+                self.warningLogConsumer)
+        self.addLogObserver('stdio', observer)
 
     def addSuppression(self, suppressionList):
         """
@@ -526,19 +696,34 @@ class WarningCountingShellCommand(ShellCommand, CompositeStepMixin):
                     file = "%s/%s" % (currentDirectory, file)
 
             # Skip adding the warning if any suppression matches.
-            for fileRe, warnRe, start, end in self.suppressions:
-                if not (file is None or fileRe is None or fileRe.match(file)):
-                    continue
-                if not (warnRe is None or warnRe.search(text)):
-                    continue
-                if not ((start is None and end is None) or
-                        (lineNo is not None and start <= lineNo and end >= lineNo)):
-                    continue
+            if self._isSuppressed(file, lineNo, text):
                 return
 
         warnings.append(line)
         self.warnCount += 1
 
+    def _isSuppressed(self, file, lineNo, text):
+        # suppressions may be appended to the list directly
+        if self._suppressionsReCount != len(self.suppressions):
+            self._suppressionsRe = _combinePatterns(
+                [warnRe for _, warnRe, _, _ in self.suppressions])
+            self._suppressionsReCount = len(self.suppressions)
+
+        # most warnings match none of the suppressions
+        if self._suppressionsRe and not self._suppressionsRe.search(text):
+            return False
+
+        for fileRe, warnRe, start, end in self.suppressions:
+            if not (file is None or fileRe is None or fileRe.match(file)):
+                continue
+            if not (warnRe is None or warnRe.search(text)):
+                continue
+            if not ((start is None and end is None) or
+                    (lineNo is not None and start <= lineNo and end >= lineNo)):
+                continue
+            return True
+        return False
+
     def start(self):
         if self.suppressionFile is None:
             return ShellCommand.start(self)
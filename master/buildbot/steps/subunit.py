@@ -47,9 +47,29 @@ class SubunitLogObserver(logobserver.LogLineObserver, TestResult):
         self.skips = []
         self.seen_tags = set()  # don't yet know what tags does in subunit
 
+    def _processLines(self, lines, funcReceived, baseFuncReceived):
+        # subclasses overriding the line method still get every line
+        if self._isOverridden(funcReceived, baseFuncReceived):
+            for line in lines:
+                funcReceived(line)
+            return
+        # Impedance mismatch: subunit wants lines, observers get lines-no\n
+        lineReceived = self.protocol.lineReceived
+        for line in lines:
+            lineReceived(line + '\n')
+
+    def outLinesReceived(self, lines):
+        """Process received stdout lines."""
+        self._processLines(lines, self.outLineReceived,
+                           SubunitLogObserver.outLineReceived)
+
+    def errLinesReceived(self, lines):
+        """same for stderr lines."""
+        self._processLines(lines, self.errLineReceived,
+                           SubunitLogObserver.errLineReceived)
+
     def outLineReceived(self, line):
         """Process a received stdout line."""
-        # Impedance mismatch: subunit wants lines, observers get lines-no\n
         self.protocol.lineReceived(line + '\n')
 
     def errLineReceived(self, line):
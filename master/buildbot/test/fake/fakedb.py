@@ -27,6 +27,7 @@ from future.utils import itervalues
 from twisted.internet import defer
 from twisted.internet import reactor
 
+from buildbot.data import resultspec
 from buildbot.db import buildrequests
 from buildbot.db import changesources
 from buildbot.db import schedulers
@@ -649,6 +650,39 @@ class FakeDBComponent(object):
         self.t = testcase
         self.setUp()
 
+    def applyResultSpec(self, rows, resultSpec):
+        # mimic ResultSpec.thd_execute: the filters and order on mapped
+        # fields are applied to the dicts, keyed by column name, and removed
+        # from the spec; pagination is applied if nothing is left
+        if resultSpec is None:
+            return rows
+        keys = dict((field, name.split('.')[1])
+                    for field, name in iteritems(resultSpec.fieldMapping))
+        if rows:
+            keys = dict((field, key) for field, key in iteritems(keys)
+                        if key in rows[0])
+        filters = []
+        for f in resultSpec.filters[:]:
+            if f.field in keys and f.op != 'contains':
+                filters.append(resultspec.Filter(keys[f.field], f.op,
+                                                 f.values))
+                resultSpec.filters.remove(f)
+        order = None
+        if resultSpec.order and all(o.lstrip('-') in keys
+                                    for o in resultSpec.order):
+            order = [('-' if o.startswith('-') else '') + keys[o.lstrip('-')]
+                     for o in resultSpec.order]
+            resultSpec.order = None
+        limit = offset = None
+        if not resultSpec.filters and not resultSpec.order:
+            limit, offset = resultSpec.limit, resultSpec.offset
+            resultSpec.removePagination()
+        rv = resultspec.ResultSpec(filters=filters, order=order,
+                                   limit=limit, offset=offset).apply(rows)
+        if limit is None and offset is None:
+            return rv.data
+        return rv
+
 
 class FakeChangeSourcesComponent(FakeDBComponent):
 
@@ -831,6 +865,11 @@ class FakeChangesComponent(FakeDBComponent):
 
         return defer.succeed(self._chdict(row))
 
+    def getChangesByIds(self, changeids):
+        return defer.succeed([self._chdict(self.changes[changeid])
+                              if changeid in self.changes else None
+                              for changeid in changeids])
+
     def getChangeUids(self, changeid):
         try:
             ch_uids = self.changes[changeid]['uids']
@@ -843,9 +882,9 @@ class FakeChangesComponent(FakeDBComponent):
         chdicts = [self._chdict(self.changes[id]) for id in ids[-count:]]
         return defer.succeed(chdicts)
 
-    def getChanges(self):
+    def getChanges(self, resultSpec=None):
         chdicts = [self._chdict(v) for v in itervalues(self.changes)]
-        return defer.succeed(chdicts)
+        return defer.succeed(self.applyResultSpec(chdicts, resultSpec))
 
     def getChangesCount(self):
         return defer.succeed(len(self.changes))
@@ -1133,6 +1172,10 @@ class FakeSourceStampsComponent(FakeDBComponent):
     def getSourceStamp(self, key, no_cache=False):
         return defer.succeed(self._getSourceStamp_sync(key))
 
+    def getSourceStampsByIds(self, ssids):
+        return defer.succeed([self._getSourceStamp_sync(ssid)
+                              for ssid in ssids])
+
     def getSourceStamps(self):
         return defer.succeed([
             self._getSourceStamp_sync(ssid)
@@ -1258,6 +1301,11 @@ class FakeBuildsetsComponent(FakeDBComponent):
         row = self.buildsets[bsid]
         return defer.succeed(self._row2dict(row))
 
+    def getSourceStampIdsForBuildsets(self, bsids):
+        return defer.succeed(dict(
+            (bsid, list(self.buildset_sourcestamps.get(bsid, [])))
+            for bsid in bsids))
+
     def getBuildsets(self, complete=None):
         rv = []
         for bs in itervalues(self.buildsets):
@@ -1643,7 +1691,7 @@ class FakeBuildRequestsComponent(FakeDBComponent):
 
     @defer.inlineCallbacks
     def getBuildRequests(self, builderid=None, complete=None, claimed=None,
-                         bsid=None, branch=None, repository=None):
+                         bsid=None, branch=None, repository=None, resultSpec=None):
         rv = []
         for br in itervalues(self.reqs):
             if builderid and br.builderid != builderid:
@@ -1690,7 +1738,7 @@ class FakeBuildRequestsComponent(FakeDBComponent):
             builder = yield self.db.builders.getBuilder(br.builderid)
             br.buildername = builder["name"]
             rv.append(self._brdictFromRow(br))
-        defer.returnValue(rv)
+        defer.returnValue(self.applyResultSpec(rv, resultSpec))
 
     def claimBuildRequests(self, brids, claimed_at=None, _reactor=reactor):
         for brid in brids:
@@ -1825,7 +1873,8 @@ class FakeBuildsComponent(FakeDBComponent):
                 return defer.succeed(self._row2dict(row))
         return defer.succeed(None)
 
-    def getBuilds(self, builderid=None, buildrequestid=None, workerid=None, complete=None):
+    def getBuilds(self, builderid=None, buildrequestid=None, workerid=None, complete=None,
+                  resultSpec=None):
         ret = []
         for (id, row) in iteritems(self.builds):
             if builderid is not None and row['builderid'] != builderid:
@@ -1838,7 +1887,7 @@ class FakeBuildsComponent(FakeDBComponent):
                 continue
             ret.append(self._row2dict(row))
 
-        return defer.succeed(ret)
+        return defer.succeed(self.applyResultSpec(ret, resultSpec))
 
     def addBuild(self, builderid, buildrequestid, workerid, masterid,
                  state_string, _reactor=reactor):
@@ -1933,7 +1982,7 @@ class FakeStepsComponent(FakeDBComponent):
                 return defer.succeed(self._row2dict(row))
             return defer.succeed(None)
 
-    def getSteps(self, buildid):
+    def getSteps(self, buildid, resultSpec=None):
         ret = []
 
         for row in self.steps.itervalues():
@@ -1942,7 +1991,7 @@ class FakeStepsComponent(FakeDBComponent):
             ret.append(self._row2dict(row))
 
         ret.sort(key=lambda r: r['number'])
-        return defer.succeed(ret)
+        return defer.succeed(self.applyResultSpec(ret, resultSpec))
 
     def addStep(self, buildid, name, state_string, _reactor=reactor):
         validation.verifyType(self.t, 'state_string', state_string,
@@ -2068,11 +2117,11 @@ class FakeLogsComponent(FakeDBComponent):
             return defer.succeed(None)
         return defer.succeed(self._row2dict(row))
 
-    def getLogs(self, stepid=None):
-        return defer.succeed([
+    def getLogs(self, stepid=None, resultSpec=None):
+        return defer.succeed(self.applyResultSpec([
             self._row2dict(row)
             for row in itervalues(self.logs)
-            if row['stepid'] == stepid])
+            if stepid is None or row['stepid'] == stepid], resultSpec))
 
     def getLogLines(self, logid, first_line, last_line):
         if logid not in self.logs or first_line > last_line:
@@ -2102,8 +2151,8 @@ class FakeLogsComponent(FakeDBComponent):
         return defer.succeed((num_lines - len(content), num_lines - 1))
 
     def finishLog(self, logid):
-        if id in self.logs:
-            self.logs['id'].complete = 1
+        if logid in self.logs:
+            self.logs[logid]['complete'] = 1
         return defer.succeed(None)
 
     def compressLog(self, logid):
@@ -22,6 +22,8 @@ from zope.interface import implements
 
 from buildbot import config
 from buildbot import interfaces
+from buildbot.changes.coordinator import PollCoordinator
+from buildbot.schedulers.dispatcher import ChangeDispatcher
 from buildbot.status import build
 from buildbot.test.fake import bworkermanager
 from buildbot.test.fake import fakedata
@@ -54,6 +56,9 @@ class FakeCache(object):
     def put(self, key, val):
         pass
 
+    def __contains__(self, key):
+        return False
+
 
 class FakeCaches(object):
 
@@ -176,6 +181,10 @@ class FakeMaster(service.MasterService):
         self.basedir = 'basedir'
         self.botmaster = FakeBotMaster()
         self.botmaster.setServiceParent(self)
+        self.change_dispatcher = ChangeDispatcher()
+        self.change_dispatcher.setServiceParent(self)
+        self.poll_coordinator = PollCoordinator()
+        self.poll_coordinator.setServiceParent(self)
         self.status = FakeStatus()
         self.status.setServiceParent(self)
         self.name = 'fake:/master'
@@ -90,6 +90,9 @@ class NonThreadPool(object):
         else:
             onResult(True, result)
 
+    def adjustPoolsize(self, minthreads=None, maxthreads=None):
+        pass
+
     def start(self):
         pass
 
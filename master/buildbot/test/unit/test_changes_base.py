@@ -19,6 +19,7 @@ from twisted.internet import task
 from twisted.trial import unittest
 
 from buildbot.changes import base
+from buildbot.changes import coordinator
 from buildbot.test.util import changesource
 
 
@@ -94,6 +95,11 @@ class TestPollingChangeSource(changesource.ChangeSourceMixin, unittest.TestCase)
     def runClockFor(self, _, secs):
         self.clock.pump([1.0] * secs)
 
+    def setPolling(self, **kwargs):
+        self.master.config.polling.update(kwargs)
+        return self.master.poll_coordinator.reconfigServiceWithBuildbotConfig(
+            self.master.config)
+
     def test_loop_loops(self):
         # track when poll() gets called
         loops = []
@@ -177,3 +183,91 @@ class TestPollingChangeSource(changesource.ChangeSourceMixin, unittest.TestCase)
             self.assertEqual(loops, [0.0, 5.0, 10.0])
         reactor.callWhenRunning(d.callback, None)
         return d
+
+    def test_loop_jitter(self):
+        # track when poll() gets called
+        loops = []
+        self.changesource.poll = \
+            lambda: loops.append(self.clock.seconds())
+
+        self.setPolling(jitter=1)
+        self.patch(coordinator.random, 'random', lambda: 0.4)
+        self.changesource.pollInterval = 5
+        self.startChangeSource()
+
+        d = defer.Deferred()
+        d.addCallback(self.runClockFor, 12)
+
+        @d.addCallback
+        def check(_):
+            # the first poll is brought forward, and the next ones follow
+            self.assertEqual(loops, [3.0, 8.0])
+        reactor.callWhenRunning(d.callback, None)
+        return d
+
+    def test_pollAtLaunch_jitter(self):
+        # track when poll() gets called
+        loops = []
+        self.changesource.poll = \
+            lambda: loops.append(self.clock.seconds())
+
+        self.setPolling(jitter=1)
+        self.patch(coordinator.random, 'random', lambda: 0.4)
+        self.changesource.pollInterval = 5
+        self.changesource.pollAtLaunch = True
+        self.startChangeSource()
+
+        d = defer.Deferred()
+        d.addCallback(self.runClockFor, 12)
+
+        @d.addCallback
+        def check(_):
+            # the launch poll is delayed by a part of the interval
+            self.assertEqual(loops, [2.0, 7.0, 12.0])
+        reactor.callWhenRunning(d.callback, None)
+        return d
+
+    def test_loop_adapts_interval(self):
+        loops = []
+
+        def poll():
+            loops.append(self.clock.seconds())
+            if self.clock.seconds() >= 40:
+                return self.changesource.addChange(author=u'me')
+        self.changesource.poll = poll
+        self.changesource.countsChanges = True
+
+        self.setPolling(max_interval_factor=3)
+        self.changesource.pollInterval = 4
+        self.startChangeSource()
+
+        d = defer.Deferred()
+        d.addCallback(self.runClockFor, 50)
+
+        @d.addCallback
+        def check(_):
+            # the interval grows while no changes are found, up to 12s, and
+            # goes back to 4s after changes are found
+            self.assertEqual(loops, [4.0, 10.0, 19.0, 31.0, 43.0, 47.0])
+        reactor.callWhenRunning(d.callback, None)
+        return d
+
+    def test_loop_keeps_interval_without_counting_changes(self):
+        loops = []
+
+        def poll():
+            loops.append(self.clock.seconds())
+        self.changesource.poll = poll
+
+        self.setPolling(max_interval_factor=3)
+        self.changesource.pollInterval = 4
+        self.startChangeSource()
+
+        d = defer.Deferred()
+        d.addCallback(self.runClockFor, 20)
+
+        @d.addCallback
+        def check(_):
+            self.assertEqual(loops, [4.0, 8.0, 12.0, 16.0, 20.0])
+        reactor.callWhenRunning(d.callback, None)
+        return d
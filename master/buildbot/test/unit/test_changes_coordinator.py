@@ -0,0 +1,125 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+import mock
+from twisted.internet import defer
+from twisted.internet import task
+from twisted.trial import unittest
+
+from buildbot.changes import coordinator
+from buildbot.test.fake import fakemaster
+
+
+class PollCoordinator(unittest.TestCase):
+
+    def setUp(self):
+        self.master = fakemaster.make_master(testcase=self)
+        self.coordinator = self.master.poll_coordinator
+        self.coordinator._reactor = self.clock = task.Clock()
+
+    def setPolling(self, **kwargs):
+        self.master.config.polling.update(kwargs)
+        return self.coordinator.reconfigServiceWithBuildbotConfig(
+            self.master.config)
+
+    def test_master_service(self):
+        self.assertIsInstance(self.coordinator, coordinator.PollCoordinator)
+        self.assertIdentical(self.coordinator.master, self.master)
+
+    def test_config_unconfigured_master(self):
+        self.assertEqual(self.coordinator.config,
+                         coordinator.PollCoordinator.DEFAULT_CONFIG)
+        self.assertEqual(self.coordinator.getStartDelay(60), None)
+        self.assertEqual(self.coordinator.getStartDelay(60, now=True), None)
+
+    def test_reconfig(self):
+        self.master.config.polling['jitter'] = 0.5
+        self.assertEqual(self.coordinator.config['jitter'], 0)
+        self.coordinator.reconfigServiceWithBuildbotConfig(self.master.config)
+        self.assertEqual(self.coordinator.config['jitter'], 0.5)
+
+    def test_getStartDelay(self):
+        self.assertEqual(self.coordinator.getStartDelay(60), None)
+        self.setPolling(jitter=0.5)
+        self.patch(coordinator.random, 'random', lambda: 0.5)
+        self.assertEqual(self.coordinator.getStartDelay(60), 45)
+        self.assertEqual(self.coordinator.getStartDelay(60, now=True), 15)
+
+    def test_getNextInterval(self):
+        getNextInterval = self.coordinator.getNextInterval
+        self.assertEqual(getNextInterval(60, 60, False), 60)
+        self.setPolling(max_interval_factor=2)
+        self.assertEqual(getNextInterval(60, 60, False), 90)
+        self.assertEqual(getNextInterval(60, 90, False), 120)
+        self.assertEqual(getNextInterval(60, 120, True), 60)
+
+    @defer.inlineCallbacks
+    def test_poll(self):
+        source = mock.Mock(pollInterval=60, currentPollInterval=60,
+                           changesFound=0, countsChanges=True)
+        self.setPolling(max_interval_factor=4)
+
+        yield self.coordinator.poll(source)
+        self.assertEqual(source.currentPollInterval, 90)
+        source.doPoll.setInterval.assert_called_with(90)
+
+        def poll():
+            source.changesFound += 1
+        source.poll = poll
+        yield self.coordinator.poll(source)
+        self.assertEqual(source.currentPollInterval, 60)
+        source.doPoll.setInterval.assert_called_with(60)
+
+    @defer.inlineCallbacks
+    def test_poll_not_counting_changes(self):
+        # the interval of a source that does not count its changes is kept
+        source = mock.Mock(pollInterval=60, currentPollInterval=60,
+                           changesFound=0, countsChanges=False)
+        self.setPolling(max_interval_factor=4)
+
+        yield self.coordinator.poll(source)
+        self.assertEqual(source.currentPollInterval, 60)
+        self.assertFalse(source.doPoll.setInterval.called)
+
+    def test_runProcess(self):
+        self.setPolling(max_processes=2)
+        processes = {}
+
+        def run(name):
+            processes[name] = defer.Deferred()
+            return processes[name]
+        results = []
+        for name in 'abc':
+            self.coordinator.runProcess(run, name).addCallback(results.append)
+        self.assertEqual(sorted(processes), ['a', 'b'])
+        self.assertEqual(len(self.coordinator.waiting), 1)
+
+        # each process that completes makes room for a waiting one
+        processes['b'].callback('b')
+        self.assertEqual(sorted(processes), ['a', 'b', 'c'])
+        self.assertEqual(self.coordinator.running, 2)
+        self.assertEqual(len(self.coordinator.waiting), 0)
+
+        processes['a'].callback('a')
+        processes['c'].callback('c')
+        self.assertEqual(results, ['b', 'a', 'c'])
+        self.assertEqual(self.coordinator.running, 0)
+
+    def test_runProcess_failure(self):
+        self.setPolling(max_processes=1)
+        d = self.coordinator.runProcess(
+            lambda: defer.fail(RuntimeError('oh noes')))
+        self.assertFailure(d, RuntimeError)
+        self.assertEqual(self.coordinator.running, 0)
+        return d
@@ -511,6 +511,59 @@ class TestGitPoller(gpo.GetProcessOutputMixin,
 
         return d
 
+    @defer.inlineCallbacks
+    def test_poll_bulk(self):
+        self.patch(gitpoller.GitPoller, 'BULK_LOG_THRESHOLD', 1)
+        self.patch(gitpoller.GitPoller, 'BULK_LOG_BATCH_SIZE', 2)
+        revs = ['1' * 40, '2' * 40, '3' * 40]
+        logArgs = ['--no-walk=unsorted', '-z', '--name-only',
+                   '--format=%H%x00%ct%x00%aN <%aE>%x00%s%n%b%x00']
+        self.expectCommands(
+            gpo.Expect('git', 'init', '--bare', 'gitpoller-work'),
+            gpo.Expect('git', 'fetch', self.REPOURL,
+                       '+master:refs/buildbot/%s/master' % self.REPOURL_QUOTED)
+            .path('gitpoller-work'),
+            gpo.Expect('git', 'rev-parse',
+                       'refs/buildbot/%s/master' % self.REPOURL_QUOTED)
+            .path('gitpoller-work')
+            .stdout(revs[2] + '\n'),
+            gpo.Expect('git', 'log', '--format=%H', revs[2],
+                       '^fa3ae8ed68e664d4db24798611b352e3c6509930', '--')
+            .path('gitpoller-work')
+            .stdout('\n'.join(reversed(revs))),
+            gpo.Expect('git', 'log', *(logArgs + revs[:2] + ['--']))
+            .path('gitpoller-work')
+            .stdout(revs[0] + '\0001273258009\0by:one\0first\n\nbody\n\0\0'
+                    '\na\0dir/b c\0' +
+                    # a merge lists no files
+                    revs[1] + '\0001273258010\0by:two\0merge\n\0\0'),
+            gpo.Expect('git', 'log', *(logArgs + revs[2:] + ['--']))
+            .path('gitpoller-work')
+            .stdout(revs[2] + '\0001273258011\0by:three\0third\n\0\0'
+                    '\n\xc3\xa9\0'),
+        )
+
+        self.poller.lastRev = {
+            'master': 'fa3ae8ed68e664d4db24798611b352e3c6509930'
+        }
+        yield self.poller.poll()
+
+        self.assertAllCommandsRan()
+        self.assertEqual(
+            [(ch['revision'], ch['author'], ch['files'], ch['comments'],
+              ch['when_timestamp'])
+             for ch in self.master.data.updates.changesAdded], [
+                (revs[0], u'by:one', [u'a', u'dir/b c'], u'first\n\nbody',
+                 1273258009),
+                (revs[1], u'by:two', [], u'merge', 1273258010),
+                (revs[2], u'by:three', [u'\xe9'], u'third', 1273258011),
+            ])
+
+    def test_parse_commits_unexpected(self):
+        self.assertRaises(EnvironmentError, self.poller._parse_commits,
+                          'abc\0001273258009\0by:one\0first\n\0\0',
+                          ['def'])
+
     @defer.inlineCallbacks
     def test_poll_multipleBranches_buildPushesWithNoCommits_default(self):
         self.expectCommands(
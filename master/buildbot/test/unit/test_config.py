@@ -51,6 +51,9 @@ global_defaults = dict(
     buildHorizon=None,
     logCompressionLimit=4096,
     logCompressionMethod='gz',
+    logAppendDelay=0,
+    logCompressionLevel=None,
+    logCompressionDictionaries=False,
     logEncoding='utf-8',
     logMaxTailSize=None,
     logMaxSize=None,
@@ -273,6 +276,7 @@ class MasterConfig(ConfigErrorsMixin, dirs.DirsMixin, unittest.TestCase):
             builders=[],
             workers=[],
             change_sources=[],
+            polling=dict(max_processes=None, jitter=0, max_interval_factor=1),
             status=[],
             user_managers=[],
             revlink=revlinks.default_revlink_matcher
@@ -342,6 +346,7 @@ class MasterConfig(ConfigErrorsMixin, dirs.DirsMixin, unittest.TestCase):
         self.failUnless(rv.load_builders.called)
         self.failUnless(rv.load_workers.called)
         self.failUnless(rv.load_change_sources.called)
+        self.failUnless(rv.load_polling.called)
         self.failUnless(rv.load_status.called)
         self.failUnless(rv.load_user_managers.called)
 
@@ -480,7 +485,83 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
         self.cfg.load_global(self.filename,
                              dict(logCompressionMethod='foo'))
         self.assertConfigError(
-            self.errors, "c['logCompressionMethod'] must be 'raw', 'bz2', 'gz' or 'lz4'")
+            self.errors, "c['logCompressionMethod'] must be 'raw', 'bz2', 'gz', 'lz4' or 'zstd'")
+
+    def test_load_global_logCompressionMethod_zstd(self):
+        try:
+            import zstandard
+            [zstandard]
+        except ImportError:
+            raise unittest.SkipTest("zstandard not installed, skip the test")
+        self.do_test_load_global(dict(logCompressionMethod='zstd'),
+                                 logCompressionMethod='zstd')
+
+    def test_load_global_logCompressionLevel(self):
+        self.do_test_load_global(dict(logCompressionLevel=1),
+                                 logCompressionLevel=1)
+
+    def test_load_global_logCompressionLevel_gz(self):
+        self.do_test_load_global(dict(logCompressionMethod='gz',
+                                      logCompressionLevel=0),
+                                 logCompressionLevel=0)
+
+    def test_load_global_logCompressionLevel_gz_invalid(self):
+        self.cfg.load_global(self.filename,
+                             dict(logCompressionMethod='gz',
+                                  logCompressionLevel=10))
+        self.assertConfigError(
+            self.errors, "c['logCompressionLevel'] must be between 0 and 9 "
+            "for c['logCompressionMethod'] 'gz'")
+
+    def test_load_global_logCompressionLevel_bz2_invalid(self):
+        self.cfg.load_global(self.filename,
+                             dict(logCompressionMethod='bz2',
+                                  logCompressionLevel=0))
+        self.assertConfigError(
+            self.errors, "c['logCompressionLevel'] must be between 1 and 9 "
+            "for c['logCompressionMethod'] 'bz2'")
+
+    def test_load_global_logCompressionLevel_zstd_invalid(self):
+        try:
+            import zstandard
+            [zstandard]
+        except ImportError:
+            raise unittest.SkipTest("zstandard not installed, skip the test")
+        self.cfg.load_global(self.filename,
+                             dict(logCompressionMethod='zstd',
+                                  logCompressionLevel=23))
+        self.assertConfigError(
+            self.errors, "c['logCompressionLevel'] must be between 1 and 22 "
+            "for c['logCompressionMethod'] 'zstd'")
+
+    def test_load_global_logCompressionLevel_zstd(self):
+        try:
+            import zstandard
+            [zstandard]
+        except ImportError:
+            raise unittest.SkipTest("zstandard not installed, skip the test")
+        self.do_test_load_global(dict(logCompressionMethod='zstd',
+                                      logCompressionLevel=22),
+                                 logCompressionLevel=22)
+
+    def test_load_global_logCompressionDictionaries_without_zstd(self):
+        self.cfg.load_global(self.filename,
+                             dict(logCompressionMethod='gz',
+                                  logCompressionDictionaries=True))
+        self.assertConfigError(
+            self.errors,
+            "c['logCompressionDictionaries'] requires "
+            "c['logCompressionMethod'] to be 'zstd'")
+
+    def test_load_global_logAppendDelay(self):
+        self.do_test_load_global(dict(logAppendDelay=0.5),
+                                 logAppendDelay=0.5)
+
+    def test_load_global_logAppendDelay_invalid(self):
+        self.cfg.load_global(self.filename,
+                             dict(logAppendDelay='soon'))
+        self.assertConfigError(self.errors,
+                               "c['logAppendDelay'] must be a number")
 
     def test_load_global_codebaseGenerator(self):
         func = lambda _: "dummy"
@@ -619,6 +700,21 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
                          dict(db=dict(db_url='abcd', db_poll_interval=10)))
         self.assertResults(db=dict(db_url='abcd'))
 
+    def test_load_db_pool_size(self):
+        self.cfg.load_db(self.filename,
+                         dict(db=dict(db_url='abcd', db_pool_min=2, db_pool_max=20)))
+        self.assertResults(db=dict(db_url='abcd', db_pool_min=2, db_pool_max=20))
+
+    def test_load_db_pool_size_invalid(self):
+        self.cfg.load_db(self.filename,
+                         dict(db=dict(db_url='abcd', db_pool_max=0)))
+        self.assertConfigError(self.errors, "must be a positive integer")
+
+    def test_load_db_pool_min_greater_than_max(self):
+        self.cfg.load_db(self.filename,
+                         dict(db=dict(db_url='abcd', db_pool_min=5, db_pool_max=2)))
+        self.assertConfigError(self.errors, "must not be greater than")
+
     def test_load_db_unk_keys(self):
         self.cfg.load_db(self.filename,
                          dict(db=dict(db_url='abcd', db_poll_interval=10, bar='bar')))
@@ -642,6 +738,18 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
                          dict(mq=dict(bar='bar')))
         self.assertConfigError(self.errors, "unrecognized keys in")
 
+    def test_load_mq_persistent_queue(self):
+        self.cfg.load_mq(self.filename,
+                         dict(mq=dict(persistent_queue_size=1000,
+                                      persistent_queue_spool='mq')))
+        self.assertResults(mq=dict(type='simple', persistent_queue_size=1000,
+                                   persistent_queue_spool='mq'))
+
+    def test_load_mq_persistent_queue_size_invalid(self):
+        self.cfg.load_mq(self.filename,
+                         dict(mq=dict(persistent_queue_size=0)))
+        self.assertConfigError(self.errors, "must be a positive integer")
+
     def test_load_metrics_defaults(self):
         self.cfg.load_metrics(self.filename, {})
         self.assertResults(metrics=None)
@@ -874,6 +982,41 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
                                      dict(change_source=[chsrc]))
         self.assertResults(change_sources=[chsrc])
 
+    def test_load_polling_defaults(self):
+        self.cfg.load_polling(self.filename, {})
+        self.assertResults(polling=dict(max_processes=None, jitter=0,
+                                        max_interval_factor=1))
+
+    def test_load_polling(self):
+        self.cfg.load_polling(self.filename,
+                              dict(polling=dict(max_processes=10, jitter=0.5,
+                                                max_interval_factor=4)))
+        self.assertResults(polling=dict(max_processes=10, jitter=0.5,
+                                        max_interval_factor=4))
+
+    def test_load_polling_not_dict(self):
+        self.cfg.load_polling(self.filename, dict(polling=10))
+        self.assertConfigError(self.errors, "must be a dictionary")
+
+    def test_load_polling_unk_keys(self):
+        self.cfg.load_polling(self.filename, dict(polling=dict(foo=1)))
+        self.assertConfigError(self.errors,
+                               "unrecognized keys in c['polling']: foo")
+
+    def test_load_polling_max_processes_invalid(self):
+        self.cfg.load_polling(self.filename,
+                              dict(polling=dict(max_processes=0)))
+        self.assertConfigError(self.errors, "must be a positive integer")
+
+    def test_load_polling_jitter_invalid(self):
+        self.cfg.load_polling(self.filename, dict(polling=dict(jitter=2)))
+        self.assertConfigError(self.errors, "must be a number between 0 and 1")
+
+    def test_load_polling_max_interval_factor_invalid(self):
+        self.cfg.load_polling(self.filename,
+                              dict(polling=dict(max_interval_factor=0.5)))
+        self.assertConfigError(self.errors, "greater than or equal to 1")
+
     def test_load_status_not_list(self):
         self.cfg.load_status(self.filename, dict(status="not-list"))
         self.assertConfigError(self.errors, "must be a list of")
@@ -61,6 +61,26 @@ class ResourceType(unittest.TestCase):
             (('foo', '10', 'bar', '20', 'tested'), dict(fooid=10, barid='20'))
         ])
 
+    def test_produceEvent_shares_readonly_message(self):
+        cls = self.makeResourceTypeSubclass(
+            name='singular',
+            eventPathPatterns="/foo/:fooid /bar/:barid")
+        master = fakemaster.make_master(testcase=self, wantMq=True)
+        master.mq.verifyMessages = False
+        inst = cls(master)
+        msg = dict(fooid=10, barid='20', urls=[dict(name='x')])
+        inst.produceEvent(msg, 'tested')
+
+        # the producer keeps its own message..
+        msg['urls'].append(dict(name='y'))
+        # ..and the consumers all get the same read-only one
+        (_, msg1), (_, msg2) = master.mq.productions
+        self.assertIdentical(msg1, msg2)
+        self.assertEqual(msg1, dict(fooid=10, barid='20',
+                                    urls=[dict(name='x')]))
+        self.assertRaises(TypeError, msg1.__setitem__, 'fooid', 11)
+        self.assertRaises(TypeError, msg1['urls'][0].update, name='z')
+
     def test_compilePatterns(self):
         class MyResourceType(base.ResourceType):
             eventPathPatterns = """
@@ -149,7 +149,8 @@ class TestBuildRequestsEndpoint(endpoint.EndpointMixin, unittest.TestCase):
             builderid=None,
             bsid=None,
             complete=None,
-            claimed=None)
+            claimed=None,
+            resultSpec=mock.ANY)
 
     @defer.inlineCallbacks
     def testGetFilters(self):
@@ -168,7 +169,8 @@ class TestBuildRequestsEndpoint(endpoint.EndpointMixin, unittest.TestCase):
             builderid=None,
             bsid=55,
             complete=False,
-            claimed=True)
+            claimed=True,
+            resultSpec=mock.ANY)
 
     @defer.inlineCallbacks
     def testGetClaimedByMasterIdFilters(self):
@@ -185,7 +187,8 @@ class TestBuildRequestsEndpoint(endpoint.EndpointMixin, unittest.TestCase):
             builderid=None,
             bsid=None,
             complete=None,
-            claimed=fakedb.FakeBuildRequestsComponent.MASTER_ID)
+            claimed=fakedb.FakeBuildRequestsComponent.MASTER_ID,
+            resultSpec=mock.ANY)
 
 
 class TestBuildRequest(interfaces.InterfaceTests, unittest.TestCase):
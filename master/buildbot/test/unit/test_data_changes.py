@@ -115,8 +115,9 @@ class ChangesEndpoint(endpoint.EndpointMixin, unittest.TestCase):
             limit=1, offset=1, order=['-changeid'])
         changes = yield self.callGet(('changes',), resultSpec=resultSpec)
 
-        # limit not implemented for other offset
-        self.assertEqual(len(changes), 2)
+        self.assertEqual([ch['changeid'] for ch in changes], [13])
+        self.assertEqual((changes.offset, changes.limit, changes.total),
+                         (1, 1, 2))
 
 
 class Change(interfaces.InterfaceTests, unittest.TestCase):
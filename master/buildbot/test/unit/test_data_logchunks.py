@@ -170,6 +170,110 @@ class LogChunkEndpoint(LogChunkEndpointBase):
         self.validateData(logchunk)
         self.assertEqual(logchunk['logid'], 61)
 
+    @defer.inlineCallbacks
+    def test_get_live_tail(self):
+        # lines still in the live tail are not read from the database
+        tail = logchunks.LiveLogTail(1024, num_lines=7)
+        tail.append(u'line 7\nline 8\n')
+        self.rtype.liveTails[60] = tail
+
+        def getLogLines(*args):
+            self.fail("log lines read from the database")
+        self.patch(self.master.db.logs, 'getLogLines', getLogLines)
+
+        logchunk = yield self.callGet(
+            ('logs', 60, self.endpointname),
+            resultSpec=resultspec.ResultSpec(offset=8))
+        self.validateData(logchunk)
+        self.assertEqual(logchunk,
+                         {'logid': 60, 'firstline': 8, 'content': u'line 8\n'})
+
+    @defer.inlineCallbacks
+    def test_get_live_tail_evicted(self):
+        # lines that are not in the live tail anymore come from the database
+        tail = logchunks.LiveLogTail(1024, num_lines=7)
+        self.rtype.liveTails[60] = tail
+        logchunk = yield self.callGet(
+            ('logs', 60, self.endpointname),
+            resultSpec=resultspec.ResultSpec(offset=5, limit=2))
+        self.validateData(logchunk)
+        self.assertEqual(logchunk, {'logid': 60, 'firstline': 5,
+                                    'content': u'another line\nyet another line\n'})
+
+    @defer.inlineCallbacks
+    def isImmutable(self, path, kwargs):
+        data = yield self.callGet(path)
+        defer.returnValue(self.ep.isImmutable(data, kwargs))
+
+    @defer.inlineCallbacks
+    def test_isImmutable(self):
+        yield self.db.insertTestData([
+            fakedb.Log(id=63, stepid=50, name='done', slug='done', type='s',
+                       complete=1, num_lines=0),
+        ])
+        self.assertFalse((yield self.isImmutable(
+            ('logs', 60, self.endpointname), {'logid': 60})))
+        self.assertTrue((yield self.isImmutable(
+            ('logs', 63, self.endpointname), {'logid': 63})))
+        self.assertTrue((yield self.isImmutable(
+            ('steps', 50, 'logs', 'done', self.endpointname),
+            {'stepid': 50, 'log_slug': 'done'})))
+
+    @defer.inlineCallbacks
+    def test_isImmutable_log_finished_while_read(self):
+        # the log finishes after its state was read, but before its lines
+        # are; the lines read may not be all of them
+        getLogLines = self.master.db.logs.getLogLines
+
+        def finishingGetLogLines(logid, first_line, last_line):
+            d = self.master.db.logs.finishLog(logid)
+            d.addCallback(lambda _: getLogLines(logid, first_line, last_line))
+            return d
+        self.patch(self.master.db.logs, 'getLogLines', finishingGetLogLines)
+        self.assertFalse((yield self.isImmutable(
+            ('logs', 60, self.endpointname), {'logid': 60})))
+        self.assertTrue(
+            (yield self.master.db.logs.getLog(60))['complete'])
+
+
+class LiveLogTail(unittest.TestCase):
+
+    def test_getLines(self):
+        tail = logchunks.LiveLogTail(1024)
+        tail.append(u'a\nb\n')
+        tail.append(u'c\n')
+        self.assertEqual(tail.num_lines, 3)
+        self.assertEqual(tail.getLines(0, 2), u'a\nb\nc\n')
+        self.assertEqual(tail.getLines(1, 10), u'b\nc\n')
+        self.assertEqual(tail.getLines(3, 10), u'')
+
+    def test_evicts_old_lines(self):
+        tail = logchunks.LiveLogTail(8)
+        tail.append(u'aaa\nbbb\n')
+        self.assertEqual(tail.first_line, 0)
+        tail.append(u'ccc\n')
+        # at least 8 characters are kept
+        self.assertEqual(tail.first_line, 1)
+        self.assertEqual(tail.getLines(0, 2), None)
+        self.assertEqual(tail.getLines(1, 2), u'bbb\nccc\n')
+
+    def test_keeps_long_line(self):
+        tail = logchunks.LiveLogTail(8)
+        tail.append(u'a\n')
+        tail.append(u'%s\n' % (u'x' * 20,))
+        self.assertEqual(tail.first_line, 1)
+        self.assertEqual(tail.getLines(1, 1), u'x' * 20 + u'\n')
+
+    def test_truncates_line_longer_than_a_chunk(self):
+        tail = logchunks.LiveLogTail(0x20000)
+        # 0x10001 bytes in UTF-8; the last character straddles the limit
+        line = u'x' * 0xfffe + u'\N{SNOWMAN}'
+        tail.append(u'a\n%s\nb\n' % (line,))
+        self.assertEqual(tail.num_lines, 3)
+        self.assertEqual(tail.getLines(0, 2),
+                         u'a\n%s\nb\n' % (u'x' * 0xfffe,))
+        self.assertEqual(tail.chars, 0xfffe + 5)
+
 
 class RawLogChunkEndpoint(LogChunkEndpointBase):
 
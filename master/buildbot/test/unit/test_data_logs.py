@@ -17,6 +17,7 @@ from twisted.internet import defer
 from twisted.trial import unittest
 
 from buildbot.data import logs
+from buildbot.data import resultspec
 from buildbot.test.fake import fakedb
 from buildbot.test.fake import fakemaster
 from buildbot.test.util import endpoint
@@ -130,6 +131,22 @@ class LogsEndpoint(endpoint.EndpointMixin, unittest.TestCase):
         self.assertEqual(sorted([b['name'] for b in logs]),
                          ['errors', 'stdio'])
 
+    @defer.inlineCallbacks
+    def test_get_all(self):
+        logs = yield self.callGet(('logs',))
+        [self.validateData(log)
+         for log in logs]
+        self.assertEqual(sorted([b['logid'] for b in logs]),
+                         [60, 61, 70, 71])
+
+    @defer.inlineCallbacks
+    def test_get_stepid_filter(self):
+        resultSpec = resultspec.ResultSpec(
+            filters=[resultspec.Filter('stepid', 'eq', [50, 52])])
+        logs = yield self.callGet(('logs',), resultSpec=resultSpec)
+        logs = resultSpec.apply(logs)
+        self.assertEqual(sorted([b['logid'] for b in logs]), [60, 61])
+
     @defer.inlineCallbacks
     def test_get_stepid_empty(self):
         logs = yield self.callGet(('steps', 52, 'logs'))
@@ -254,3 +271,30 @@ class Log(interfaces.InterfaceTests, unittest.TestCase):
         self.do_test_callthrough('appendLog',
                                  self.rtype.appendLog,
                                  logid=10, content=u'foo\nbar\n')
+
+    @defer.inlineCallbacks
+    def test_live_tail(self):
+        logchunk = self.master.data.rtypes.logchunk
+        self.patch(self.master.db.logs, 'addLog',
+                   lambda stepid, name, slug, type: defer.succeed(10))
+        self.patch(self.master.db.logs, 'appendLog',
+                   lambda logid, content: defer.succeed((0, 1)))
+        self.patch(self.master.db.logs, 'finishLog',
+                   lambda logid: defer.succeed(None))
+
+        yield self.rtype.addLog(stepid=13, name=u'foo', type=u's')
+        yield self.rtype.appendLog(logid=10, content=u'foo\nbar\n')
+        self.assertEqual(logchunk.liveTails[10].getLines(0, 1),
+                         u'foo\nbar\n')
+        yield self.rtype.finishLog(logid=10)
+        self.assertNotIn(10, logchunk.liveTails)
+
+    @defer.inlineCallbacks
+    def test_live_tail_dropped_on_error(self):
+        logchunk = self.master.data.rtypes.logchunk
+        logchunk.startLiveTail(10)
+        self.patch(self.master.db.logs, 'appendLog',
+                   lambda logid, content: defer.fail(RuntimeError()))
+        yield self.assertFailure(
+            self.rtype.appendLog(logid=10, content=u'foo\n'), RuntimeError)
+        self.assertNotIn(10, logchunk.liveTails)
@@ -15,6 +15,8 @@
 import datetime
 import random
 
+import sqlalchemy as sa
+
 from twisted.trial import unittest
 
 from buildbot.data import base
@@ -170,6 +172,42 @@ class ResultSpec(unittest.TestCase):
             resultspec.ResultSpec(order=['ln']).apply(data),
             base.ListResult(exp, total=2))
 
+    def test_apply_ordering_mixed(self):
+        data = mklist(('fn', 'ln'),
+                      ('cedric', 'willis'),
+                      ('albert', 'engelbert'),
+                      ('bruce', 'willis'),
+                      ('dwayne', None))
+        exp = base.ListResult(mklist(('fn', 'ln'),
+                                     ('dwayne', None),
+                                     ('albert', 'engelbert'),
+                                     ('cedric', 'willis'),
+                                     ('bruce', 'willis')), total=4)
+        random.shuffle(data)
+        self.assertListResultEqual(
+            resultspec.ResultSpec(order=['ln', '-fn']).apply(data),
+            exp)
+
+    def test_apply_ordering_page(self):
+        # picking the first pages gives the same result as sorting it all
+        data = mklist(('x', 'y'), *[(i % 7, i) for i in range(100)])
+        data[13]['x'] = None
+        for order in (['x'], ['-x'], ['x', '-y'], ['-x', 'y']):
+            exp = resultspec.ResultSpec(order=order).apply(data)
+            for offset, limit in (0, 10), (25, 10), (95, 10):
+                self.assertListResultEqual(
+                    resultspec.ResultSpec(order=order, offset=offset,
+                                          limit=limit).apply(data),
+                    base.ListResult(exp[offset:offset + limit], offset=offset,
+                                    total=100, limit=limit))
+
+    def test_apply_fields_after_pagination(self):
+        data = mklist(('a', 'b'), *[(i, -i) for i in range(20)])
+        self.assertListResultEqual(
+            resultspec.ResultSpec(fields=['a'], order=['-a'],
+                                  offset=1, limit=2).apply(data),
+            base.ListResult(mklist('a', 18, 17), offset=1, total=20, limit=2))
+
     def do_test_pagination(self, bareList):
         data = mklist('x', *range(101, 131))
         if not bareList:
@@ -318,3 +356,91 @@ class NoneCmp(unittest.TestCase):
                          1)
         self.assertEqual(nonecmp(datetime.datetime(1, 1, 1), datetime.datetime(1, 1, 2)),
                          -1)
+
+
+class SQLQuery(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = sa.create_engine('sqlite://')
+        metadata = sa.MetaData()
+        self.tbl = sa.Table('things', metadata,
+                            sa.Column('id', sa.Integer, primary_key=True),
+                            sa.Column('name', sa.String(50), nullable=False),
+                            sa.Column('value', sa.Integer, nullable=True))
+        metadata.create_all(self.engine)
+        self.conn = self.engine.connect()
+        self.rows = [dict(id=1, name=u'a', value=10),
+                     dict(id=2, name=u'b', value=None),
+                     dict(id=3, name=u'c', value=30),
+                     dict(id=4, name=u'a', value=20),
+                     dict(id=5, name=u'b', value=10)]
+        self.conn.execute(self.tbl.insert(), self.rows)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def mkspec(self, **kwargs):
+        rs = resultspec.ResultSpec(**kwargs)
+        rs.fieldMapping = {'id': 'things.id', 'name': 'things.name',
+                           'value': 'things.value'}
+        return rs
+
+    def execute(self, rs):
+        return rs.thd_execute(self.conn, self.tbl.select(), dict,
+                              order_by=[self.tbl.c.id])
+
+    def assertSameAsApply(self, **kwargs):
+        # the SQL query must give the same results as apply() alone; the
+        # query consumes the spec, so each side gets its own copy
+        def mkspec():
+            return self.mkspec(**dict((k, list(v) if isinstance(v, list) else v)
+                                      for k, v in kwargs.items()))
+        rs = mkspec()
+        got = rs.apply(self.execute(rs))
+        expected = mkspec().apply(sorted(self.rows, key=lambda r: r['id']))
+        self.assertEqual(list(got), list(expected))
+
+    def test_filters(self):
+        for op, values in [('eq', [10]), ('ne', [10]), ('lt', [20]),
+                           ('le', [20]), ('gt', [10]), ('ge', [20]),
+                           ('eq', [10, 30]), ('ne', [10, 30]),
+                           ('eq', [None]), ('ne', [None])]:
+            self.assertSameAsApply(
+                filters=[resultspec.Filter('value', op, values)])
+
+    def test_order(self):
+        for order in [['value'], ['-value'], ['name', '-value'],
+                      ['-name', 'value']]:
+            self.assertSameAsApply(order=order)
+
+    def test_filters_applied_are_removed(self):
+        rs = self.mkspec(filters=[resultspec.Filter('name', 'eq', [u'a']),
+                                  resultspec.Filter('value', 'lt', [None])],
+                         order=['-value'])
+        self.execute(rs)
+        self.assertEqual([(f.field, f.op) for f in rs.filters],
+                         [('value', 'lt')])
+        self.assertEqual(rs.order, None)
+
+    def test_unmapped_field_left_to_apply(self):
+        rs = self.mkspec(filters=[resultspec.Filter('other', 'eq', [1])],
+                         order=['other'], limit=2)
+        self.assertEqual(len(self.execute(rs)), 5)
+        self.assertEqual(len(rs.filters), 1)
+        self.assertEqual(rs.order, ['other'])
+        self.assertEqual(rs.limit, 2)
+
+    def test_pagination(self):
+        rs = self.mkspec(filters=[resultspec.Filter('value', 'ne', [30])],
+                         order=['-id'], offset=1, limit=2)
+        res = self.execute(rs)
+        self.assertIsInstance(res, base.ListResult)
+        self.assertEqual([r['id'] for r in res], [4, 2])
+        self.assertEqual((res.offset, res.limit, res.total), (1, 2, 4))
+        self.assertEqual((rs.offset, rs.limit), (None, None))
+        # apply() accepts the pre-paginated result
+        self.assertEqual([r['id'] for r in rs.apply(res)], [4, 2])
+
+    def test_pagination_and_fields(self):
+        self.assertSameAsApply(fields=['name', 'value'], order=['value'],
+                               offset=2, limit=2)
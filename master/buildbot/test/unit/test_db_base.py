@@ -22,6 +22,7 @@ from twisted.trial import unittest
 from buildbot.db import base
 from buildbot.test.fake import fakedb
 from buildbot.test.util import connector_component
+from buildbot.util import lru
 from buildbot.util import sautils
 
 
@@ -135,6 +136,55 @@ class TestBaseAsConnectorComponent(unittest.TestCase,
         self.assertEqual(id, 7)
 
 
+class TestGetManyCached(unittest.TestCase):
+
+    class Thing(dict):
+        # cached values must be weakly referenceable
+        pass
+
+    class TestConnectorComponent(base.DBConnectorComponent):
+
+        @base.cached("things")
+        def getThing(self, key):
+            return self.db.pool.do(lambda conn: self.things.get(key))
+
+    def setUp(self):
+        self.fetches = []
+        self.cache = lru.AsyncLRUCache(None, 10)
+
+        def get_cache(cache_name, miss_fn):
+            self.cache.miss_fn = miss_fn
+            return self.cache
+        connector = mock.Mock(name="connector")
+        connector.master.caches.get_cache = get_cache
+        connector.pool.do = lambda fn, *args: defer.succeed(fn(None, *args))
+        self.comp = self.TestConnectorComponent(connector)
+        self.comp.things = dict((i, self.Thing(thing=i)) for i in range(5))
+
+    def thd_fetch(self, conn, keys):
+        self.fetches.append(keys)
+        return dict((k, self.comp.things[k]) for k in keys
+                    if k in self.comp.things)
+
+    @defer.inlineCallbacks
+    def test_getManyCached(self):
+        yield self.comp.getThing(3)
+        res = yield self.comp.getManyCached(self.comp.getThing,
+                                            [4, 3, 9, 1], self.thd_fetch)
+        self.assertEqual(res, [dict(thing=4), dict(thing=3), None,
+                               dict(thing=1)])
+        self.assertEqual(self.fetches, [[1, 4, 9]])
+        self.assertEqual(sorted(self.cache.keys()), [1, 3, 4])
+
+    @defer.inlineCallbacks
+    def test_getManyCached_all_cached(self):
+        yield self.comp.getThing(3)
+        res = yield self.comp.getManyCached(self.comp.getThing,
+                                            [3, 3], self.thd_fetch)
+        self.assertEqual(res, [dict(thing=3), dict(thing=3)])
+        self.assertEqual(self.fetches, [])
+
+
 class TestCachedDecorator(unittest.TestCase):
 
     def setUp(self):
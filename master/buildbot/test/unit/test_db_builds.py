@@ -16,6 +16,7 @@ from twisted.internet import defer
 from twisted.internet import task
 from twisted.trial import unittest
 
+from buildbot.data import resultspec
 from buildbot.db import builds
 from buildbot.test.fake import fakedb
 from buildbot.test.fake import fakemaster
@@ -92,7 +93,8 @@ class Tests(interfaces.InterfaceTests):
 
     def test_signature_getBuilds(self):
         @self.assertArgSpecMatches(self.db.builds.getBuilds)
-        def getBuilds(self, builderid=None, buildrequestid=None, workerid=None, complete=None):
+        def getBuilds(self, builderid=None, buildrequestid=None, workerid=None, complete=None,
+                      resultSpec=None):
             pass
 
     def test_signature_addBuild(self):
@@ -182,6 +184,55 @@ class Tests(interfaces.InterfaceTests):
         self.assertEqual(sorted(bdicts, key=lambda bd: bd['id']),
                          [self.threeBdicts[50], self.threeBdicts[51]])
 
+    @defer.inlineCallbacks
+    def test_getBuilds_resultSpec(self):
+        yield self.insertTestData(self.backgroundData + self.threeBuilds)
+        rs = resultspec.ResultSpec(
+            filters=[resultspec.Filter('workerid', 'eq', [13, 12]),
+                     resultspec.Filter('started_at', 'ne', [None])],
+            order=['-number'], limit=2)
+        rs.fieldMapping = {'number': 'builds.number',
+                           'workerid': 'builds.workerid'}
+        bdicts = yield self.db.builds.getBuilds(resultSpec=rs)
+        # the filter on an unmapped field is left to the caller, and so is
+        # the pagination
+        self.assertEqual([bd['id'] for bd in bdicts], [52, 51, 50])
+        self.assertEqual([f.field for f in rs.filters], ['started_at'])
+        self.assertEqual((rs.order, rs.limit), (None, 2))
+
+    @defer.inlineCallbacks
+    def test_getBuilds_resultSpec_pagination(self):
+        yield self.insertTestData(self.backgroundData + self.threeBuilds)
+        rs = resultspec.ResultSpec(
+            filters=[resultspec.Filter('builderid', 'eq', [77, 88])],
+            order=['results', '-number'], limit=2, offset=1)
+        rs.fieldMapping = {'number': 'builds.number',
+                           'builderid': 'builds.builderid',
+                           'results': 'builds.results'}
+        bdicts = yield self.db.builds.getBuilds(resultSpec=rs)
+        for bdict in bdicts:
+            validation.verifyDbDict(self, 'dbbuilddict', bdict)
+        # None sorts first
+        self.assertEqual([bd['id'] for bd in bdicts], [50, 52])
+        self.assertEqual((bdicts.offset, bdicts.limit, bdicts.total),
+                         (1, 2, 3))
+        self.assertEqual((rs.filters, rs.order, rs.limit, rs.offset),
+                         ([], None, None, None))
+
+    @defer.inlineCallbacks
+    def test_getBuilds_resultSpec_pagination_ties(self):
+        # the builds tie on masterid; their ids break the tie, so that each
+        # page picks up where the previous one stopped
+        yield self.insertTestData(self.backgroundData + self.threeBuilds)
+        ids = []
+        for offset in range(3):
+            rs = resultspec.ResultSpec(order=['masterid'], limit=1,
+                                       offset=offset)
+            rs.fieldMapping = {'masterid': 'builds.masterid'}
+            bdicts = yield self.db.builds.getBuilds(resultSpec=rs)
+            ids.extend(bd['id'] for bd in bdicts)
+        self.assertEqual(ids, [50, 51, 52])
+
     @defer.inlineCallbacks
     def test_getBuilds_complete(self):
         yield self.insertTestData(self.backgroundData + self.threeBuilds)
@@ -68,6 +68,12 @@ class Tests(interfaces.InterfaceTests):
         def getBuildsets(self, complete=None):
             pass
 
+    def test_signature_getSourceStampIdsForBuildsets(self):
+        @self.assertArgSpecMatches(
+            self.db.buildsets.getSourceStampIdsForBuildsets)
+        def getSourceStampIdsForBuildsets(self, bsids):
+            pass
+
     def test_signature_getRecentBuildsets(self):
         @self.assertArgSpecMatches(self.db.buildsets.getRecentBuildsets)
         def getBuildsets(self, count=None, branch=None, repository=None,
@@ -268,6 +274,20 @@ class Tests(interfaces.InterfaceTests):
         d.addCallback(check)
         return d
 
+    @defer.inlineCallbacks
+    def test_getSourceStampIdsForBuildsets(self):
+        yield self.insertTestData([
+            fakedb.SourceStamp(id=235, revision='1234'),
+            fakedb.Buildset(id=91),
+            fakedb.BuildsetSourceStamp(buildsetid=91, sourcestampid=234),
+            fakedb.BuildsetSourceStamp(buildsetid=91, sourcestampid=235),
+            fakedb.Buildset(id=92),
+            fakedb.BuildsetSourceStamp(buildsetid=92, sourcestampid=235),
+        ])
+        ssids = yield self.db.buildsets.getSourceStampIdsForBuildsets(
+            [91, 92, 93])
+        self.assertEqual(ssids, {91: [234, 235], 92: [235], 93: []})
+
     def test_getBuildsets_complete(self):
         d = self.insert_test_getBuildsets_data()
         d.addCallback(lambda _:
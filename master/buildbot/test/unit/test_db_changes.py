@@ -12,6 +12,7 @@
 # Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 # Copyright Buildbot Team Members
+import mock
 import sqlalchemy as sa
 from future.utils import iteritems
 from twisted.internet import defer
@@ -219,6 +220,17 @@ class Tests(interfaces.InterfaceTests):
         d.addCallback(check14)
         return d
 
+    @defer.inlineCallbacks
+    def test_getChangesByIds(self):
+        yield self.insertTestData(self.change14_rows + [
+            fakedb.Change(changeid=13, sourcestampid=233),
+        ])
+        chdicts = yield self.db.changes.getChangesByIds([14, 99, 13])
+        self.assertEqual(chdicts[0], self.change14_dict)
+        self.assertEqual(chdicts[1], None)
+        self.assertEqual(chdicts[2]['changeid'], 13)
+        self.assertEqual(chdicts[2]['files'], [])
+
     def test_getChange_missing(self):
         d = defer.succeed(None)
 
@@ -280,7 +292,7 @@ class Tests(interfaces.InterfaceTests):
 
     def test_signature_getChanges(self):
         @self.assertArgSpecMatches(self.db.changes.getChanges)
-        def getChanges(self):
+        def getChanges(self, resultSpec=None):
             pass
 
     def insert7Changes(self):
@@ -820,6 +832,76 @@ class RealTests(Tests):
         yield expect(6, [u'10th commit'])
         yield expect(7, [u'11th commit'])
 
+    def test_getChangesForBuild_batched(self):
+        # same thing, without a recursive query
+        self.patch(self.db.changes, '_thdSupportsRecursiveQueries',
+                   lambda conn: False)
+        self.patch(self.db.changes, 'PARENT_WALK_BATCH_SIZE', 2)
+        return self.test_getChangesForBuild()
+
+    @defer.inlineCallbacks
+    def insertChangeChain(self):
+        # changes 1 to 6 follow each other on branch 'master', and 7 is on
+        # another branch
+        rows = [fakedb.SourceStamp(id=1)]
+        for changeid in range(1, 7):
+            rows.append(fakedb.Change(
+                changeid=changeid, sourcestampid=1, branch=u'master',
+                parent_changeids=changeid - 1 if changeid > 1 else None))
+        rows.append(fakedb.Change(changeid=7, sourcestampid=1,
+                                  branch=u'other', parent_changeids=None))
+        yield self.insertTestData(rows)
+
+    @defer.inlineCallbacks
+    def test_getChangeChain(self):
+        yield self.insertChangeChain()
+        for recursive in (True, False):
+            self.patch(self.db.changes, '_thdSupportsRecursiveQueries',
+                       lambda conn, recursive=recursive: recursive)
+            self.patch(self.db.changes, 'PARENT_WALK_BATCH_SIZE', 4)
+            chain = yield self.db.changes._getChangeChain(6, None)
+            self.assertEqual(chain, [6, 5, 4, 3, 2, 1])
+            chain = yield self.db.changes._getChangeChain(6, 2)
+            self.assertEqual(chain, [6, 5, 4, 3])
+            chain = yield self.db.changes._getChangeChain(3, 2)
+            self.assertEqual(chain, [3])
+            chain = yield self.db.changes._getChangeChain(7, 2)
+            self.assertEqual(chain, [7])
+            chain = yield self.db.changes._getChangeChain(8, None)
+            self.assertEqual(chain, [])
+
+
+class TestSupportsRecursiveQueries(unittest.TestCase):
+
+    def supports(self, name, version_info, raw_version=None):
+        conn = mock.Mock()
+        conn.dialect.name = name
+        conn.dialect.server_version_info = version_info
+        conn.execute.return_value.scalar.return_value = raw_version
+        component = changes.ChangesConnectorComponent(mock.Mock())
+        return component._thdSupportsRecursiveQueries(conn)
+
+    def test_sqlite(self):
+        self.assertTrue(self.supports('sqlite', (3, 8, 3)))
+        self.assertFalse(self.supports('sqlite', (3, 7, 17)))
+
+    def test_mysql(self):
+        self.assertTrue(self.supports('mysql', (8, 0, 3), '8.0.3-rc-log'))
+        self.assertFalse(self.supports('mysql', (5, 7, 20), '5.7.20-log'))
+
+    def test_mariadb(self):
+        self.assertTrue(self.supports(
+            'mysql', (10, 2, 7, 'MariaDB'), '10.2.7-MariaDB-10.2.7+maria~jessie'))
+        self.assertFalse(self.supports(
+            'mysql', (10, 1, 26, 'MariaDB'), '10.1.26-MariaDB-0+deb9u1'))
+
+    def test_mariadb_replication_prefix(self):
+        # MariaDB 10 reports itself as 5.5.5-10.x to old MySQL clients
+        self.assertTrue(self.supports(
+            'mysql', (5, 5, 5, 10, 2, 7, 'MariaDB'), '5.5.5-10.2.7-MariaDB'))
+        self.assertFalse(self.supports(
+            'mysql', (5, 5, 5, 10, 1, 26, 'MariaDB'), '5.5.5-10.1.26-MariaDB'))
+
 
 class TestFakeDB(unittest.TestCase, Tests):
 
@@ -86,6 +86,14 @@ class DBConnector(db.RealDatabaseMixin, unittest.TestCase):
             self.assertTrue(self.db.changes.pruneChanges.called)
         return d
 
+    @defer.inlineCallbacks
+    def test_stopService_flushes_appends(self):
+        yield self.startService()
+        self.db.logs.flushAppends = mock.Mock(
+            return_value=defer.succeed(None))
+        yield self.db.stopService()
+        self.db.logs.flushAppends.assert_called_with()
+
     def test_setup_check_version_bad(self):
         d = self.startService(check_version=True)
         return self.assertFailure(d, exceptions.DatabaseNotReadyError)
@@ -15,7 +15,9 @@
 import base64
 import textwrap
 
+import sqlalchemy as sa
 from twisted.internet import defer
+from twisted.internet import task
 from twisted.trial import unittest
 
 from buildbot.db import logs
@@ -103,7 +105,7 @@ class Tests(interfaces.InterfaceTests):
 
     def test_signature_getLogs(self):
         @self.assertArgSpecMatches(self.db.logs.getLogs)
-        def getLogs(self, stepid=None):
+        def getLogs(self, stepid=None, resultSpec=None):
             pass
 
     def test_signature_getLogLines(self):
@@ -463,10 +465,332 @@ class RealTests(Tests):
             'content': lz4.dumps(line),
             'compressed': 3})
 
+    @defer.inlineCallbacks
+    def test_appendLog_write_behind(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        logid = yield self.db.logs.addLog(
+            stepid=102, name=u'another', slug=u'another', type=u's')
+        self.db.master.reactor = clock = task.Clock()
+        self.db.master.config.logAppendDelay = 1
+
+        ds = [self.db.logs.appendLog(id, content)
+              for id, content in [(201, u'abc\n'), (logid, u'xyz\n'),
+                                  (201, u'def\nghi\n'),
+                                  (999, u'missing\n')]]
+        # nothing is written until the window expires
+        self.assertEqual([d.called for d in ds], [False] * 4)
+        self.assertEqual((yield self.db.logs.getLog(201))['num_lines'], 7)
+
+        clock.advance(1)
+        results = yield defer.gatherResults(ds)
+        self.assertEqual(results, [(7, 7), (0, 0), (8, 9), None])
+        self.assertEqual((yield self.db.logs.getLogLines(201, 6, 9)),
+                         u"yet another line\nabc\ndef\nghi\n")
+        self.assertEqual((yield self.db.logs.getLogLines(logid, 0, 0)),
+                         u"xyz\n")
+        self.assertEqual((yield self.db.logs.getLog(201))['num_lines'], 10)
+        # consecutive appends to the same log share a chunk
+        self.assertEqual((yield self.thdGetChunks(201))[-1], (7, 9, 0))
+
+    @defer.inlineCallbacks
+    def test_finishLog_flushes_appends(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        self.db.master.reactor = task.Clock()
+        self.db.master.config.logAppendDelay = 60
+
+        d = self.db.logs.appendLog(201, u'abc\n')
+        yield self.db.logs.finishLog(201)
+        self.assertEqual((yield d), (7, 7))
+        logdict = yield self.db.logs.getLog(201)
+        self.assertEqual((logdict['num_lines'], logdict['complete']),
+                         (8, True))
+        self.assertEqual((yield self.db.logs.getLogLines(201, 7, 7)),
+                         u"abc\n")
+
+    @defer.inlineCallbacks
+    def test_appendLog_write_behind_size_limit(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        self.db.master.reactor = task.Clock()
+        self.db.master.config.logAppendDelay = 60
+        self.patch(self.db.logs, 'APPEND_FLUSH_SIZE', 10)
+
+        # flushed without advancing the clock
+        d = self.db.logs.appendLog(201, u'0123456789\n')
+        self.assertEqual((yield d), (7, 7))
+
+    @defer.inlineCallbacks
+    def test_appendLog_write_behind_size_limit_during_flush(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        self.db.master.reactor = task.Clock()
+        self.db.master.config.logAppendDelay = 60
+        self.patch(self.db.logs, 'APPEND_FLUSH_SIZE', 10)
+
+        # the last two appends reach the limit while the first is written
+        ds = [self.db.logs.appendLog(201, content)
+              for content in [u'0123456789\n', u'abc\n', u'defghi\n']]
+        self.assertEqual((yield defer.gatherResults(ds)),
+                         [(7, 7), (8, 8), (9, 9)])
+
+    @defer.inlineCallbacks
+    def test_flushAppends(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        self.db.master.reactor = clock = task.Clock()
+        self.db.master.config.logAppendDelay = 60
+
+        d = self.db.logs.appendLog(201, u'abc\n')
+        yield self.db.logs.flushAppends()
+        self.assertEqual((yield d), (7, 7))
+        self.assertEqual(clock.getDelayedCalls(), [])
+        self.assertEqual((yield self.db.logs.getLogLines(201, 7, 7)),
+                         u"abc\n")
+
+    def thdGetChunks(self, logid):
+        def thd(conn):
+            tbl = self.db.model.logchunks
+            q = sa.select([tbl.c.first_line, tbl.c.last_line,
+                           tbl.c.compressed])
+            q = q.where(tbl.c.logid == logid)
+            q = q.order_by(tbl.c.first_line)
+            return [tuple(row) for row in conn.execute(q)]
+        return self.db.pool.do(thd)
+
+    @defer.inlineCallbacks
+    def test_compressLog_merges_small_chunks(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        self.db.master.config.logCompressionMethod = "raw"
+        saved = yield self.db.logs.compressLog(201)
+        # the newlines between merged chunks are now stored explicitly
+        self.assertEqual(saved, -3)
+        self.assertEqual((yield self.thdGetChunks(201)), [(0, 6, 0)])
+        yield self.checkTestLogLines()
+
+    @defer.inlineCallbacks
+    def test_compressLog_gz(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        self.db.master.config.logCompressionMethod = "gz"
+        saved = yield self.db.logs.compressLog(201)
+        self.assertTrue(saved > 0)
+        self.assertEqual((yield self.thdGetChunks(201)), [(0, 6, 1)])
+        yield self.checkTestLogLines()
+        # compressing again does not change anything
+        self.assertEqual((yield self.db.logs.compressLog(201)), 0)
+
+    @defer.inlineCallbacks
+    def test_compressLog_empty(self):
+        yield self.insertTestData(self.backgroundData + [
+            fakedb.Log(id=201, stepid=101, name=u'stdio', slug=u'stdio',
+                       complete=1, num_lines=0, type=u's'),
+        ])
+        self.assertEqual((yield self.db.logs.compressLog(201)), 0)
+
+    @defer.inlineCallbacks
+    def test_compressLog_streaming(self):
+        yield self.insertTestData(self.backgroundData + [
+            fakedb.Log(id=201, stepid=101, name=u'stdio', slug=u'stdio',
+                       complete=0, num_lines=0, type=u's'),
+        ])
+        self.db.master.config.logCompressionMethod = "raw"
+        # many small appends, followed by a few that fill whole chunks
+        lines = []
+        for i in range(600):
+            line = u'line %d' % i
+            lines.append(line)
+            yield self.db.logs.appendLog(201, line + u'\n')
+        big = [u'%05d' % i + u'x' * 200 for i in range(1000)]
+        lines.extend(big)
+        yield self.db.logs.appendLog(201, u'\n'.join(big) + u'\n')
+
+        self.patch(self.db.logs, 'COMPRESS_PAGE_SIZE', 3)
+        self.patch(self.db.logs, 'COMPRESS_BATCH_SIZE', 2)
+        self.patch(self.db.logs, 'MAX_CHUNK_SIZE', 2048)
+        yield self.db.logs.compressLog(201)
+
+        chunks = yield self.thdGetChunks(201)
+        # the 600 one-line chunks were merged into a few 2k chunks, and the
+        # chunks that were already bigger than that were left alone
+        small = [c for c in chunks if c[1] < 600]
+        self.assertEqual(small[0][0], 0)
+        self.assertEqual(small[-1][1], 599)
+        self.assertEqual(len(small), 3)
+        self.assertEqual(len(chunks), 3 + 4)
+        # chunks are contiguous
+        for prev, next in zip(chunks, chunks[1:]):
+            self.assertEqual(prev[1] + 1, next[0])
+        self.assertEqual(chunks[-1][1], 1599)
+        self.assertEqual((yield self.db.logs.getLogLines(201, 0, 1599)),
+                         u'\n'.join(lines) + u'\n')
+
+    @defer.inlineCallbacks
+    def test_getLogLines_compressed_chunks(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        self.db.master.config.logCompressionMethod = "gz"
+        lines = [u'line %d' % i for i in range(30000)]
+        yield self.db.logs.appendLog(201, u'\n'.join(lines) + u'\n')
+        lines = [None] * 7 + lines
+        for first_line, last_line in [(7, 7), (20000, 20010), (29990, 30006),
+                                      (30006, 30100)]:
+            got_lines = yield self.db.logs.getLogLines(
+                201, first_line, last_line)
+            self.assertEqual(
+                got_lines,
+                u"\n".join(lines[first_line:last_line + 1] + [u""]))
+
+    @defer.inlineCallbacks
+    def test_getLogLines_reuses_chunk_index(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        yield self.checkTestLogLines()
+        cache = self.db.logs._chunkIndexCache
+        self.assertEqual(sorted(cache.keys()), [
+            (201, 0, 1), (201, 2, 4), (201, 5, 5), (201, 6, 6)])
+        misses = cache.misses
+        yield self.checkTestLogLines()
+        self.assertEqual(cache.misses, misses)
+
+    @defer.inlineCallbacks
+    def test_getLogLines_chunks_regrouped_during_read(self):
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        getChunkIndexes = self.db.logs._thdGetChunkIndexes
+        calls = []
+
+        def regroupFirst(conn, logid, rows):
+            # merge chunks 2-4 and 5-5, as compressLog would, after they
+            # were listed but before their content is read
+            if not calls:
+                tbl = self.db.model.logchunks
+                conn.execute(tbl.delete().where(
+                    (tbl.c.logid == 201) & tbl.c.first_line.in_([2, 5])))
+                conn.execute(tbl.insert(), dict(
+                    logid=201, first_line=2, last_line=5, compressed=0,
+                    content='line TWO\n\nline 2**2\nanother line'))
+            calls.append([(row.first_line, row.last_line) for row in rows])
+            return getChunkIndexes(conn, logid, rows)
+        self.patch(self.db.logs, '_thdGetChunkIndexes', regroupFirst)
+
+        self.assertEqual((yield self.db.logs.getLogLines(201, 3, 5)),
+                         u'\nline 2**2\nanother line\n')
+        # the chunks were listed again
+        self.assertEqual(calls, [[(2, 4), (5, 5)], [(2, 5)]])
+
+    @defer.inlineCallbacks
+    def test_zstd_compress_big_chunk(self):
+        try:
+            import zstandard
+        except ImportError:
+            raise unittest.SkipTest("zstandard not installed, skip the test")
+
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        line = u'xy' * 10000
+        self.db.master.config.logCompressionMethod = "zstd"
+        self.db.master.config.logCompressionLevel = 1
+        self.assertEqual(
+            (yield self.db.logs.appendLog(201, line + '\n')),
+            (7, 7))
+
+        def thd(conn):
+            res = conn.execute(self.db.model.logchunks.select(
+                whereclause=self.db.model.logchunks.c.first_line > 6))
+            row = res.fetchone()
+            res.close()
+            return dict(row)
+
+        newRow = yield self.db.pool.do(thd)
+        self.assertEqual(newRow, {
+            'logid': 201,
+            'first_line': 7,
+            'last_line': 7,
+            'content': zstandard.ZstdCompressor(level=1).compress(line),
+            'compressed': 4})
+        self.assertEqual((yield self.db.logs.getLogLines(201, 7, 7)),
+                         line + u'\n')
+
+    @defer.inlineCallbacks
+    def test_compressLog_zstd_dictionary(self):
+        try:
+            import zstandard
+            [zstandard]
+        except ImportError:
+            raise unittest.SkipTest("zstandard not installed, skip the test")
+
+        yield self.insertTestData(self.backgroundData + [
+            fakedb.Step(id=103, buildid=30, number=3, name='three'),
+            fakedb.Log(id=201, stepid=101, name=u'stdio', slug=u'stdio',
+                       complete=0, num_lines=0, type=u's'),
+            fakedb.Log(id=202, stepid=103, name=u'stdio', slug=u'stdio',
+                       complete=0, num_lines=0, type=u's'),
+        ])
+        self.db.master.config.logCompressionMethod = "zstd"
+        self.db.master.config.logCompressionDictionaries = True
+        self.patch(self.db.logs, 'DICTIONARY_MIN_SAMPLES', 16 * 1024)
+        self.patch(self.db.logs, 'MAX_CHUNK_SIZE', 4096)
+
+        lines = [u'src/module%d.c:%d: warning: unused variable x%d' %
+                 (i % 53, i % 301, i % 17) for i in range(3000)]
+        content = u'\n'.join(lines) + u'\n'
+        yield self.db.logs.appendLog(201, content)
+        yield self.db.logs.appendLog(202, content)
+
+        # the first log trains the builder's dictionary
+        yield self.db.logs.compressLog(201)
+        chunks = yield self.thdGetChunks(201)
+        self.assertEqual(set(c[2] for c in chunks), set([5]))
+        self.assertEqual((yield self.db.logs.getLogLines(201, 0, 2999)),
+                         content)
+
+        # and the second one reuses it
+        yield self.db.logs.compressLog(202)
+        chunks = yield self.thdGetChunks(202)
+        self.assertEqual(set(c[2] for c in chunks), set([5]))
+
+        def thd(conn):
+            tbl = self.db.model.log_dictionaries
+            return [tuple(row) for row in
+                    conn.execute(sa.select([tbl.c.id, tbl.c.builderid]))]
+        self.assertEqual(len((yield self.db.pool.do(thd))), 1)
+
+        # a fresh component (e.g., after a restart) can read those chunks
+        self.db.logs = logs.LogsConnectorComponent(self.db)
+        self.assertEqual((yield self.db.logs.getLogLines(202, 1000, 2999)),
+                         u'\n'.join(lines[1000:]) + u'\n')
+
+    @defer.inlineCallbacks
+    def test_compressLog_zstd_dictionary_small_log(self):
+        try:
+            import zstandard
+            [zstandard]
+        except ImportError:
+            raise unittest.SkipTest("zstandard not installed, skip the test")
+
+        yield self.insertTestData(self.backgroundData + self.testLogLines)
+        self.db.master.config.logCompressionMethod = "zstd"
+        self.db.master.config.logCompressionDictionaries = True
+        # not enough data to train a dictionary: plain zstd is used
+        yield self.db.logs.compressLog(201)
+        self.assertEqual((yield self.thdGetChunks(201)), [(0, 6, 4)])
+        yield self.checkTestLogLines()
+
     # TODO: test compressing with >64k
     # TODO: test compressing compressed size >64k
 
 
+class TestLogChunkIndex(unittest.TestCase):
+
+    def test_offsets(self):
+        index = logs.LogChunkIndex(u'abc\n\nde\nf')
+        self.assertEqual(index.offsets, [0, 4, 5, 8])
+
+    def test_getLines(self):
+        index = logs.LogChunkIndex(u'abc\n\nde\nf')
+        self.assertEqual(index.getLines(0, 0), u'abc')
+        self.assertEqual(index.getLines(0, 1), u'abc\n')
+        self.assertEqual(index.getLines(1, 2), u'\nde')
+        self.assertEqual(index.getLines(2, 3), u'de\nf')
+        self.assertEqual(index.getLines(3, 3), u'f')
+
+    def test_getLines_single_line(self):
+        index = logs.LogChunkIndex(u'only line')
+        self.assertEqual(index.getLines(0, 0), u'only line')
+
+
 class TestFakeDB(unittest.TestCase, Tests):
 
     def setUp(self):
@@ -482,9 +806,9 @@ class TestRealDB(unittest.TestCase,
 
     def setUp(self):
         d = self.setUpConnectorComponent(
-            table_names=['logs', 'logchunks', 'steps', 'builds', 'builders',
-                         'masters', 'buildrequests', 'buildsets',
-                         'workers'])
+            table_names=['logs', 'logchunks', 'log_dictionaries', 'steps',
+                         'builds', 'builders', 'masters', 'buildrequests',
+                         'buildsets', 'workers'])
 
         @d.addCallback
         def finish_setup(_):
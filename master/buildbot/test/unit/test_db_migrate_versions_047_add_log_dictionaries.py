@@ -0,0 +1,58 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import sqlalchemy as sa
+from twisted.trial import unittest
+
+from buildbot.test.util import migration
+from buildbot.util import sautils
+
+
+class Migration(migration.MigrateTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        return self.setUpMigrateTest()
+
+    def tearDown(self):
+        return self.tearDownMigrateTest()
+
+    def test_migration(self):
+        def setup_thd(conn):
+            metadata = sa.MetaData()
+            metadata.bind = conn
+
+            sautils.Table(
+                'builders', metadata,
+                sa.Column('id', sa.Integer, primary_key=True),
+                # ..
+            ).create()
+
+        def verify_thd(conn):
+            metadata = sa.MetaData()
+            metadata.bind = conn
+
+            log_dictionaries = sautils.Table(
+                'log_dictionaries', metadata, autoload=True)
+
+            q = sa.select([log_dictionaries.c.id,
+                           log_dictionaries.c.builderid,
+                           log_dictionaries.c.content])
+            self.assertEqual(conn.execute(q).fetchall(), [])
+
+            indexes = sa.inspect(conn).get_indexes('log_dictionaries')
+            self.assertEqual([idx['name'] for idx in indexes],
+                             ['log_dictionaries_builderid'])
+
+        return self.do_test_migration(46, 47, setup_thd, verify_thd)
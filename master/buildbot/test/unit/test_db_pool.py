@@ -13,14 +13,18 @@
 #
 # Copyright Buildbot Team Members
 import os
+import threading
 import time
 
 import sqlalchemy as sa
 from twisted.internet import defer
 from twisted.internet import reactor
+from twisted.internet import threads
+from twisted.python import log
 from twisted.trial import unittest
 
 from buildbot.db import pool
+from buildbot.process import metrics
 from buildbot.test.util import db
 from buildbot.util import sautils
 
@@ -111,6 +115,128 @@ class Basic(unittest.TestCase):
         return d
 
 
+class Sizing(unittest.TestCase):
+
+    # growing and shrinking the pool, with several threads
+
+    def setUp(self):
+        self.engine = sa.create_engine('sqlite://')
+        self.engine.should_retry = lambda _: False
+        self.engine.optimal_thread_pool_size = 4
+        self.pool = pool.DBThreadPool(self.engine, reactor=reactor)
+        # wait for the pool to start
+        return self.pool.do(lambda conn: None)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_limits(self):
+        self.assertEqual((self.pool.min_size, self.pool.max_size), (1, 4))
+        self.assertEqual(self.pool._pool.max, 1)
+
+    def test_limited_by_engine(self):
+        self.pool.setPoolSize(min_size=2, max_size=10)
+        self.assertEqual((self.pool.min_size, self.pool.max_size), (2, 4))
+        self.assertEqual((self.pool._pool.min, self.pool._pool.max), (2, 2))
+
+    @defer.inlineCallbacks
+    def test_grow_and_shrink(self):
+        release = threading.Event()
+
+        def wait(conn):
+            release.wait()
+
+        ds = [self.pool.do(wait) for _ in range(6)]
+        self.assertEqual(self.pool._pool.max, 4)
+
+        # wait for a thread to really be busy, then release them all
+        yield threads.deferToThread(time.sleep, 0.1)
+        release.set()
+        yield defer.DeferredList(ds)
+        self.assertEqual(self.pool._pool.max, 4)
+
+        self.patch(self.pool, 'SHRINK_INTERVAL', 0)
+        yield self.pool.do(lambda conn: None)
+        # the first check accounts for the peak of the previous period
+        self.assertEqual(self.pool._pool.max, 4)
+        yield self.pool.do(lambda conn: None)
+        self.assertEqual(self.pool._pool.max, 1)
+
+
+class Metrics(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = sa.create_engine('sqlite://')
+        self.engine.should_retry = lambda _: True
+        self.engine.optimal_thread_pool_size = 1
+        self.pool = pool.DBThreadPool(self.engine, reactor=reactor)
+        self.patch(self.pool, 'BACKOFF_START', 0)
+
+        self.events = []
+        log.addObserver(self.observe)
+
+    def tearDown(self):
+        log.removeObserver(self.observe)
+        self.pool.shutdown()
+
+    def observe(self, eventDict):
+        metric = eventDict.get('metric')
+        if metric is not None:
+            self.events.append(metric)
+
+    @defer.inlineCallbacks
+    def test_timers(self):
+        yield self.pool.do(lambda conn: None)
+        timers = [e.timer for e in self.events
+                  if isinstance(e, metrics.MetricTimeEvent)]
+        self.assertEqual(timers, ['DBThreadPool.queue-wait',
+                                  'DBThreadPool.execute.test_db_pool.test_timers'])
+
+    def executeTimers(self):
+        return [e.timer for e in self.events
+                if isinstance(e, metrics.MetricTimeEvent) and
+                e.timer.startswith('DBThreadPool.execute.')]
+
+    def thdNothing(self, conn):
+        pass
+
+    @defer.inlineCallbacks
+    def test_timers_method(self):
+        yield self.pool.do(self.thdNothing)
+        self.assertEqual(self.executeTimers(),
+                         ['DBThreadPool.execute.test_db_pool.thdNothing'])
+
+    @defer.inlineCallbacks
+    def test_timers_through_wrapper(self):
+        # the operation is named after its callable, not after the caller
+        # of do(), which is the wrapper here
+        self.pool.do = pool.timed_do_fn(self.pool.do)
+
+        def thd(conn):
+            pass
+        yield self.pool.do(thd)
+        self.assertEqual(
+            self.executeTimers(),
+            ['DBThreadPool.execute.test_db_pool.test_timers_through_wrapper'])
+
+    @defer.inlineCallbacks
+    def test_retries(self):
+        attempts = []
+
+        def flaky(conn):
+            attempts.append(None)
+            if len(attempts) < 3:
+                raise sa.exc.OperationalError("SELECT", {}, None)
+            return 'ok'
+        res = yield self.pool.do(flaky)
+        self.assertEqual(res, 'ok')
+        counts = [(e.counter, e.count) for e in self.events
+                  if isinstance(e, metrics.MetricCountEvent)]
+        self.assertEqual(counts, [
+            ('DBThreadPool.retry-on-OperationalError', 2),
+            ('DBThreadPool.retry-on-OperationalError.test_db_pool.test_retries', 2)])
+
+
 class Stress(unittest.TestCase):
 
     def setUp(self):
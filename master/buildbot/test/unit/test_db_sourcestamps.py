@@ -205,6 +205,23 @@ class Tests(interfaces.InterfaceTests):
         d.addCallback(check)
         return d
 
+    @defer.inlineCallbacks
+    def test_getSourceStampsByIds(self):
+        yield self.insertTestData([
+            fakedb.Patch(id=99, patch_base64='aGVsbG8sIHdvcmxk',
+                         patch_author='bar', patch_comment='foo', subdir='/foo',
+                         patchlevel=3),
+            fakedb.SourceStamp(id=234, patchid=99),
+            fakedb.SourceStamp(id=235, branch='br'),
+        ])
+        ssdicts = yield self.db.sourcestamps.getSourceStampsByIds(
+            [235, 236, 234])
+        self.assertEqual(ssdicts[1], None)
+        for ssdict in ssdicts[0], ssdicts[2]:
+            validation.verifyDbDict(self, 'ssdict', ssdict)
+        self.assertEqual([ssdicts[0]['branch'], ssdicts[2]['patch_body']],
+                         ['br', 'hello, world'])
+
     def test_getSourceStamps(self):
         d = self.insertTestData([
             fakedb.Patch(id=99, patch_base64='aGVsbG8sIHdvcmxk',
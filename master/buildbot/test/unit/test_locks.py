@@ -12,11 +12,16 @@
 # Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 # Copyright Buildbot Team Members
+import mock
+from twisted.internet import task
 from twisted.trial import unittest
 
+from buildbot import locks
 from buildbot.locks import WorkerLock
+from buildbot.process import metrics
 from buildbot.test.util.warnings import assertNotProducesWarnings
 from buildbot.test.util.warnings import assertProducesWarning
+from buildbot.util.eventual import flushEventualQueue
 from buildbot.worker_transition import DeprecatedWorkerAPIWarning
 from buildbot.worker_transition import DeprecatedWorkerNameWarning
 
@@ -59,3 +64,90 @@ class TestWorkerTransition(unittest.TestCase):
             lock = WorkerLock("name", maxCount=1, maxCountForSlave=counts)
 
         self.assertEqual(lock.maxCountForWorker, counts)
+
+
+class TestBaseLock(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = locks.BaseLock('lock', maxCount=2)
+        self.lock._reactor = self.clock = task.Clock()
+        lockid = locks.MasterLock('lock')
+        self.counting = locks.LockAccess(lockid, 'counting')
+        self.exclusive = locks.LockAccess(lockid, 'exclusive')
+
+    def test_counting(self):
+        lock = self.lock
+        lock.claim('a', self.counting)
+        self.assertTrue(lock.isAvailable('b', self.counting))
+        self.assertFalse(lock.isAvailable('b', self.exclusive))
+        lock.claim('b', self.counting)
+        self.assertFalse(lock.isAvailable('c', self.counting))
+        self.assertEqual(lock._getOwnersCount(), (0, 2))
+        lock.release('a', self.counting)
+        self.assertTrue(lock.isAvailable('c', self.counting))
+        self.assertTrue(lock.isOwner('b', self.counting))
+        self.assertFalse(lock.isOwner('a', self.counting))
+
+    def test_waiters_ahead(self):
+        lock = self.lock
+        lock.claim('a', self.counting)
+        lock.claim('b', self.counting)
+        lock.waitUntilMaybeAvailable('c', self.counting)
+        lock.waitUntilMaybeAvailable('d', self.exclusive)
+        lock.waitUntilMaybeAvailable('e', self.counting)
+
+        lock.release('a', self.counting)
+        # only the first waiter fits in the lock
+        self.assertTrue(lock.isAvailable('c', self.counting))
+        self.assertFalse(lock.isAvailable('e', self.counting))
+        lock.claim('c', self.counting)
+        self.assertEqual(list(lock.waiting), ['d', 'e'])
+
+        lock.release('b', self.counting)
+        # the exclusive waiter is not starved by the counting waiter behind
+        self.assertFalse(lock.isAvailable('e', self.counting))
+        lock.release('c', self.counting)
+        self.assertTrue(lock.isAvailable('d', self.exclusive))
+        lock.claim('d', self.exclusive)
+        self.assertFalse(lock.isAvailable('e', self.counting))
+        lock.release('d', self.exclusive)
+        self.assertTrue(lock.isAvailable('e', self.counting))
+
+    def test_release_wakes_waiters(self):
+        lock = self.lock
+        lock.claim('a', self.exclusive)
+        woken = []
+        for owner in 'bcd':
+            d = lock.waitUntilMaybeAvailable(owner, self.counting)
+            d.addCallback(lambda _, owner=owner: woken.append(owner))
+        lock.release('a', self.exclusive)
+        self.assertEqual([w for _, w, _, _ in lock.waiting.values()],
+                         [None, None, mock.ANY])
+        d = flushEventualQueue()
+
+        @d.addCallback
+        def check(_):
+            self.assertEqual(woken, ['b', 'c'])
+        return d
+
+    def test_stopWaitingUntilAvailable(self):
+        lock = self.lock
+        lock.claim('a', self.exclusive)
+        d = lock.waitUntilMaybeAvailable('b', self.exclusive)
+        lock.waitUntilMaybeAvailable('c', self.counting)
+        lock.stopWaitingUntilAvailable('b', self.exclusive, d)
+        self.assertEqual(list(lock.waiting), ['c'])
+        lock.release('a', self.exclusive)
+        self.assertTrue(lock.isAvailable('c', self.counting))
+
+    def test_wait_metric(self):
+        log = mock.Mock()
+        self.patch(metrics.MetricTimeEvent, 'log', log)
+        lock = self.lock
+        lock.claim('a', self.exclusive)
+        lock.waitUntilMaybeAvailable('b', self.counting)
+        self.clock.advance(5)
+        lock.release('a', self.exclusive)
+        lock.claim('b', self.counting)
+        lock.claim('c', self.counting)
+        log.assert_called_once_with('Lock.wait.lock', 5)
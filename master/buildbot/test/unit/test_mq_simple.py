@@ -12,10 +12,16 @@
 # Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 # Copyright Buildbot Team Members
+import os
+import shutil
+
 import mock
+from twisted.internet import defer
 from twisted.trial import unittest
 
 from buildbot.mq import simple
+from buildbot.process import metrics
+from buildbot.test.fake import fakemaster
 
 
 class SimpleMQ(unittest.TestCase):
@@ -26,3 +32,210 @@ class SimpleMQ(unittest.TestCase):
 
     # this class *only* implements the interface, so there's little left to
     # test
+
+
+class Routing(unittest.TestCase):
+
+    def setUp(self):
+        self.mq = simple.SimpleMQ()
+        self.calls = []
+
+    def consume(self, name, filter, **kwargs):
+        def cb(routingKey, data):
+            self.calls.append(name)
+        return self.successResultOf(
+            self.mq.startConsuming(cb, filter, **kwargs))
+
+    def test_produce_in_subscription_order(self):
+        self.consume('a', ('builds', None, 'new'))
+        self.consume('b', ('builds', '1', None))
+        self.consume('c', (None, None, None))
+        self.consume('d', ('builds', '1', 'new'))
+        self.consume('e', ('builds', '2', 'new'))
+        self.consume('f', ('builds', '1'))
+        self.mq.produce(('builds', '1', 'new'), {})
+        self.assertEqual(self.calls, ['a', 'b', 'c', 'd'])
+
+    def test_produce_no_match(self):
+        self.consume('a', ('builds', None, 'new'))
+        self.mq.produce(('builds', '1', 'finished'), {})
+        self.mq.produce(('builds', '1'), {})
+        self.mq.produce(('changes', '1', 'new'), {})
+        self.assertEqual(self.calls, [])
+
+    def test_stopConsuming_prunes_routes(self):
+        qref1 = self.consume('a', ('builds', None, 'new'))
+        qref2 = self.consume('b', ('builds', '1', 'new'))
+        qref1.stopConsuming()
+        self.assertEqual(list(self.mq.routes[3].children['builds'].children),
+                         ['1'])
+        qref2.stopConsuming()
+        self.assertEqual(self.mq.routes, {})
+
+    def test_stopConsuming_during_produce(self):
+        qrefs = []
+
+        def cb(routingKey, data):
+            self.calls.append('a')
+            qrefs[1].stopConsuming()
+        qrefs.append(self.successResultOf(
+            self.mq.startConsuming(cb, ('builds', None))))
+        qrefs.append(self.consume('b', ('builds', None)))
+        self.mq.produce(('builds', '1'), {})
+        self.mq.produce(('builds', '1'), {})
+        self.assertEqual(self.calls, ['a', 'a'])
+
+    def test_persistent_stays_routed(self):
+        qref = self.consume('a', ('builds', None), persistent_name='P')
+        qref.stopConsuming()
+        self.mq.produce(('builds', '1'), {})
+        self.assertEqual(self.calls, [])
+        self.consume('b', ('builds', None), persistent_name='P')
+        self.assertEqual(self.calls, ['b'])
+
+
+class PersistentQueues(unittest.TestCase):
+
+    def setUp(self):
+        self.basedir = os.path.abspath('basedir')
+        if os.path.exists(self.basedir):
+            shutil.rmtree(self.basedir)
+        self.master = fakemaster.make_master()
+        self.master.basedir = self.basedir
+        self.mq = simple.SimpleMQ()
+        self.mq.setServiceParent(self.master)
+        self.received = []
+        self.metrics = []
+        self.patch(metrics.MetricCountEvent, 'log',
+                   staticmethod(lambda *args, **kw: self.metrics.append(args)))
+
+    def configure(self, **mq):
+        new_config = mock.Mock()
+        new_config.mq = mq
+        self.successResultOf(
+            self.mq.reconfigServiceWithBuildbotConfig(new_config))
+
+    def consume(self, routingKey, data):
+        self.received.append(data)
+
+    def startConsuming(self, callback=None):
+        return self.successResultOf(self.mq.startConsuming(
+            callback or self.consume, ('x', None), persistent_name='P'))
+
+    def produce(self, first, last):
+        for i in range(first, last):
+            self.mq.produce(('x', str(i)), i)
+
+    def test_unbounded(self):
+        self.configure()
+        self.startConsuming().stopConsuming()
+        self.produce(0, 1000)
+        self.startConsuming()
+        self.assertEqual(self.received, range(1000))
+
+    def test_bounded_drops_oldest(self):
+        self.configure(persistent_queue_size=10)
+        self.startConsuming().stopConsuming()
+        self.produce(0, 25)
+        self.startConsuming()
+        self.assertEqual(self.received, range(15, 25))
+
+    def test_bounded_keeps_messages_during_replay(self):
+        self.configure(persistent_queue_size=2)
+        self.startConsuming().stopConsuming()
+        self.produce(0, 2)
+
+        waiting = []
+
+        def consume(routingKey, data):
+            self.received.append(data)
+            d = defer.Deferred()
+            waiting.append(d)
+            return d
+        self.startConsuming(consume)
+        self.produce(2, 6)
+        while len(self.received) < 6:
+            waiting[-1].callback(None)
+        self.assertEqual(self.received, range(6))
+
+    def test_spool(self):
+        self.configure(persistent_queue_size=10, persistent_queue_spool='mq')
+        qref = self.startConsuming()
+        qref.stopConsuming()
+        self.produce(0, 1000)
+        self.assertEqual(len(qref.queue), 10)
+        self.assertEqual(qref.depth, 1000)
+        self.assertTrue(os.path.exists(qref.spool.path))
+        self.assertTrue(qref.spool.path.startswith(
+            os.path.join(self.basedir, 'mq', 'P-')))
+        self.assertIn(('mq.persistent.P.depth', 1000), self.metrics)
+
+        spool_path = qref.spool.path
+        self.startConsuming()
+        self.assertEqual(self.received, range(1000))
+        self.assertEqual(qref.depth, 0)
+        self.assertFalse(os.path.exists(spool_path))
+        self.assertEqual(self.metrics[-2:], [
+            ('mq.persistent.P.depth', 0),
+            ('mq.persistent.P.spilled_bytes', 0)])
+
+        # with the queue caught up, messages are delivered directly
+        self.produce(1000, 1001)
+        self.assertEqual(self.received[-1], 1000)
+
+    def test_replay_waits_for_consumer(self):
+        self.configure(persistent_queue_size=2, persistent_queue_spool='mq')
+        self.startConsuming().stopConsuming()
+        self.produce(0, 5)
+
+        waiting = []
+
+        def consume(routingKey, data):
+            self.received.append(data)
+            d = defer.Deferred()
+            waiting.append(d)
+            return d
+        qref = self.startConsuming(consume)
+        self.assertEqual(self.received, [0])
+
+        # new messages are queued behind the replay
+        self.produce(5, 7)
+        waiting[-1].callback(None)
+        self.assertEqual(self.received, [0, 1])
+        while len(self.received) < 7:
+            waiting[-1].callback(None)
+        self.assertEqual(self.received, range(7))
+        waiting[-1].callback(None)
+        self.assertEqual(qref.depth, 0)
+        self.assertEqual(qref.callback, consume)
+
+    def test_stopConsuming_during_replay(self):
+        self.configure()
+        self.startConsuming().stopConsuming()
+        self.produce(0, 5)
+
+        waiting = []
+
+        def consume(routingKey, data):
+            self.received.append(data)
+            d = defer.Deferred()
+            waiting.append(d)
+            return d
+        qref = self.startConsuming(consume)
+        qref.stopConsuming()
+        waiting[-1].callback(None)
+        self.assertEqual(self.received, [0])
+        self.assertEqual(qref.depth, 4)
+
+        self.startConsuming()
+        self.assertEqual(self.received, range(5))
+
+    def test_stopService_removes_spool(self):
+        self.configure(persistent_queue_size=1, persistent_queue_spool='mq')
+        qref = self.startConsuming()
+        qref.stopConsuming()
+        self.produce(0, 5)
+        spool_path = qref.spool.path
+        self.mq.running = True
+        self.mq.stopService()
+        self.assertFalse(os.path.exists(spool_path))
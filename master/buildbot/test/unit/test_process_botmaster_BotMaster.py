@@ -154,6 +154,8 @@ class TestBotMaster(unittest.TestCase):
         self.assertIdentical(bldr.parent, self.botmaster)
         self.assertIdentical(bldr.master, self.master)
         self.assertEqual(self.botmaster.builderNames, ['bldr'])
+        builderid = yield bldr.getBuilderId()
+        self.assertEqual(self.botmaster.buildersById, {builderid: bldr})
 
         self.new_config.builders = []
 
@@ -163,6 +165,54 @@ class TestBotMaster(unittest.TestCase):
         self.assertIdentical(bldr.master, None)
         self.assertEqual(self.botmaster.builders, {})
         self.assertEqual(self.botmaster.builderNames, [])
+        self.assertEqual(self.botmaster.buildersById, {})
+
+    @defer.inlineCallbacks
+    def test_reconfigServiceBuilders_indexes_added_builders(self):
+        # build requests for a builder added by a reconfig that is still
+        # running find that builder
+        updated = defer.Deferred()
+        self.patch(self.master.data.updates, 'updateBuilderList',
+                   mock.Mock(return_value=updated))
+        self.patch(self.botmaster, 'maybeStartBuildsForBuilder', mock.Mock())
+        self.master.mq.verifyMessages = False
+        bc = config.BuilderConfig(name='bldr', factory=factory.BuildFactory(),
+                                  workername='f')
+        self.new_config.builders = [bc]
+
+        d = self.botmaster.reconfigServiceBuilders(self.new_config)
+        builderid = yield self.botmaster.builders['bldr'].getBuilderId()
+        self.master.mq.callConsumer(
+            ('buildrequests', '13', 'new'),
+            dict(buildrequestid=13, builderid=builderid))
+        self.botmaster.maybeStartBuildsForBuilder.assert_called_once_with(
+            'bldr')
+
+        updated.callback(None)
+        yield d
+
+        self.master.data.updates.updateBuilderList.return_value = \
+            defer.succeed(None)
+        self.new_config.builders = []
+        yield self.botmaster.reconfigServiceBuilders(self.new_config)
+
+    def test_buildRequestAdded(self):
+        bldr = mock.Mock()
+        bldr.name = 'bldr'
+        self.botmaster.buildersById = {10: bldr}
+        self.patch(self.botmaster, 'maybeStartBuildsForBuilder', mock.Mock())
+        self.patch(self.botmaster.brd, 'buildRequestEvent', mock.Mock())
+        self.master.mq.verifyMessages = False
+
+        for builderid, event in [(10, 'new'), (10, 'unclaimed'), (11, 'new')]:
+            self.master.mq.callConsumer(
+                ('buildrequests', '13', event),
+                dict(buildrequestid=13, builderid=builderid))
+
+        self.assertEqual(self.botmaster.brd.buildRequestEvent.call_count, 3)
+        self.assertEqual(
+            self.botmaster.maybeStartBuildsForBuilder.call_args_list,
+            [mock.call('bldr'), mock.call('bldr')])
 
     def test_maybeStartBuildsForBuilder(self):
         brd = self.botmaster.brd = mock.Mock()
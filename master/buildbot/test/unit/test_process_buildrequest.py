@@ -180,6 +180,42 @@ class TestBuildRequestCollapser(unittest.TestCase):
         yield self.do_request_collapse(rows, [22], [])
         yield self.do_request_collapse(rows, [21], [19, 20])
 
+    @defer.inlineCallbacks
+    def test_collapseRequests_collapse_default_index(self):
+        # the default strategy looks the requests up by signature, without
+        # comparing them one by one
+        self.patch(buildrequest.BuildRequest, 'canBeCollapsed',
+                   mock.Mock(side_effect=AssertionError('not indexed')))
+        rows = [fakedb.Builder(id=77, name='A')]
+        sourcestamps = [
+            # the new request, and one that can be collapsed with it
+            dict(branch='trunk', revision='abcd'),
+            dict(branch='trunk', revision='abcd'),
+            # other branch, other revision, and patch
+            dict(branch='release', revision='abcd'),
+            dict(branch='trunk', revision='1234'),
+            dict(branch='trunk', revision='abcd', patchid=99),
+        ]
+        rows.append(fakedb.Patch(id=99))
+        for i, ss in enumerate(sourcestamps):
+            rows.extend([
+                fakedb.SourceStamp(id=240 + i, codebase='C',
+                                   repository='repo', project='prj', **ss),
+                fakedb.Buildset(id=40 + i, reason='foo',
+                                submitted_at=1300305712 - i, results=-1),
+                fakedb.BuildsetSourceStamp(sourcestampid=240 + i,
+                                           buildsetid=40 + i),
+                fakedb.BuildRequest(id=50 + i, buildsetid=40 + i,
+                                    builderid=77, priority=13,
+                                    submitted_at=1300305712 - i, results=-1),
+            ])
+        # another request of the new buildset
+        rows.append(fakedb.BuildRequest(id=60, buildsetid=40, builderid=77,
+                                        submitted_at=1300305700, results=-1))
+
+        self.bldr.getCollapseRequestsFn = lambda: Builder._defaultCollapseRequestFn
+        yield self.do_request_collapse(rows, [50], [60, 51])
+
 
 class TestBuildRequest(unittest.TestCase):
 
@@ -225,6 +261,17 @@ class TestBuildRequest(unittest.TestCase):
         d.addCallback(check)
         return d
 
+    def test_collapseSignature(self):
+        def ss(codebase, revision='abcd', patch_body=None):
+            return dict(codebase=codebase, revision=revision,
+                        repository='repo', branch='trunk', project='prj',
+                        patch_body=patch_body)
+        sig = buildrequest.BuildRequest.collapseSignature
+        self.assertEqual(sig([ss('A'), ss('B')]), sig([ss('B'), ss('A')]))
+        self.assertNotEqual(sig([ss('A')]), sig([ss('A'), ss('B')]))
+        self.assertNotEqual(sig([ss('A')]), sig([ss('A', revision='1234')]))
+        self.assertEqual(sig([ss('A', patch_body='diff')]), None)
+
     def test_fromBrdict_submittedAt_NULL(self):
         master = fakemaster.make_master(testcase=self,
                                         wantData=True, wantDb=True)
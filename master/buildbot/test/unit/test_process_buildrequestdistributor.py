@@ -267,6 +267,30 @@ class Test(TestBRDBase):
         self.quiet_deferred.addCallback(check)
         return self.quiet_deferred
 
+    def test_maybeStartBuildsOn_burst(self):
+        self.useMock_maybeStartBuildsOnBuilder()
+        self.addBuilders(['bldr1', 'bldr2', 'bldr3'])
+        sortBuilders = mock.Mock(side_effect=self.brd._sortBuilders)
+        self.patch(self.brd, '_sortBuilders', sortBuilders)
+        # hold the lock, as a call that is still sorting the builders would
+        self.brd.pending_builders_lock.acquire()
+        for name in ['bldr3', 'bldr1', 'bldr3', 'bldr2', 'bldr1']:
+            self.brd.maybeStartBuildsOn([name])
+        # the calls merged into the first one wait for it too
+        calls = list(self.brd._pendingMSBOCalls)
+        self.assertEqual(len(calls), 5)
+        self.assertEqual([d.called for d in calls], [False] * 5)
+        self.brd.pending_builders_lock.release()
+
+        def check(_):
+            # the whole burst was sorted at once
+            self.assertEqual(sortBuilders.call_count, 1)
+            self.assertEqual(sorted(self.maybeStartBuildsOnBuilder_calls),
+                             ['bldr1', 'bldr2', 'bldr3'])
+            self.checkAllCleanedUp()
+        self.quiet_deferred.addCallback(check)
+        return self.quiet_deferred
+
     def test_maybeStartBuildsOn_builders_missing(self):
         self.useMock_maybeStartBuildsOnBuilder()
         self.addBuilders(['bldr1', 'bldr2', 'bldr3'])
@@ -918,3 +942,112 @@ class TestMaybeStartBuilds(TestBRDBase):
         result = self.do_test_nextBuild(nextBuild)
         self.assertEqual(1, len(self.flushLoggedErrors(RuntimeError)))
         return result
+
+    # unclaimed queue
+
+    @defer.inlineCallbacks
+    def test_queue_updated_from_events(self):
+        self.addWorkers({'test-worker1': 1})
+        rows = self.base_rows + [
+            fakedb.BuildRequest(id=10, buildsetid=11, builderid=77,
+                                submitted_at=130000),
+        ]
+        yield self.do_test_maybeStartBuildsOnBuilder(rows=rows,
+                                                     exp_claims=[10], exp_builds=[('test-worker1', [10])])
+
+        yield self.master.db.insertTestData([
+            fakedb.BuildRequest(id=11, buildsetid=11, builderid=77,
+                                submitted_at=135000),
+        ])
+        msg = yield self.master.data.get(('buildrequests', 11))
+
+        # the queue must not be fetched again
+        def getBuildRequests(*args, **kwargs):
+            self.fail("unclaimed requests refetched")
+        self.patch(self.master.db.buildrequests, 'getBuildRequests',
+                   getBuildRequests)
+        self.brd.buildRequestEvent(('buildrequests', '11', 'new'), msg)
+
+        yield self.brd._maybeStartBuildsOnBuilder(self.bldr)
+        self.assertMyClaims([10, 11])
+        self.assertBuildsStarted([('test-worker1', [10]), ('test-worker1', [11])])
+
+    @defer.inlineCallbacks
+    def test_queue_drops_claimed_requests(self):
+        rows = self.base_rows + [
+            fakedb.BuildRequest(id=10, buildsetid=11, builderid=77,
+                                submitted_at=130000),
+            fakedb.BuildRequest(id=11, buildsetid=11, builderid=77,
+                                submitted_at=135000),
+        ]
+        yield self.master.db.insertTestData(rows)
+        queue = yield self.brd._getUnclaimedQueue(self.bldr)
+        self.assertEqual(len(queue), 2)
+
+        msg = yield self.master.data.get(('buildrequests', 10))
+        msg['claimed'] = True
+        self.brd.buildRequestEvent(('buildrequests', '10', 'claimed'), msg)
+        self.assertEqual([brd['buildrequestid'] for brd in queue.brdicts()],
+                         [11])
+
+    @defer.inlineCallbacks
+    def test_stopService_forgets_queues(self):
+        yield self.master.db.insertTestData(self.base_rows)
+        yield self.brd._getUnclaimedQueue(self.bldr)
+        yield self.brd.stopService()
+        self.assertEqual(self.brd._unclaimedQueues, {})
+
+
+class TestUnclaimedBuildRequestQueue(unittest.TestCase):
+
+    def mkbrdict(self, brid, submitted_at):
+        return {'buildrequestid': brid,
+                'submitted_at': epoch2datetime(submitted_at)}
+
+    def test_peek_oldest(self):
+        queue = buildrequestdistributor.UnclaimedBuildRequestQueue([
+            self.mkbrdict(10, 300), self.mkbrdict(11, 100),
+            self.mkbrdict(12, 200)])
+        self.assertEqual(queue.peek()['buildrequestid'], 11)
+        self.assertEqual(queue.oldestSubmittedAt(), epoch2datetime(100))
+        self.assertEqual([brd['buildrequestid'] for brd in queue.brdicts()],
+                         [11, 12, 10])
+
+    def test_empty(self):
+        queue = buildrequestdistributor.UnclaimedBuildRequestQueue()
+        self.assertEqual(queue.peek(), None)
+        self.assertEqual(queue.oldestSubmittedAt(), None)
+        self.assertEqual(len(queue), 0)
+
+    def test_discard(self):
+        queue = buildrequestdistributor.UnclaimedBuildRequestQueue([
+            self.mkbrdict(10, 100), self.mkbrdict(11, 200)])
+        queue.discard(10)
+        queue.discard(10)
+        queue.discard(99)
+        self.assertNotIn(10, queue)
+        self.assertEqual(len(queue), 1)
+        self.assertEqual(queue.peek()['buildrequestid'], 11)
+
+    def test_discard_and_add_again(self):
+        queue = buildrequestdistributor.UnclaimedBuildRequestQueue([
+            self.mkbrdict(10, 100), self.mkbrdict(11, 200)])
+        queue.discard(10)
+        queue.add(self.mkbrdict(10, 100))
+        queue.add(self.mkbrdict(10, 100))
+        self.assertEqual(len(queue), 2)
+        self.assertEqual(queue.peek()['buildrequestid'], 10)
+        queue.discard(10)
+        self.assertEqual(queue.peek()['buildrequestid'], 11)
+        queue.discard(11)
+        self.assertEqual(queue.peek(), None)
+
+    def test_compaction(self):
+        queue = buildrequestdistributor.UnclaimedBuildRequestQueue(
+            [self.mkbrdict(brid, brid) for brid in range(1000)])
+        for brid in range(0, 1000, 2):
+            queue.discard(brid)
+        self.assertEqual(len(queue), 500)
+        self.assertTrue(len(queue._heap) <= 2 * 500 + 32)
+        self.assertEqual([brd['buildrequestid'] for brd in queue.brdicts()],
+                         list(range(1, 1000, 2)))
@@ -186,6 +186,66 @@ class TestLogLineObserver(unittest.TestCase):
         lo = MyLogLineObserver()
         lo.setMaxLineLength(120939403)
 
+    def test_max_length(self):
+        lo = MyLogLineObserver()
+        lo.setMaxLineLength(5)
+        lo.outReceived(u'short\ntoo long\nok\n')
+        self.assertEqual(lo.obs, [('out', 'short'), ('out', 'ok')])
+
+    def test_lines_adapter(self):
+        # observers overriding only some of the line methods
+        lo = logobserver.LogLineObserver()
+        lo.outLineReceived = mock.Mock()
+        lo.errLineReceived = mock.Mock()
+        lo.outReceived(u'a\nb\n')
+        lo.errReceived(u'c\n')
+        lo.headerReceived(u'd\n')
+        self.assertEqual(lo.outLineReceived.call_args_list,
+                         [mock.call(u'a'), mock.call(u'b')])
+        lo.errLineReceived.assert_called_once_with(u'c')
+
+
+class MyLogLinesObserver(logobserver.LogLineObserver):
+
+    def __init__(self):
+        logobserver.LogLineObserver.__init__(self)
+        self.obs = []
+
+    def outLinesReceived(self, lines):
+        self.obs.append(('out', lines))
+
+    def errLinesReceived(self, lines):
+        self.obs.append(('err', lines))
+
+    def headerLinesReceived(self, lines):
+        self.obs.append(('hdr', lines))
+
+
+class TestLogLinesObserver(unittest.TestCase):
+
+    def setUp(self):
+        self.master = fakemaster.make_master(testcase=self, wantData=True)
+
+    @defer.inlineCallbacks
+    def test_sequence(self):
+        logid = yield self.master.data.updates.addLog(1, u'mine', u's')
+        l = log.Log.new(self.master, 'mine', 's', logid, 'utf-8')
+        lo = MyLogLinesObserver()
+        lo.setLog(l)
+
+        yield l.addStdout(u'hello\n')
+        yield l.addStderr(u'cruel\n')
+        yield l.addStdout(u'multi\nline\nchunk\n')
+        yield l.addHeader(u'H1\nH2\n')
+        yield l.finish()
+
+        self.assertEqual(lo.obs, [
+            ('out', ['hello']),
+            ('err', ['cruel']),
+            ('out', ['multi', 'line', 'chunk']),
+            ('hdr', ['H1', 'H2']),
+        ])
+
 
 class TestOutputProgressObserver(unittest.TestCase):
 
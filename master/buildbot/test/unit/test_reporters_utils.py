@@ -116,6 +116,24 @@ class TestDataUtils(unittest.TestCase):
         self.assertEqual(
             build1['steps'][0]['logs'][0]['content']['content'], self.LOGCONTENT)
 
+    @defer.inlineCallbacks
+    def test_getLogsForSteps(self):
+        self.setupDb()
+        self.db.insertTestData([
+            fakedb.Log(id=90, stepid=221, name='err', slug='err', type='t'),
+            fakedb.Log(id=91, stepid=121, name='err', slug='err', type='t'),
+        ])
+        self.patch(utils, 'LOGS_STEPS_BATCH_SIZE', 2)
+        steps = []
+        for buildid in (20, 21):
+            steps.extend((yield self.master.data.get(
+                ('builds', buildid, 'steps'))))
+        yield utils.getLogsForSteps(self.master, steps)
+        self.assertEqual(
+            [(s['stepid'], [l['logid'] for l in s['logs']]) for s in steps],
+            [(120, [80]), (220, []), (121, [81, 91]), (221, [90])])
+        self.assertNotIn('content', steps[0]['logs'][0])
+
     @defer.inlineCallbacks
     def test_getResponsibleUsers(self):
         self.setupDb()
@@ -148,6 +166,13 @@ class TestDataUtils(unittest.TestCase):
         res = yield utils.getPreviousBuild(self.master, build)
         self.assertEqual(res['buildid'], 18)
 
+    @defer.inlineCallbacks
+    def test_getPreviousBuildFirst(self):
+        self.setupDb()
+        build = yield self.master.data.get(("builds", 18))
+        res = yield utils.getPreviousBuild(self.master, build)
+        self.assertEqual(res, None)
+
 
 class TestURLUtils(unittest.TestCase):
 
@@ -0,0 +1,100 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+import mock
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from buildbot.changes.filter import ChangeFilter
+from buildbot.schedulers import dispatcher
+from buildbot.test.fake import fakedb
+from buildbot.test.fake import fakemaster
+
+
+class ChangeDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.master = fakemaster.make_master(testcase=self,
+                                             wantDb=True, wantMq=True)
+        self.master.mq.verifyMessages = False
+        self.master.db.insertTestData([
+            fakedb.Change(changeid=1, branch=u'master', project=u'bb'),
+            fakedb.Change(changeid=2, branch=u'release', project=u'bb'),
+            fakedb.Change(changeid=3, branch=u'master', project=u'other'),
+        ])
+        self.getChange = mock.Mock(
+            side_effect=self.master.db.changes.getChange)
+        self.patch(self.master.db.changes, 'getChange', self.getChange)
+        self.dispatcher = self.master.change_dispatcher
+
+    @defer.inlineCallbacks
+    def subscribe(self, change_filter=None):
+        got = []
+        sub = yield self.dispatcher.subscribe(got.append, change_filter)
+        defer.returnValue((sub, got))
+
+    def sendChange(self, changeid):
+        self.master.mq.callConsumer(('changes', str(changeid), 'new'),
+                                    dict(changeid=changeid))
+
+    def test_master_service(self):
+        self.assertIsInstance(self.dispatcher, dispatcher.ChangeDispatcher)
+        self.assertIdentical(self.dispatcher.master, self.master)
+
+    @defer.inlineCallbacks
+    def test_one_consumer_and_change(self):
+        sub1, got1 = yield self.subscribe()
+        sub2, got2 = yield self.subscribe()
+        self.assertEqual(len(self.master.mq.qrefs), 1)
+
+        self.sendChange(1)
+        self.assertEqual([c.number for c in got1], [1])
+        self.assertIdentical(got1[0], got2[0])
+        self.assertEqual(self.getChange.call_count, 1)
+
+        sub1.stopConsuming()
+        self.assertEqual(len(self.master.mq.qrefs), 1)
+        sub2.stopConsuming()
+        self.assertEqual(self.master.mq.qrefs, [])
+
+    @defer.inlineCallbacks
+    def test_indexed_filters(self):
+        _, got_master = yield self.subscribe(ChangeFilter(branch='master'))
+        _, got_bb = yield self.subscribe(
+            ChangeFilter(project=['bb'], branch_re='rel'))
+        _, got_fn = yield self.subscribe(
+            ChangeFilter(filter_fn=lambda c: True))
+        _, got_all = yield self.subscribe()
+
+        for changeid in 1, 2, 3:
+            self.sendChange(changeid)
+        self.assertEqual([c.number for c in got_master], [1, 3])
+        # only the indexed check is applied by the dispatcher
+        self.assertEqual([c.number for c in got_bb], [1, 2])
+        self.assertEqual([c.number for c in got_fn], [1, 2, 3])
+        self.assertEqual([c.number for c in got_all], [1, 2, 3])
+
+    @defer.inlineCallbacks
+    def test_unsubscribe_while_delivering(self):
+        got = []
+        subs = []
+
+        def callback(change):
+            got.append(change)
+            subs[1].stopConsuming()
+        subs.append((yield self.dispatcher.subscribe(callback)))
+        subs.append((yield self.dispatcher.subscribe(callback)))
+
+        self.sendChange(1)
+        self.assertEqual(len(got), 1)
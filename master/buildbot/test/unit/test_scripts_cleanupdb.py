@@ -34,6 +34,13 @@ try:
 except ImportError:
     hasLz4 = False
 
+try:
+    import zstandard
+    [zstandard]
+    hasZstd = True
+except ImportError:
+    hasZstd = False
+
 
 def mkconfig(**kwargs):
     config = dict(quiet=False, basedir=os.path.abspath('basedir'))
@@ -145,6 +152,9 @@ class TestCleanupDb(misc.StdoutAssertionsMixin, dirs.DirsMixin,
                 # ok.. lz4 is not installed, dont fail
                 lengths["lz4"] = 40
                 continue
+            if mode == "zstd" and not hasZstd:
+                lengths["zstd"] = 20
+                continue
             # create a master.cfg with different compression method
             self.createMasterCfg("c['logCompressionMethod'] = '%s'" % (mode,))
             res = yield cleanupdb._cleanupDatabase(mkconfig(basedir='basedir'))
@@ -164,7 +174,8 @@ class TestCleanupDb(misc.StdoutAssertionsMixin, dirs.DirsMixin,
             lengths[mode] = yield self.db.pool.do(thd)
 
         self.assertDictAlmostEqual(
-            lengths, {'raw': 5999, 'bz2': 44, 'lz4': 40, 'gz': 31})
+            lengths, {'raw': 5999, 'bz2': 44, 'lz4': 40, 'gz': 31,
+                      'zstd': 20})
 
     def assertDictAlmostEqual(self, d1, d2):
         # The test shows each methods return different size
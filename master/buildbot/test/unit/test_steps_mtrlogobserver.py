@@ -92,3 +92,35 @@ class TestEqConnectionPool(unittest.TestCase):
         # of different type
         pool = mtrlogobserver.EqConnectionPool("DummyDb1")
         self.assertTrue(pool != object())
+
+
+class TestMtrLogObserver(unittest.TestCase):
+
+    mtrLog = (
+        "main.alias                               [ pass ]     10\n"
+        "main.almost_full                         [ pass ]     20\n"
+        "main.analyze                             [ pass ]     30\n")
+
+    def makeObserver(self, cls=mtrlogobserver.MtrLogObserver):
+        observer = cls()
+        observer.step = mock.Mock()
+        return observer
+
+    def test_outLinesReceived(self):
+        observer = self.makeObserver()
+        observer.outReceived(self.mtrLog)
+        self.assertEqual(observer.numTests, 3)
+        observer.step.setProgress.assert_called_once_with('tests', 3)
+
+    def test_outLineReceived_overridden(self):
+        class Observer(mtrlogobserver.MtrLogObserver):
+
+            def outLineReceived(self, line):
+                seen.append(line)
+                mtrlogobserver.MtrLogObserver.outLineReceived(self, line)
+
+        seen = []
+        observer = self.makeObserver(Observer)
+        observer.outReceived(self.mtrLog)
+        self.assertEqual(seen, self.mtrLog.rstrip().split('\n'))
+        self.assertEqual(observer.numTests, 3)
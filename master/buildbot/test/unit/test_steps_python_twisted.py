@@ -14,6 +14,7 @@
 # Copyright Buildbot Team Members
 import textwrap
 
+import mock
 from twisted.trial import unittest
 
 from buildbot.process.properties import Property
@@ -312,3 +313,28 @@ class HLint(steps.BuildStepMixin, unittest.TestCase):
         self.expectLogfile('warnings', 'colon: meaning warning')
         self.expectOutcome(result=WARNINGS, state_string='hlint (warnings)')
         return self.runStep()
+
+
+class TrialTestCaseCounter(unittest.TestCase):
+
+    def test_outLinesReceived(self):
+        counter = python_twisted.TrialTestCaseCounter()
+        counter.step = mock.Mock()
+        counter.outReceived(failureLog)
+        self.assertEqual(counter.numTests, 5)
+        counter.step.setProgress.assert_called_once_with('tests', 5)
+
+    def test_outLineReceived_overridden(self):
+        class Counter(python_twisted.TrialTestCaseCounter):
+
+            def outLineReceived(self, line):
+                seen.append(line)
+                python_twisted.TrialTestCaseCounter.outLineReceived(
+                    self, line)
+
+        seen = []
+        counter = Counter()
+        counter.step = mock.Mock()
+        counter.outReceived(failureLog)
+        self.assertEqual(seen, failureLog.rstrip().split('\n'))
+        self.assertEqual(counter.numTests, 5)
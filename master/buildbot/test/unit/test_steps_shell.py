@@ -18,6 +18,7 @@ import textwrap
 from twisted.trial import unittest
 
 from buildbot import config
+from buildbot.process import logobserver
 from buildbot.process import properties
 from buildbot.process import remotetransfer
 from buildbot.process.results import EXCEPTION
@@ -931,6 +932,110 @@ class WarningCountingShellCommand(steps.BuildStepMixin, unittest.TestCase,
             lambda: shell.WarningCountingShellCommand())
 
 
+class WarningCountingLogObserver(unittest.TestCase):
+
+    log = textwrap.dedent(u"""\
+        make: Entering directory \u2019amar-src\u2019
+        gcc -c amar.c
+        amar.c:164: warning: unused variable 'x'
+        amar.c:165: Warning: this should show up
+        make: Leaving directory 'amar-src'
+        make: Leaving directory 'amar-src'
+        make: Entering directory 'server-src'
+        holding.c: In function 'holding_thing':
+        holding.c:984: warning: invalid access to non-static 'y'
+        holding.c:985: warning:""" + u"x" * 20000 + u"""
+        warning
+        no warnings here
+        """)
+
+    def countWarnings(self, step, observer, chunks):
+        observer.setStep(step)
+        for chunk in chunks:
+            observer.outReceived(chunk)
+        observer.headerReceived(u'a header warning: xyz\n')
+        observer.finishReceived()
+        return step.warnCount, step.loggedWarnings, step.directoryStack
+
+    def assertSameWarnings(self, chunks, **kwargs):
+        def makeStep():
+            step = shell.WarningCountingShellCommand(command=['make'],
+                                                     **kwargs)
+            step.addSuppression([(None, '.*non-static.*', None, None)])
+            return step
+        step = makeStep()
+        lines = self.countWarnings(
+            step, logobserver.LineConsumerLogObserver(step.warningLogConsumer),
+            chunks)
+        warnings = self.countWarnings(
+            makeStep(), shell._WarningCountingLogObserver(), chunks)
+        self.assertEqual(warnings, lines)
+        return warnings
+
+    def test_same_as_lines(self):
+        lines = self.log.splitlines(True)
+        count, warnings, directories = self.assertSameWarnings(
+            [u''.join(lines[:4]), u''.join(lines[4:])])
+        self.assertEqual(count, 3)
+        self.assertEqual(directories, ['server-src'])
+
+    def test_same_as_lines_no_literal(self):
+        # patterns without a literal are matched against every line
+        self.assertSameWarnings([self.log],
+                                warningPattern='.*(warning|error).*',
+                                directoryEnterPattern='^IN: (.*)')
+
+    def test_requiredLiteral(self):
+        for pattern, literal in [
+                ('(?i).*warning[: ].*', 'warning'),
+                (u"make.*: Entering directory [\u2019\"`'](.*)[\u2019'`\"]",
+                 ': Entering directory '),
+                (r'^(\S+):(\d+): (error|warning): (.*)', ': '),
+                (r'(?:foo)(bar)+baz', 'foo'),
+                ('warning|error', None),
+                ('.*', None)]:
+            self.assertEqual(shell._requiredLiteral(re.compile(pattern)),
+                             literal, pattern)
+
+    def test_combinePatterns(self):
+        combined = shell._combinePatterns(
+            [re.compile('.*unused.*'), re.compile('non-static')])
+        self.assertTrue(combined.search('unused variable'))
+        self.assertTrue(combined.search('access to non-static'))
+        self.assertFalse(combined.search('something else'))
+        self.assertEqual(combined.pattern, '(?:unused)|(?:non-static)')
+        combined = shell._combinePatterns(
+            [re.compile('.*'), re.compile('.*'), re.compile(r'a\.*')])
+        self.assertEqual(combined.pattern, r'(?:)|(?:a\.*)')
+        # patterns with groups, or different flags, are not combined
+        self.assertEqual(shell._combinePatterns(
+            [re.compile('(a)\\1'), re.compile('b')]), None)
+        self.assertEqual(shell._combinePatterns(
+            [re.compile('a', re.I), re.compile('b')]), None)
+        self.assertEqual(shell._combinePatterns(
+            [re.compile('a'), None]), None)
+
+    def test_suppressions_appended(self):
+        step = shell.WarningCountingShellCommand(command=['make'])
+        step.addSuppression([(None, 'unused', None, None)])
+        self.assertTrue(step._isSuppressed(None, None, 'unused variable'))
+        self.assertFalse(step._isSuppressed(None, None, 'rc does not exist'))
+        step.suppressions.append(
+            (None, re.compile(r"rc does not exist"), None, None))
+        self.assertTrue(step._isSuppressed(None, None, 'rc does not exist'))
+
+    def test_warningLogConsumer_overridden(self):
+        class MyWCSC(shell.WarningCountingShellCommand):
+
+            def warningLogConsumer(self):
+                while True:
+                    yield
+
+        step = MyWCSC(command=['make'])
+        observer = step._pendingLogObservers[-1][1]
+        self.assertIsInstance(observer, logobserver.LineConsumerLogObserver)
+
+
 class Compile(steps.BuildStepMixin, unittest.TestCase):
 
     def setUp(self):
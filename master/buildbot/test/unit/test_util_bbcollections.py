@@ -12,6 +12,9 @@
 # Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 # Copyright Buildbot Team Members
+import copy
+import cPickle
+
 from twisted.trial import unittest
 
 from buildbot.util import bbcollections
@@ -68,3 +71,61 @@ class KeyedSets(unittest.TestCase):
 
     def test_pop_missing(self):
         self.assertEqual(self.ks.pop('flavors'), set())
+
+
+class Freeze(unittest.TestCase):
+
+    def test_freeze_nested(self):
+        obj = dict(a=[1, dict(b=2)], c=(3, [4]), d='x')
+        frozen = bbcollections.freeze(obj)
+        self.assertEqual(frozen, obj)
+        self.assertIsInstance(frozen, bbcollections.ReadOnlyDict)
+        self.assertIsInstance(frozen['a'], bbcollections.ReadOnlyList)
+        self.assertIsInstance(frozen['a'][1], bbcollections.ReadOnlyDict)
+        self.assertIsInstance(frozen['c'][1], bbcollections.ReadOnlyList)
+        # the original is not modified, nor shared
+        self.assertNotIdentical(frozen['a'], obj['a'])
+        self.assertEqual(type(obj['a']), list)
+
+    def test_freeze_frozen(self):
+        frozen = bbcollections.freeze(dict(a=[1]))
+        self.assertIdentical(bbcollections.freeze(frozen), frozen)
+        outer = bbcollections.freeze(dict(inner=frozen))
+        self.assertIdentical(outer['inner'], frozen)
+
+    def test_readonly_dict(self):
+        d = bbcollections.freeze(dict(a=1))
+        for meth, args in [('__setitem__', ('a', 2)), ('__delitem__', ('a',)),
+                           ('clear', ()), ('pop', ('a',)), ('popitem', ()),
+                           ('setdefault', ('b', 2)), ('update', ({},))]:
+            self.assertRaises(TypeError, getattr(d, meth), *args)
+        self.assertEqual(d, dict(a=1))
+
+    def test_readonly_dict_copy(self):
+        d = bbcollections.freeze(dict(a=1))
+        c = d.copy()
+        c['b'] = 2
+        self.assertEqual(type(c), dict)
+        self.assertEqual(d, dict(a=1))
+
+    def test_readonly_list(self):
+        l = bbcollections.freeze([3, 1, 2])
+        for meth, args in [('__setitem__', (0, 1)), ('__delitem__', (0,)),
+                           ('append', (1,)), ('extend', ([1],)),
+                           ('insert', (0, 1)), ('pop', ()), ('remove', (1,)),
+                           ('reverse', ()), ('sort', ())]:
+            self.assertRaises(TypeError, getattr(l, meth), *args)
+
+        def iadd():
+            m = l
+            m += [4]
+        self.assertRaises(TypeError, iadd)
+        self.assertEqual(l, [3, 1, 2])
+        self.assertEqual(l + [4], [3, 1, 2, 4])
+
+    def test_pickle_and_copy(self):
+        frozen = bbcollections.freeze(dict(a=[1, dict(b=2)]))
+        for other in [cPickle.loads(cPickle.dumps(frozen, 2)),
+                      copy.copy(frozen), copy.deepcopy(frozen)]:
+            self.assertEqual(other, frozen)
+            self.assertIsInstance(other, bbcollections.ReadOnlyDict)
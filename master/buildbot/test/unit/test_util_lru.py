@@ -63,6 +63,19 @@ class LRUCacheTest(unittest.TestCase):
         val = self.lru.get('a')
         self.check_result(val, short('a'), 1, 1)
 
+    def test_contains(self):
+        self.assertFalse('a' in self.lru)
+        val = self.lru.get('a')
+        self.assertTrue('a' in self.lru)
+        self.lru.get('b')
+        self.lru.get('c')
+        self.lru.get('d')
+        # 'a' is out of the cache, but still referenced
+        self.assertTrue('a' in self.lru)
+        del(val)
+        gc.collect()
+        self.assertFalse('a' in self.lru)
+
     def test_simple_lru_expulsion(self):
         val = self.lru.get('a')
         self.check_result(val, short('a'), 0, 1)
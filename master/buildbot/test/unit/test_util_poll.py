@@ -67,6 +67,35 @@ class TestPollerSync(unittest.TestCase):
         self.assertEqual(self.calls, 0)
         return self.poll.stop()
 
+    def test_start_delay(self):
+        """If a delay is given, the first poll runs after it"""
+        self.poll.start(interval=10, delay=3)
+        self.clock.advance(2)
+        self.assertEqual(self.calls, 0)
+        self.clock.advance(1)
+        self.assertEqual(self.calls, 1)
+        self.clock.advance(10)
+        self.assertEqual(self.calls, 2)
+        return self.poll.stop()
+
+    def test_call_before_delay(self):
+        """Calling the poll method before the delay forces a run."""
+        self.poll.start(interval=10, delay=3)
+        self.poll()
+        self.clock.advance(0)
+        self.assertEqual(self.calls, 1)
+        self.clock.advance(10)
+        self.assertEqual(self.calls, 2)
+        return self.poll.stop()
+
+    def test_stop_before_delay(self):
+        """Stopping the poll method before the delay cancels the first run"""
+        self.poll.start(interval=10, delay=3)
+        d = self.poll.stop()
+        self.assertTrue(d.called)
+        self.clock.advance(10)
+        self.assertEqual(self.calls, 0)
+
     def test_stop_twice(self):
         """Calling stop on a stopped poller does nothing"""
         self.poll.start(interval=1)
@@ -265,6 +294,25 @@ class TestPollerAsync(unittest.TestCase):
         self.assertEqual(self.clock.seconds(), 26)
         self.assertTrue(self.running)
 
+    def test_setInterval_while_running(self):
+        """If the interval is changed while the method is running, the next
+        runs are at multiples of the new interval from then on"""
+        self.poll.start(interval=10, now=True)
+        self.clock.advance(0.5)
+        self.poll.setInterval(3)
+        exp = [
+            (1, False, 1),
+            (3.5, True, 1),
+            (4.5, False, 2),
+            (6.5, True, 2),
+            (10, False, 3),
+        ]
+        for secs, running, calls in exp:
+            self.clock.advance(secs - self.clock.seconds())
+            self.assertEqual(self.running, running)
+            self.assertEqual(self.calls, calls)
+        return self.poll.stop()
+
     def test_long_method(self):
         """If the method takes more than INTERVAL seconds to execute, then it
         is re-invoked at the next multiple of INTERVAL seconds"""
@@ -19,6 +19,7 @@ from twisted.trial import unittest
 import buildbot.www.change_hook as change_hook
 from buildbot import util
 from buildbot.changes import base
+from buildbot.changes.coordinator import PollCoordinator
 from buildbot.changes.manager import ChangeManager
 from buildbot.test.fake.web import FakeRequest
 
@@ -41,6 +42,10 @@ class TestPollingChangeHook(unittest.TestCase):
 
         self.changeHook = change_hook.ChangeHookResource(
             dialects={'poller': options}, master=master)
+        # child services find the master as their parent's master
+        master.master = master
+        master.poll_coordinator = PollCoordinator()
+        master.poll_coordinator.setServiceParent(master)
         master.change_svc = ChangeManager()
         master.change_svc.setServiceParent(master)
         self.changesrc = self.Subclass("example", 21)
@@ -470,6 +470,63 @@ class V2RootResource_REST(www.WwwTestMixin, unittest.TestCase):
         self.assertRestDetails(typeName='tests',
                                item=endpoint.testData[13])
 
+    @defer.inlineCallbacks
+    def test_api_details_immutable_cached(self):
+        self.patch(endpoint.TestEndpoint, 'isImmutable',
+                   lambda self, data, kwargs: True)
+        get = endpoint.TestEndpoint.get.im_func
+        calls = []
+
+        def countingGet(self, resultSpec, kwargs):
+            calls.append(kwargs)
+            return get(self, resultSpec, kwargs)
+        self.patch(endpoint.TestEndpoint, 'get', countingGet)
+
+        first = yield self.render_resource(self.rsrc, '/test/13')
+        etag = self.request.headers['ETag'][0]
+        second = yield self.render_resource(self.rsrc, '/test/13')
+        self.assertEqual(first, second)
+        self.assertEqual(self.request.headers['ETag'], [etag])
+        self.assertEqual(len(calls), 1)
+
+        # the response is dropped on events about the test
+        self.rsrc.responseCache.invalidate(('test', '13', 'update'))
+        yield self.render_resource(self.rsrc, '/test/13')
+        self.assertEqual(len(calls), 2)
+
+    @defer.inlineCallbacks
+    def test_api_details_if_none_match(self):
+        self.patch(endpoint.TestEndpoint, 'isImmutable',
+                   lambda self, data, kwargs: True)
+        yield self.render_resource(self.rsrc, '/test/13')
+        etag = self.request.headers['ETag'][0]
+        content = yield self.render_resource(
+            self.rsrc, '/test/13', extraHeaders={'if-none-match': etag})
+        self.assertEqual(content, '')
+        self.assertEqual(self.request.responseCode, 304)
+
+    @defer.inlineCallbacks
+    def test_api_details_mutable_not_cached(self):
+        yield self.render_resource(self.rsrc, '/test/13')
+        self.assertNotIn('ETag', self.request.headers)
+        self.assertEqual(len(self.rsrc.responseCache.entries), 0)
+
+    def test_response_cache_disabled(self):
+        self.master.config.www['rest_cache_size'] = 0
+        self.rsrc.reconfigResource(self.master.config)
+        self.assertEqual(self.rsrc.responseCache, None)
+        self.assertEqual(self.master.mq.qrefs, [])
+
+    def test_response_cache_invalidated_from_mq(self):
+        self.master.mq.verifyMessages = False
+        cache = self.rsrc.responseCache
+        cache.put('k', rest.CachedResponse([], 'body', True),
+                  set([('builds', '13')]))
+        self.master.mq.callConsumer(('builds', '14', 'finished'), {})
+        self.assertEqual(list(cache.entries), ['k'])
+        self.master.mq.callConsumer(('builds', '13', 'finished'), {})
+        self.assertEqual(list(cache.entries), [])
+
     @defer.inlineCallbacks
     def test_api_details_none(self):
         yield self.render_resource(self.rsrc, '/test/0')
@@ -503,6 +560,97 @@ class V2RootResource_REST(www.WwwTestMixin, unittest.TestCase):
                                item=endpoint.testData[13],
                                contentType='application/json; charset=utf-8')
 
+    @defer.inlineCallbacks
+    def test_api_collection_streamed(self):
+        # compact collections are written a few items at a time
+        self.patch(rest.JsonCollectionProducer, 'CHUNK_SIZE', 1)
+        request = self.make_request('/test')
+        request.input_headers['accept'] = 'application/json'
+        writes = []
+
+        def write(data):
+            writes.append(data)
+            request.written += data
+        request.write = write
+        yield self.render_resource(self.rsrc, request=request)
+        self.assertRestCollection(typeName='tests',
+                                  items=list(itervalues(endpoint.testData)),
+                                  total=8,
+                                  contentType='application/json; charset=utf-8')
+        self.assertEqual(len(writes), 8)
+        self.assertEqual(request.producer, None)
+
+    @defer.inlineCallbacks
+    def test_api_collection_streamed_encoding_fails(self):
+        # nothing was written yet: the error is rendered
+        self.patch(endpoint.TestsEndpoint, 'get', lambda self, rspec, kw:
+                   defer.succeed([{('not', 'str'): 1}]))
+        yield self.render_resource(self.rsrc, '/test',
+                                   accept='application/json')
+        self.assertEqual(self.request.responseCode, 500)
+        self.assertIn('error', json.loads(self.request.written))
+        self.assertEqual(self.request.producer, None)
+        self.assertFalse(self.request.connectionLost)
+        self.assertEqual(len(self.flushLoggedErrors(TypeError)), 1)
+
+    @defer.inlineCallbacks
+    def test_api_collection_streamed_encoding_fails_midway(self):
+        # part of the collection was sent: the connection is aborted
+        self.patch(rest.JsonCollectionProducer, 'CHUNK_SIZE', 1)
+        self.patch(endpoint.TestsEndpoint, 'get', lambda self, rspec, kw:
+                   defer.succeed([endpoint.testData[13], {('not', 'str'): 1}]))
+        request = self.make_request('/test')
+        request.input_headers['accept'] = 'application/json'
+        yield self.render_resource(self.rsrc, request=request)
+        self.assertEqual(request.written, '{"tests":[' + json.dumps(
+            endpoint.testData[13], separators=(',', ':')))
+        self.assertEqual(request.responseCode, 200)
+        self.assertTrue(request.connectionLost)
+        self.assertEqual(request.producer, None)
+        self.assertTrue(request.finished)
+        self.assertEqual(len(self.flushLoggedErrors(TypeError)), 1)
+
+    @defer.inlineCallbacks
+    def test_api_details_field_streamed(self):
+        # a big string field is written a slice at a time
+        self.patch(rest.JsonProducer, 'CHUNK_SIZE', 2)
+        self.patch(endpoint.TestEndpoint, 'streamingField', 'info')
+        request = self.make_request('/test/14')
+        request.input_headers['accept'] = 'application/json'
+        writes = []
+
+        def write(data):
+            writes.append(data)
+            request.written += data
+        request.write = write
+        yield self.render_resource(self.rsrc, request=request)
+        self.assertEqual(request.written, json.dumps(
+            dict(tests=[endpoint.testData[14]], meta={}),
+            sort_keys=True, separators=(',', ':')))
+        self.assertEqual(writes, ['{"meta":{},"tests":[{"id":14,"info":"fa',
+                                  'il', 'ed","success":false,"tags":[]}]}'])
+        self.assertEqual(request.producer, None)
+
+    @defer.inlineCallbacks
+    def test_api_details_small_field_not_streamed(self):
+        self.patch(endpoint.TestEndpoint, 'streamingField', 'info')
+        yield self.render_resource(self.rsrc, '/test/14',
+                                   accept='application/json')
+        self.assertEqual(self.request.producer, None)
+        self.assertRestDetails(typeName='tests',
+                               item=endpoint.testData[14],
+                               contentType='application/json; charset=utf-8')
+
+    @defer.inlineCallbacks
+    def test_api_collection_head_not_streamed(self):
+        get = yield self.render_resource(self.rsrc, '/test',
+                                         accept='application/json')
+        head = yield self.render_resource(self.rsrc, '/test', method='HEAD',
+                                          accept='application/json')
+        self.assertEqual(head, '')
+        self.assertEqual(int(self.request.headers['content-length'][0]),
+                         len(get))
+
     @defer.inlineCallbacks
     def test_api_fails(self):
         yield self.render_resource(self.rsrc, '/test/fail')
@@ -796,3 +944,49 @@ class ContentTypeParser(unittest.TestCase):
     def test_text(self):
         self.assertEqual(
             rest.ContentTypeParser("text/plain; Charset=UTF-8").gettype(), "text/plain")
+
+
+class ResponseCache(unittest.TestCase):
+
+    def put(self, cache, key, body, tags=()):
+        cache.put(key, rest.CachedResponse([], body, True), set(tags))
+
+    def test_lru(self):
+        cache = rest.ResponseCache(10)
+        self.put(cache, 'a', 'aaaa')
+        self.put(cache, 'b', 'bbbb')
+        cache.get('a')
+        self.put(cache, 'c', 'cccc')
+        self.assertEqual(list(cache.entries), ['a', 'c'])
+        self.assertEqual(cache.size, 8)
+        self.assertEqual(cache.get('b'), None)
+
+    def test_too_big(self):
+        cache = rest.ResponseCache(10)
+        self.put(cache, 'a', 'a' * 11)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.size, 0)
+
+    def test_setMaxSize(self):
+        cache = rest.ResponseCache(10)
+        self.put(cache, 'a', 'aaaa')
+        self.put(cache, 'b', 'bbbb')
+        cache.setMaxSize(5)
+        self.assertEqual(list(cache.entries), ['b'])
+
+    def test_invalidate(self):
+        cache = rest.ResponseCache(100)
+        self.put(cache, 'a', 'aaaa', [('builds', '1'), ('builders', '2')])
+        self.put(cache, 'b', 'bbbb', [('builds', '3')])
+        cache.invalidate(('builders', '2', 'builds', '7', 'finished'))
+        self.assertEqual(list(cache.entries), ['b'])
+        self.assertEqual(cache.tagged, {('builds', '3'): set(['b'])})
+
+    def test_etag_matches(self):
+        response = rest.CachedResponse([], 'body', True)
+        self.assertTrue(response.matches(response.etag))
+        self.assertTrue(response.matches('"x", ' + response.etag))
+        self.assertTrue(response.matches('*'))
+        self.assertFalse(response.matches('"x"'))
+        self.assertFalse(response.matches(None))
+        self.assertEqual(rest.CachedResponse([], 'body').etag, None)
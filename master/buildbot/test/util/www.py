@@ -40,6 +40,8 @@ class FakeRequest(object):
     redirected_to = None
     rendered_resource = None
     failure = None
+    producer = None
+    connectionLost = False
     method = 'GET'
     path = '/req.path'
     responseCode = 200
@@ -63,6 +65,20 @@ class FakeRequest(object):
     def write(self, data):
         self.written = self.written + data
 
+    def registerProducer(self, producer, streaming):
+        # like twisted.web.test.requesthelper.DummyRequest, pull everything
+        # right away
+        self.producer = producer
+        if not streaming:
+            while self.producer is producer:
+                producer.resumeProducing()
+
+    def unregisterProducer(self):
+        self.producer = None
+
+    def loseConnection(self):
+        self.connectionLost = True
+
     def redirect(self, url):
         self.redirected_to = url
 
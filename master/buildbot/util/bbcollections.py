@@ -45,3 +45,69 @@ class KeyedSets:
         if key in self.d:
             return self.d.pop(key)
         return set()
+
+
+def _readOnly(self, *args, **kwargs):
+    raise TypeError("%s is read-only; modify a copy instead"
+                    % (type(self).__name__,))
+
+
+class ReadOnlyDict(dict):
+
+    """
+    A dict that cannot be modified in place.  Use C{copy()} to get a mutable
+    (shallow) copy.
+    """
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = _readOnly
+    clear = pop = popitem = setdefault = update = _readOnly
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+
+class ReadOnlyList(list):
+
+    """
+    A list that cannot be modified in place.  Use C{list(l)} to get a mutable
+    (shallow) copy.
+    """
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = _readOnly
+    __iadd__ = __imul__ = _readOnly
+    append = extend = insert = pop = remove = reverse = sort = _readOnly
+
+    def __reduce__(self):
+        return (type(self), (list(self),))
+
+
+def freeze(obj):
+    """
+    Return a read-only version of C{obj}, converting the dicts and lists it
+    contains, recursively, into L{ReadOnlyDict} and L{ReadOnlyList}.  Objects
+    that are already read-only are returned as-is, so frozen values can be
+    shared between several frozen structures without being copied again.
+    """
+    typ = type(obj)
+    if typ is ReadOnlyDict or typ is ReadOnlyList:
+        return obj
+    if isinstance(obj, dict):
+        # copy at C speed, then only revisit the values that need freezing
+        frozen = ReadOnlyDict(obj)
+        for k, v in obj.iteritems():
+            if isinstance(v, _containers) and type(v) not in _frozen:
+                dict.__setitem__(frozen, k, freeze(v))
+        return frozen
+    if isinstance(obj, list):
+        return ReadOnlyList([freeze(v) for v in obj])
+    if typ is tuple:
+        return tuple([freeze(v) for v in obj])
+    return obj
+
+
+_containers = (dict, list, tuple)
+_frozen = (ReadOnlyDict, ReadOnlyList)
@@ -72,6 +72,10 @@ class LRUCache(object):
     def keys(self):
         return list(self.cache)
 
+    def __contains__(self, key):
+        # true if get(key) would not call the miss function
+        return key in self.cache or key in self.weakrefs
+
     def set_max_size(self, max_size):
         if self.max_size == max_size:
             return
@@ -23,7 +23,7 @@ _poller_instances = None
 class Poller(object):
 
     __slots__ = ['fn', 'instance', 'loop', 'started', 'running',
-                 'pending', 'stopDeferreds', '_reactor']
+                 'pending', 'stopDeferreds', 'startCall', '_reactor']
 
     def __init__(self, fn, instance):
         self.fn = fn
@@ -33,6 +33,7 @@ class Poller(object):
         self.running = False
         self.pending = False
         self.stopDeferreds = []
+        self.startCall = None
         self._reactor = reactor
 
     def _run(self):
@@ -54,6 +55,9 @@ class Poller(object):
         if self.started:
             if self.running:
                 self.pending = True
+            elif self.startCall is not None:
+                # the loop has not started yet; start it right away
+                self.startCall.reset(0)
             else:
                 # terrible hack..
                 old_interval = self.loop.interval
@@ -61,11 +65,25 @@ class Poller(object):
                 self.loop.reset()
                 self.loop.interval = old_interval
 
-    def start(self, interval, now=False):
+    def start(self, interval, now=False, delay=None):
+        """
+        Call the function every C{interval} seconds, starting after C{delay}
+        seconds if it is given, and else right away if C{now} is true, or
+        after C{interval} seconds.
+        """
         assert not self.started
         if not self.loop:
             self.loop = task.LoopingCall(self._run)
             self.loop.clock = self._reactor
+        if delay is not None:
+            self.startCall = self._reactor.callLater(
+                delay, self._startLoop, interval, True)
+        else:
+            self._startLoop(interval, now)
+        self.started = True
+
+    def _startLoop(self, interval, now):
+        self.startCall = None
         stopDeferred = self.loop.start(interval, now=now)
 
         @stopDeferred.addCallback
@@ -73,9 +91,21 @@ class Poller(object):
             self.started = False
             while self.stopDeferreds:
                 self.stopDeferreds.pop().callback(None)
-        self.started = True
+
+    def setInterval(self, interval):
+        """
+        Call the function every C{interval} seconds, counting from now, after
+        the call that is already scheduled, if any.
+        """
+        if self.loop and self.loop.running:
+            self.loop.interval = interval
+            self.loop.starttime = self._reactor.seconds()
 
     def stop(self):
+        if self.startCall is not None:
+            self.startCall.cancel()
+            self.startCall = None
+            self.started = False
         if self.loop and self.loop.running:
             self.loop.stop()
         if self.started:
@@ -14,15 +14,22 @@
 # Copyright Buildbot Team Members
 import datetime
 import fnmatch
+import hashlib
 import mimetools
 import re
+import uuid
+from collections import OrderedDict
 from contextlib import contextmanager
 
 from future.moves.urllib.parse import urlparse
 from future.utils import iteritems
+from future.utils import itervalues
 from twisted.internet import defer
+from twisted.internet import interfaces
+from twisted.python import failure
 from twisted.python import log
 from twisted.web.error import Error
+from zope.interface import implementer
 
 from buildbot.data import exceptions
 from buildbot.data import resultspec
@@ -55,6 +62,146 @@ URL_ENCODED = "application/x-www-form-urlencoded"
 JSON_ENCODED = "application/json"
 
 
+@implementer(interfaces.IPullProducer)
+class JsonProducer(object):
+
+    """
+    Write a JSON document to a request a piece at a time, as the transport
+    asks for more data, rather than building the whole response in memory.
+    Subclasses implement C{produce}.
+    """
+
+    # amount of JSON written each time the transport asks for more
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, request):
+        self.request = request
+        self.done = False
+        self.written = False
+        self.deferred = None
+
+    def _encode(self, data):
+        return json.dumps(data, default=toJson, separators=(',', ':'))
+
+    def start(self):
+        """Register with the request; the returned Deferred fires once the
+        whole document is written, or the client went away, and fails if
+        the document could not be encoded before anything was written.
+        Past that, the connection is aborted."""
+        # the request may pull the whole document right away
+        d = self.deferred = defer.Deferred()
+        self.request.registerProducer(self, False)
+        return d
+
+    def produce(self):
+        """Return the next piece of the document, of about CHUNK_SIZE, and
+        whether it is the last one."""
+        raise NotImplementedError
+
+    def resumeProducing(self):
+        if self.done:
+            return
+        try:
+            data, done = self.produce()
+        except Exception:
+            self.request.unregisterProducer()
+            if not self.written:
+                # the caller of start logs the error and renders it
+                self._finished(failure.Failure())
+                return
+            # a status and part of the document were sent already; an error
+            # body would only corrupt it
+            log.err(None, 'while streaming a REST response')
+            self.request.loseConnection()
+            self._finished(None)
+            return
+        self.written = True
+        self.request.write(data)
+        if done:
+            self.request.unregisterProducer()
+            self._finished(None)
+
+    def stopProducing(self):
+        # the client went away
+        self._finished(None)
+
+    def _finished(self, result):
+        self.done = True
+        if self.deferred is not None:
+            d, self.deferred = self.deferred, None
+            if isinstance(result, failure.Failure):
+                d.errback(result)
+            else:
+                d.callback(result)
+
+
+class JsonCollectionProducer(JsonProducer):
+
+    """
+    Write a REST collection to a request as compact JSON, encoding its items
+    a few at a time.
+    """
+
+    def __init__(self, request, typeName, items, meta):
+        JsonProducer.__init__(self, request)
+        self.items = items
+        self.next_item = 0
+        self.head = '{%s:[' % (json.dumps(typeName),)
+        self.tail = '],"meta":%s}' % (self._encode(meta),)
+
+    def produce(self):
+        chunks = []
+        size = 0
+        if self.head is not None:
+            chunks.append(self.head)
+            self.head = None
+        items = self.items
+        while size < self.CHUNK_SIZE and self.next_item < len(items):
+            encoded = self._encode(items[self.next_item])
+            if self.next_item:
+                chunks.append(',')
+            chunks.append(encoded)
+            size += len(encoded)
+            # let go of the items as soon as they are written
+            items[self.next_item] = None
+            self.next_item += 1
+        done = self.next_item >= len(items)
+        if done:
+            chunks.append(self.tail)
+        return ''.join(chunks), done
+
+
+class JsonStringProducer(JsonProducer):
+
+    """
+    Write a JSON document holding one big string, such as the content of a
+    log chunk, encoding the string a slice at a time.  C{head} and C{tail}
+    are the JSON before and after the encoded string.
+    """
+
+    def __init__(self, request, head, value, tail):
+        JsonProducer.__init__(self, request)
+        self.head = head
+        self.value = value
+        self.offset = 0
+        self.tail = tail
+
+    def produce(self):
+        chunks = []
+        if self.head is not None:
+            chunks.append(self.head)
+            self.head = None
+        end = self.offset + self.CHUNK_SIZE
+        # strip the quotes; each slice is escaped independently, which
+        # gives the same JSON as escaping the string at once
+        chunks.append(self._encode(self.value[self.offset:end])[1:-1])
+        self.offset = end
+        done = self.offset >= len(self.value)
+        if done:
+            chunks.append(self.tail)
+        return ''.join(chunks), done
+
+
 class RestRootResource(resource.Resource):
     version_classes = {}
 
@@ -92,6 +239,101 @@ JSONRPC_CODES = dict(parse_error=-32700,
                      internal_error=-32603)
 
 
+class CachedResponse(object):
+
+    """
+    The headers and body of a REST response.  Immutable responses get an
+    ETag, computed from their body.
+    """
+
+    __slots__ = ['headers', 'body', 'etag']
+
+    def __init__(self, headers, body, immutable=False):
+        self.headers = headers
+        self.body = body
+        self.etag = None
+        if immutable:
+            self.etag = '"%s"' % (hashlib.sha1(body).hexdigest(),)
+
+    def matches(self, ifNoneMatch):
+        # check an If-None-Match header against our ETag
+        if not ifNoneMatch or self.etag is None:
+            return False
+        etags = [e.strip() for e in ifNoneMatch.split(',')]
+        return '*' in etags or self.etag in etags or \
+            'W/' + self.etag in etags
+
+
+class ResponseCache(object):
+
+    """
+    A least-recently-used cache of immutable REST responses, bounded by the
+    total size of their bodies.
+
+    Each response is tagged with the (collection, id) pairs it was computed
+    from, such as C{('builds', '13')}; a data API event whose routing key
+    mentions one of them drops the response.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        # key -> (CachedResponse, tags), least recently used first
+        self.entries = OrderedDict()
+        # tag -> set of keys
+        self.tagged = {}
+
+    @staticmethod
+    def routingKeyTags(path):
+        # ('builders', '7', 'builds', '3', 'finished') ->
+        #   [('builders', '7'), ('builds', '3')]
+        return [(path[i], path[i + 1]) for i in range(0, len(path) - 1, 2)]
+
+    def get(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return None
+        self.entries[key] = entry
+        return entry[0]
+
+    def put(self, key, response, tags):
+        self.remove(key)
+        size = len(response.body)
+        if size > self.max_size:
+            return
+        self.entries[key] = (response, tags)
+        self.size += size
+        for tag in tags:
+            self.tagged.setdefault(tag, set()).add(key)
+        self._evict()
+
+    def setMaxSize(self, max_size):
+        self.max_size = max_size
+        self._evict()
+
+    def _evict(self):
+        while self.size > self.max_size:
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        response, tags = entry
+        self.size -= len(response.body)
+        for tag in tags:
+            keys = self.tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tagged[tag]
+
+    def invalidate(self, routingKey):
+        for tag in self.routingKeyTags(routingKey):
+            for key in list(self.tagged.get(tag, ())):
+                self.remove(key)
+
+
 class V2RootResource(resource.Resource):
 
     # For GETs, this API follows http://jsonapi.org.  The getter API does not
@@ -112,6 +354,12 @@ class V2RootResource(resource.Resource):
     # enable reconfigResource calls
     needsReconfig = True
 
+    # total size of the immutable responses kept in memory, by default
+    DEFAULT_CACHE_SIZE = 10 * 1024 * 1024
+
+    responseCache = None
+    cacheConsumers = None
+
     def getEndpoint(self, request):
         # note that trailing slashes are not allowed
         return self.master.data.getEndpoint(tuple(request.postpath))
@@ -316,12 +564,38 @@ class V2RootResource(resource.Resource):
         return rspec
 
     def encodeRaw(self, data, request):
-        request.setHeader("content-type",
-                          data['mime-type'].encode() + '; charset=utf-8')
-        request.setHeader("content-disposition",
-                          'attachment; filename=' + data['filename'].encode())
-        request.write(data['raw'].encode('utf-8'))
-        return
+        headers = [("content-type",
+                    data['mime-type'].encode() + '; charset=utf-8'),
+                   ("content-disposition",
+                    'attachment; filename=' + data['filename'].encode())]
+        return headers, data['raw'].encode('utf-8')
+
+    def _cacheKey(self, request, compact):
+        if self.responseCache is None:
+            return None
+        return (tuple(request.postpath),
+                tuple(sorted((k, tuple(v)) for k, v in iteritems(request.args))),
+                compact)
+
+    def _cacheTags(self, request, data):
+        # the (collection, id) pairs of the request path, and those of the
+        # ids found in the data; events about any of them invalidate the
+        # response
+        tags = set(ResponseCache.routingKeyTags(request.postpath))
+        for k, v in iteritems(data):
+            if k.endswith('id') and isinstance(v, int):
+                rtype = getattr(self.master.data.rtypes, k[:-2], None)
+                if rtype is not None:
+                    tags.add((rtype.plural, str(v)))
+        return tags
+
+    def setCacheHeaders(self, request):
+        if self.cache_seconds:
+            now = datetime.datetime.utcnow()
+            expires = now + datetime.timedelta(seconds=self.cache_seconds)
+            request.setHeader("Expires",
+                              expires.strftime("%a, %d %b %Y %H:%M:%S GMT"))
+            request.setHeader("Pragma", "no-cache")
 
     @defer.inlineCallbacks
     def renderRest(self, request):
@@ -336,75 +610,135 @@ class V2RootResource(resource.Resource):
             ep, kwargs = self.getEndpoint(request)
 
             rspec = self.decodeResultSpec(request, ep)
-            data = yield ep.get(rspec, kwargs)
-            if data is None:
-                writeError(("not found while getting from %s with "
-                            "arguments %s and %s") % (repr(ep), repr(rspec),
-                                                      str(kwargs)), errcode=404)
-                return
-
-            if ep.isRaw:
-                self.encodeRaw(data, request)
-                return
-
-            # post-process any remaining parts of the resultspec
-            data = rspec.apply(data)
-
-            # annotate the result with some metadata
-            meta = {}
-            if ep.isCollection:
-                offset, total = data.offset, data.total
-                if offset is None:
-                    offset = 0
-
-                # add total, if known
-                if total is not None:
-                    meta['total'] = total
-
-                # get the real list instance out of the ListResult
-                data = data.data
-            else:
-                data = [data]
-
-            typeName = ep.rtype.plural
-            data = {
-                typeName: data,
-                'meta': meta
-            }
 
             # set up the content type and formatting options; if the request
             # accepts text/html or text/plain, the JSON will be rendered in a
             # readable, multiline format.
-
-            if 'application/json' in (request.getHeader('accept') or ''):
-                compact = True
-                request.setHeader("content-type",
-                                  'application/json; charset=utf-8')
-            else:
-                compact = False
-                request.setHeader("content-type",
-                                  'text/plain; charset=utf-8')
-
-            # set up caching
-            if self.cache_seconds:
-                now = datetime.datetime.utcnow()
-                expires = now + datetime.timedelta(seconds=self.cache_seconds)
-                request.setHeader("Expires",
-                                  expires.strftime("%a, %d %b %Y %H:%M:%S GMT"))
-                request.setHeader("Pragma", "no-cache")
-
-            # filter out blanks if necessary and render the data
-            if compact:
-                data = json.dumps(data, default=toJson,
-                                  sort_keys=True, separators=(',', ':'))
-            else:
-                data = json.dumps(data, default=toJson,
-                                  sort_keys=True, indent=2)
+            compact = 'application/json' in (request.getHeader('accept') or '')
+
+            # immutable responses are served from the cache, when possible
+            cacheKey = self._cacheKey(request, compact)
+            response = None
+            if cacheKey is not None:
+                response = self.responseCache.get(cacheKey)
+
+            if response is None:
+                data = yield ep.get(rspec, kwargs)
+                if data is None:
+                    writeError(("not found while getting from %s with "
+                                "arguments %s and %s") % (repr(ep), repr(rspec),
+                                                          str(kwargs)), errcode=404)
+                    return
+                immutable = False
+                if cacheKey is not None:
+                    immutable = yield ep.isImmutable(data, kwargs)
+                response = yield self.encodeResponse(request, ep, rspec, data,
+                                                     compact, immutable)
+                if response is None:
+                    # it was streamed
+                    return
+                if immutable:
+                    self.responseCache.put(cacheKey, response,
+                                           self._cacheTags(request, data))
+
+            for name, value in response.headers:
+                request.setHeader(name, value)
+            self.setCacheHeaders(request)
+
+            if response.etag is not None:
+                request.setHeader("ETag", response.etag)
+                if response.matches(request.getHeader('if-none-match')):
+                    request.setResponseCode(304)
+                    return
 
             if request.method == "HEAD":
-                request.setHeader("content-length", len(data))
+                request.setHeader("content-length", len(response.body))
             else:
-                request.write(data)
+                request.write(response.body)
+
+    @defer.inlineCallbacks
+    def encodeResponse(self, request, ep, rspec, data, compact, immutable):
+        # Return the response for DATA, as a CachedResponse, or write it to
+        # the request and return None, if it is better streamed
+        if ep.isRaw:
+            headers, body = self.encodeRaw(data, request)
+            defer.returnValue(CachedResponse(headers, body, immutable))
+
+        if compact:
+            headers = [("content-type", 'application/json; charset=utf-8')]
+        else:
+            headers = [("content-type", 'text/plain; charset=utf-8')]
+
+        # post-process any remaining parts of the resultspec
+        data = rspec.apply(data)
+
+        # annotate the result with some metadata
+        meta = {}
+        if ep.isCollection:
+            offset, total = data.offset, data.total
+            if offset is None:
+                offset = 0
+
+            # add total, if known
+            if total is not None:
+                meta['total'] = total
+
+            # get the real list instance out of the ListResult
+            data = data.data
+        else:
+            data = [data]
+
+        typeName = ep.rtype.plural
+
+        # compact collections are streamed, without sorting their keys,
+        # so that large ones don't need to be encoded all at once
+        if (compact and ep.isCollection and not immutable and
+                request.method != "HEAD"):
+            for name, value in headers:
+                request.setHeader(name, value)
+            self.setCacheHeaders(request)
+            yield JsonCollectionProducer(request, typeName, data,
+                                         meta).start()
+            defer.returnValue(None)
+
+        data = {
+            typeName: data,
+            'meta': meta
+        }
+
+        # a big string field of a single item, such as the content of a log
+        # chunk, is streamed too, unless the response can be cached
+        if (compact and ep.streamingField and request.method != "HEAD" and
+                not ep.isCollection):
+            item = data[typeName][0]
+            value = item.get(ep.streamingField)
+            if (isinstance(value, basestring) and
+                    len(value) > JsonStringProducer.CHUNK_SIZE and
+                    (not immutable or self.responseCache is None or
+                     len(value) > self.responseCache.max_size)):
+                for name, header in headers:
+                    request.setHeader(name, header)
+                self.setCacheHeaders(request)
+                # encode the document around a marker standing for the value
+                marker = uuid.uuid4().hex
+                item = dict(item)
+                item[ep.streamingField] = marker
+                data[typeName] = [item]
+                head, tail = json.dumps(
+                    data, default=toJson, sort_keys=True,
+                    separators=(',', ':')).split('"%s"' % (marker,), 1)
+                yield JsonStringProducer(request, head + '"', value,
+                                         '"' + tail).start()
+                defer.returnValue(None)
+
+        # filter out blanks if necessary and render the data
+        if compact:
+            data = json.dumps(data, default=toJson,
+                              sort_keys=True, separators=(',', ':'))
+        else:
+            data = json.dumps(data, default=toJson,
+                              sort_keys=True, indent=2)
+        defer.returnValue(CachedResponse(headers, data, immutable))
 
     def reconfigResource(self, new_config):
         # buildbotURL may contain reverse proxy path, Origin header is just
@@ -420,6 +754,46 @@ class V2RootResource(resource.Resource):
         self.debug = new_config.www.get('debug')
         self.cache_seconds = new_config.www.get('json_cache_seconds', 0)
 
+        self.reconfigResponseCache(new_config.www.get(
+            'rest_cache_size', self.DEFAULT_CACHE_SIZE))
+
+    def reconfigResponseCache(self, size):
+        if not size:
+            self.stopResponseCache()
+        elif self.responseCache is not None:
+            self.responseCache.setMaxSize(size)
+        elif self.cacheConsumers is None:
+            d = self.startResponseCache(size)
+            d.addErrback(log.err, 'while starting the REST response cache')
+
+    @defer.inlineCallbacks
+    def startResponseCache(self, size):
+        # consume the events of every resource type, and only start caching
+        # once we are sure to hear about changes
+        cache = ResponseCache(size)
+        consumers = self.cacheConsumers = []
+        filters = set()
+        for rtype in itervalues(vars(self.master.data.rtypes)):
+            for path in rtype.eventPaths:
+                filters.add(tuple(None if p.startswith('{') else p
+                                  for p in path.split('/')) + (None,))
+        for filter in filters:
+            consumer = yield self.master.mq.startConsuming(
+                lambda key, msg: cache.invalidate(key), filter)
+            consumers.append(consumer)
+        if self.cacheConsumers is consumers:
+            self.responseCache = cache
+        else:
+            # stopped in the meantime
+            for consumer in consumers:
+                consumer.stopConsuming()
+
+    def stopResponseCache(self):
+        for consumer in self.cacheConsumers or []:
+            consumer.stopConsuming()
+        self.cacheConsumers = None
+        self.responseCache = None
+
     def render(self, request):
         def writeError(msg, errcode=400):
             if self.debug:
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+"""
+Benchmark deep-offset reads through LogsConnectorComponent.getLogLines.
+
+A synthetic log is stored with each compression method, then pages of lines
+near the end of the log are read back, both with the previous algorithm
+(decompress the chunk and scan for newlines on every request) and with the
+cached per-chunk line index.
+
+    python bench_getloglines.py --lines 2000000 --page 100
+"""
+from __future__ import print_function
+
+import optparse
+
+import sqlalchemy as sa
+
+from buildbot.db import logs
+
+import dbbench
+
+
+def legacyGetLogLines(component, conn, logid, first_line, last_line):
+    tbl = component.db.model.logchunks
+    q = sa.select([tbl.c.first_line, tbl.c.last_line,
+                   tbl.c.content, tbl.c.compressed])
+    q = q.where(tbl.c.logid == logid)
+    q = q.where(tbl.c.first_line <= last_line)
+    q = q.where(tbl.c.last_line >= first_line)
+    q = q.order_by(tbl.c.first_line)
+    rv = []
+    for row in conn.execute(q):
+        data = component.COMPRESSION_BYID[row.compressed]["read"](row.content)
+        content = data.decode('utf-8')
+        if row.first_line < first_line:
+            idx = -1
+            for _ in range(first_line - row.first_line):
+                idx = content.index('\n', idx + 1)
+            content = content[idx + 1:]
+        if row.last_line > last_line:
+            idx = len(content) + 1
+            for _ in range(row.last_line - last_line):
+                idx = content.rindex('\n', 0, idx)
+            content = content[:idx]
+        rv.append(content)
+    return u'\n'.join(rv) + u'\n' if rv else u''
+
+
+def makeLog(num_lines):
+    # compiler-like output: short and long lines, moderately repetitive
+    lines = []
+    for i in range(num_lines):
+        if i % 7 == 0:
+            lines.append(u'gcc -c -O2 -Wall -Iinclude src/module%d.c '
+                         u'-o build/module%d.o' % (i % 1000, i % 1000))
+        else:
+            lines.append(u'src/module%d.c:%d: note: line %d' % (
+                i % 1000, i % 300, i))
+    return u'\n'.join(lines) + u'\n'
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--lines', type='int', default=500000,
+                      help='number of lines in the synthetic log')
+    parser.add_option('--page', type='int', default=50,
+                      help='number of lines read per request')
+    parser.add_option('--reads', type='int', default=20,
+                      help='number of pages read near the end of the log')
+    parser.add_option('--methods', default='raw,gz,bz2,lz4',
+                      help='comma-separated compression methods')
+    opts, _ = parser.parse_args()
+
+    content = makeLog(opts.lines)
+    print("log: %d lines, %d bytes" % (opts.lines, len(content)))
+    print("%-6s %8s %12s %12s %12s" % ("method", "chunks", "legacy (ms)",
+                                      "cold (ms)", "warm (ms)"))
+
+    for method in opts.methods.split(','):
+        if method == 'lz4':
+            try:
+                import lz4
+                [lz4]
+            except ImportError:
+                print("%-6s skipped (lz4 is not installed)" % method)
+                continue
+        db = dbbench.SyncDBConnector(table_names=['logs', 'logchunks'])
+        db.master.config.logCompressionMethod = method
+        component = logs.LogsConnectorComponent(db)
+        logid = dbbench.result(component.addLog(1, u'stdio', u'stdio', u's'))
+        dbbench.result(component.appendLog(logid, content))
+        nchunks = db.pool.conn.execute(
+            sa.select([sa.func.count()]).select_from(
+                db.model.logchunks)).scalar()
+
+        # pages spread over the last 10% of the log, so that each one
+        # starts deep inside a chunk
+        step = max(1, (opts.lines // 10) // opts.reads)
+        firsts = [opts.lines - opts.lines // 10 + i * step
+                  for i in range(opts.reads)]
+
+        def legacy():
+            for first in firsts:
+                legacyGetLogLines(component, db.pool.conn, logid,
+                                  first, first + opts.page - 1)
+
+        def cold():
+            for first in firsts:
+                component._chunkIndexCache = logs.lru.LRUCache(
+                    lambda key: None, component.CHUNK_INDEX_CACHE_SIZE)
+                dbbench.result(component.getLogLines(
+                    logid, first, first + opts.page - 1))
+
+        def warm():
+            for first in firsts:
+                dbbench.result(component.getLogLines(
+                    logid, first, first + opts.page - 1))
+
+        # sanity check: both paths return the same lines
+        for first in firsts[:3]:
+            assert legacyGetLogLines(
+                component, db.pool.conn, logid, first,
+                first + opts.page - 1) == dbbench.result(
+                    component.getLogLines(logid, first,
+                                          first + opts.page - 1))
+
+        print("%-6s %8d %12.2f %12.2f %12.2f" % (
+            method, nchunks,
+            dbbench.timeit(legacy, 3) * 1000 / opts.reads,
+            dbbench.timeit(cold, 3) * 1000 / opts.reads,
+            dbbench.timeit(warm, 3) * 1000 / opts.reads))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+"""
+Benchmark how GitPoller reads the metadata of many new revisions.
+
+A synthetic repository with the given number of commits is created with
+'git fast-import', and the changes since its first commit are processed by a
+GitPoller, reading the metadata of each revision with four git commands, and
+in bulk.  The changes are added to a fake data API that only counts them.
+
+    python bench_gitpoller.py --commits 100,2000
+"""
+from __future__ import print_function
+
+import optparse
+import shutil
+import subprocess
+import tempfile
+import time
+
+from twisted.internet import defer
+from twisted.internet import task
+
+from buildbot import config
+from buildbot.changes import gitpoller
+
+
+class FakeUpdates(object):
+
+    def __init__(self):
+        self.changes = 0
+
+    def addChange(self, **kwargs):
+        self.changes += 1
+        return defer.succeed(self.changes)
+
+
+class FakeData(object):
+
+    def __init__(self):
+        self.updates = FakeUpdates()
+
+
+class FakeMaster(object):
+
+    def __init__(self):
+        self.config = config.MasterConfig()
+        self.data = FakeData()
+
+
+def makeRepository(path, commits):
+    subprocess.check_call(['git', 'init', '-q', '--bare', path])
+    stream = []
+    for i in range(commits):
+        message = 'commit %d\n\nchanges file%d' % (i, i % 50)
+        content = 'content %d\n' % i
+        stream.append(
+            'commit refs/heads/master\n'
+            'mark :%d\n'
+            'author Some One <one@example.com> %d +0000\n'
+            'committer Some One <one@example.com> %d +0000\n'
+            'data %d\n%s\n'
+            'M 644 inline dir/file%d\n'
+            'data %d\n%s\n' % (
+                i + 1, 1400000000 + i, 1400000000 + i,
+                len(message), message, i % 50, len(content), content))
+    proc = subprocess.Popen(['git', 'fast-import', '--quiet'], cwd=path,
+                            stdin=subprocess.PIPE)
+    proc.communicate(''.join(stream).encode('ascii'))
+    assert proc.returncode == 0
+    revs = subprocess.check_output(['git', 'rev-list', '--reverse', 'master'],
+                                   cwd=path).split()
+    return revs[0].decode('ascii'), revs[-1].decode('ascii')
+
+
+class Poller(gitpoller.GitPoller):
+
+    # not attached to a master service
+    master = None
+
+
+@defer.inlineCallbacks
+def processChanges(path, first, last, threshold):
+    poller = Poller(path, workdir=path)
+    poller.master = FakeMaster()
+    poller.BULK_LOG_THRESHOLD = threshold
+    poller.lastRev = {'master': first}
+    start = time.time()
+    yield poller._process_changes(last, 'master')
+    defer.returnValue((time.time() - start,
+                       poller.master.data.updates.changes))
+
+
+@defer.inlineCallbacks
+def run(reactor, counts):
+    print("%8s %14s %10s" % ("commits", "per-rev (s)", "bulk (s)"))
+    for count in counts:
+        path = tempfile.mkdtemp(prefix='bench_gitpoller')
+        try:
+            first, last = makeRepository(path, count)
+            perRev, added = yield processChanges(path, first, last,
+                                                 threshold=count)
+            assert added == count - 1
+            bulk, added = yield processChanges(path, first, last,
+                                               threshold=0)
+            assert added == count - 1
+            print("%8d %14.3f %10.3f" % (count, perRev, bulk))
+        finally:
+            shutil.rmtree(path)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--commits', default='100,2000',
+                      help='comma-separated numbers of commits')
+    opts, _ = parser.parse_args()
+    counts = [int(c) for c in opts.commits.split(',')]
+    task.react(run, [counts])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+"""
+Benchmark a master lock contended by many steps.
+
+The given number of owners ask for counting access to a MasterLock, every
+fifth owner asking for exclusive access instead.  The owners that cannot
+claim the lock wait in its queue, and each owner releases the lock in turn,
+letting the owners at the head of the queue claim it, as steps do.
+
+    python bench_locks.py --owners 1000,10000 --max-count 200
+"""
+from __future__ import print_function
+
+import collections
+import optparse
+import time
+
+from twisted.internet import defer
+from twisted.internet import task
+
+from buildbot import locks
+from buildbot.util.eventual import flushEventualQueue
+
+
+def contend(owners, maxCount):
+    lockid = locks.MasterLock('bench', maxCount=maxCount)
+    lock = locks.RealMasterLock(lockid)
+    counting = lockid.access('counting')
+    exclusive = lockid.access('exclusive')
+
+    accesses = dict((owner, exclusive if owner % 5 == 0 else counting)
+                    for owner in range(owners))
+    claimed = collections.deque()
+    waiting = collections.deque()
+    operations = 0
+
+    def claimWaiting():
+        # claim the lock for the owners at the head of the queue
+        ops = 0
+        while waiting and lock.isAvailable(waiting[0],
+                                           accesses[waiting[0]]):
+            owner = waiting.popleft()
+            lock.claim(owner, accesses[owner])
+            claimed.append(owner)
+            ops += 2
+        return ops
+
+    start = time.time()
+    for owner in range(owners):
+        access = accesses[owner]
+        if not waiting and lock.isAvailable(owner, access):
+            lock.claim(owner, access)
+            claimed.append(owner)
+        else:
+            lock.waitUntilMaybeAvailable(owner, access)
+            waiting.append(owner)
+        operations += 2
+    while claimed:
+        owner = claimed.popleft()
+        lock.release(owner, accesses[owner])
+        operations += 1 + claimWaiting()
+    assert not waiting and not lock.waiting
+    return time.time() - start, operations
+
+
+@defer.inlineCallbacks
+def run(reactor, counts, maxCount):
+    print("%8s %10s %12s" % ("owners", "total (s)", "per op (us)"))
+    for count in counts:
+        elapsed, operations = contend(count, maxCount)
+        # deliver the wake-ups of the waiters
+        yield flushEventualQueue()
+        print("%8d %10.3f %12.2f" % (count, elapsed,
+                                     elapsed * 1e6 / operations))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--owners', default='1000,10000',
+                      help='comma-separated numbers of lock owners')
+    parser.add_option('--max-count', type='int', default=200,
+                      help='maxCount of the lock')
+    opts, _ = parser.parse_args()
+    counts = [int(c) for c in opts.owners.split(',')]
+    task.react(run, [counts, opts.max_count])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+"""
+Compare the log compression methods on a corpus of real build logs.
+
+Each log file given on the command line is stored as one build log of the
+same builder, the way a running step would append it, and then compressed
+with compressLog as happens when the step finishes.  For each method, the
+tool reports the compression ratio after the appends and after compressLog,
+along with the append, compressLog and read throughput.
+
+    python bench_logcompression.py --methods gz,zstd,zstd+dict \\
+        --levels gz=6,zstd=3 logs/*.txt
+
+The 'zstd+dict' method is zstd with a dictionary trained for the builder
+from the first log that is big enough.
+"""
+from __future__ import print_function
+
+import io
+import optparse
+import time
+
+import sqlalchemy as sa
+
+from buildbot.db import logs
+
+import dbbench
+
+# appends are done in pieces of this many characters, similar to the
+# updates sent by workers
+APPEND_SIZE = 8192
+
+
+def readCorpus(filenames):
+    corpus = []
+    for fn in filenames:
+        with io.open(fn, encoding='utf-8', errors='replace') as f:
+            content = f.read()
+        if not content.endswith(u'\n'):
+            content += u'\n'
+        corpus.append(content)
+    return corpus
+
+
+def synthesizeCorpus(num_logs=5, num_lines=20000):
+    corpus = []
+    for l in range(num_logs):
+        lines = []
+        for i in range(num_lines):
+            if i % 7 == 0:
+                lines.append(u'gcc -c -O2 -Wall -Iinclude src/module%d.c '
+                             u'-o build/module%d.o' % (i % 1000, i % 1000))
+            else:
+                lines.append(u'src/module%d.c:%d: warning: unused variable '
+                             u"'tmp%d' [-Wunused-variable]" % (
+                                 (i * 31 + l) % 1000, i % 300, i % 17))
+        corpus.append(u'\n'.join(lines) + u'\n')
+    return corpus
+
+
+def appendPieces(content):
+    # split on line boundaries, as LineBoundaryFinder would
+    pos = 0
+    while pos < len(content):
+        end = content.find(u'\n', pos + APPEND_SIZE)
+        end = len(content) if end == -1 else end + 1
+        yield content[pos:end]
+        pos = end
+
+
+def storedBytes(db):
+    return db.pool.conn.execute(
+        sa.select([sa.func.sum(sa.func.length(db.model.logchunks.c.content))])
+    ).scalar() or 0
+
+
+def benchMethod(method, level, corpus):
+    db = dbbench.SyncDBConnector(table_names=[
+        'builders', 'builds', 'steps', 'logs', 'logchunks',
+        'log_dictionaries'])
+    if method == 'zstd+dict':
+        db.master.config.logCompressionMethod = 'zstd'
+        db.master.config.logCompressionDictionaries = True
+    else:
+        db.master.config.logCompressionMethod = method
+    db.master.config.logCompressionLevel = level
+    component = logs.LogsConnectorComponent(db)
+
+    conn = db.pool.conn
+    conn.execute(db.model.builders.insert(),
+                 dict(id=1, name=u'b', name_hash=u'b'))
+    logids = []
+    for i in range(len(corpus)):
+        conn.execute(db.model.builds.insert(),
+                     dict(id=i + 1, number=i, builderid=1, buildrequestid=1,
+                          masterid=1, started_at=0, state_string=u''))
+        conn.execute(db.model.steps.insert(),
+                     dict(id=i + 1, number=0, name=u'compile', buildid=i + 1,
+                          state_string=u'', urls_json=u'[]'))
+        logids.append(dbbench.result(
+            component.addLog(i + 1, u'stdio', u'stdio', u's')))
+
+    raw_bytes = sum(len(content.encode('utf-8')) for content in corpus)
+
+    start = time.time()
+    for logid, content in zip(logids, corpus):
+        for piece in appendPieces(content):
+            dbbench.result(component.appendLog(logid, piece))
+    append_time = time.time() - start
+    appended_bytes = storedBytes(db)
+
+    start = time.time()
+    for logid in logids:
+        dbbench.result(component.compressLog(logid))
+    compress_time = time.time() - start
+    compressed_bytes = storedBytes(db)
+
+    # read back every log with a cold chunk cache
+    component = logs.LogsConnectorComponent(db)
+    start = time.time()
+    for logid, content in zip(logids, corpus):
+        got = dbbench.result(component.getLogLines(logid, 0, 1 << 30))
+        assert got == content, "log %d does not read back" % logid
+    read_time = time.time() - start
+
+    mb = raw_bytes / 1024.0 / 1024.0
+    return (raw_bytes / float(appended_bytes),
+            raw_bytes / float(compressed_bytes),
+            mb / append_time, mb / compress_time, mb / read_time)
+
+
+def main():
+    parser = optparse.OptionParser(
+        usage='%prog [options] [logfile ...]')
+    parser.add_option('--methods', default='raw,gz,bz2,lz4,zstd,zstd+dict',
+                      help='comma-separated compression methods')
+    parser.add_option('--levels', default='',
+                      help='comma-separated method=level pairs; '
+                           'by default each method uses its default level')
+    opts, filenames = parser.parse_args()
+
+    levels = dict((method, int(level)) for method, level in
+                  (pair.split('=') for pair in opts.levels.split(',') if pair))
+    if filenames:
+        corpus = readCorpus(filenames)
+    else:
+        print("no log files given; using a synthetic corpus")
+        corpus = synthesizeCorpus()
+    print("corpus: %d logs, %d characters" % (
+        len(corpus), sum(len(content) for content in corpus)))
+
+    print("%-10s %6s %9s %9s %12s %12s %12s" % (
+        "method", "level", "ratio", "ratio", "append", "compressLog",
+        "read"))
+    print("%-10s %6s %9s %9s %12s %12s %12s" % (
+        "", "", "(append)", "(final)", "(MB/s)", "(MB/s)", "(MB/s)"))
+    for method in opts.methods.split(','):
+        level = levels.get(method, levels.get(method.split('+')[0]))
+        try:
+            res = benchMethod(method, level, corpus)
+        except ImportError as e:
+            print("%-10s skipped (%s)" % (method, e))
+            continue
+        print("%-10s %6s %9.2f %9.2f %12.2f %12.2f %12.2f" % (
+            (method, level if level is not None else '-') + res))
+
+
+if __name__ == '__main__':
+    main()
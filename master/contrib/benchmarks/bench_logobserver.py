@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+"""
+Benchmark the throughput of log observers for a step logging a lot.
+
+Chunks of a log looking like the output of trial are given to line
+observers, as a step logging the given number of megabytes would; a pool of
+chunks is reused to reach big sizes, e.g. for a step logging 10 GB:
+
+    python bench_logobserver.py --size 10240
+"""
+from __future__ import print_function
+
+import optparse
+import time
+
+from buildbot.process import logobserver
+from buildbot.steps import python_twisted
+
+CHUNK_SIZE = 65536
+POOL_SIZE = 16 * 1024 * 1024
+
+
+class FakeStep(object):
+
+    def setProgress(self, metric, value):
+        pass
+
+
+class PerLineObserver(logobserver.LogObserver):
+
+    """Splits chunks into lines as LogLineObserver used to, with one method
+    call per line."""
+
+    def __init__(self):
+        self.lines = 0
+
+    def outReceived(self, data):
+        for line in data.rstrip().split("\n"):
+            if len(line) > 16384:
+                continue
+            self.outLineReceived(line)
+
+    def outLineReceived(self, line):
+        self.lines += 1
+
+
+class LineObserver(logobserver.LogLineObserver):
+
+    """A line observer, called through the adapter."""
+
+    def __init__(self):
+        logobserver.LogLineObserver.__init__(self)
+        self.lines = 0
+
+    def outLineReceived(self, line):
+        self.lines += 1
+
+
+class LinesObserver(logobserver.LogLineObserver):
+
+    """A line observer handling the lines of a chunk at once."""
+
+    def __init__(self):
+        logobserver.LogLineObserver.__init__(self)
+        self.lines = 0
+
+    def outLinesReceived(self, lines):
+        self.lines += len(lines)
+
+
+def consumer():
+    while True:
+        yield
+
+
+def makeChunks():
+    lines = []
+    size = 0
+    i = 0
+    while size < POOL_SIZE:
+        line = (u"buildbot.test.unit.test_module%d.Tests.test_%d ... "
+                u"[OK]" % (i % 300, i))
+        lines.append(line)
+        size += len(line) + 1
+        i += 1
+    log = u'\n'.join(lines) + u'\n'
+    chunks = []
+    start = 0
+    while start < len(log):
+        end = log.rfind(u'\n', start, start + CHUNK_SIZE) + 1
+        chunks.append(log[start:end])
+        start = end
+    return chunks
+
+
+def observe(observer, chunks, size):
+    observer.setStep(FakeStep())
+    received = 0
+    start = time.time()
+    while received < size:
+        for chunk in chunks:
+            observer.outReceived(chunk)
+            received += len(chunk)
+            if received >= size:
+                break
+    observer.finishReceived()
+    return time.time() - start
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--size', type='int', default=256,
+                      help='megabytes logged by the step')
+    opts, _ = parser.parse_args()
+    size = opts.size * 1024 * 1024
+    chunks = makeChunks()
+
+    print("%-28s %10s %10s" % ("observer", "time (s)", "MB/s"))
+    for name, observer in [
+            ("one call per line", PerLineObserver()),
+            ("LogLineObserver (adapter)", LineObserver()),
+            ("LogLineObserver (lines)", LinesObserver()),
+            ("LineConsumerLogObserver",
+             logobserver.LineConsumerLogObserver(consumer)),
+            ("TrialTestCaseCounter",
+             python_twisted.TrialTestCaseCounter()),
+    ]:
+        elapsed = observe(observer, chunks, size)
+        print("%-28s %10.3f %10.1f" % (name, elapsed, opts.size / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+"""
+Benchmark SimpleMQ.produce throughput with many subscriptions.
+
+The subscriptions look like those of a busy master: most of them are web
+clients following a single build or log, plus a few wildcard consumers
+(reporters, schedulers).  Messages are produced for log and build events, and
+the routing trie is compared with the previous linear scan over every
+consumer.
+
+    python bench_mq_produce.py --subscriptions 10,1000,10000
+"""
+from __future__ import print_function
+
+import optparse
+
+from buildbot.mq import simple
+from buildbot.util import tuplematch
+
+import dbbench
+
+
+def linearProduce(qrefs, routingKey, data):
+    for qref in qrefs:
+        if tuplematch.matchTuple(routingKey, qref.filter):
+            qref.invoke(routingKey, data)
+
+
+def subscribe(mq, count):
+    counter = [0]
+
+    def cb(routingKey, data):
+        counter[0] += 1
+    qrefs = []
+    for filter in [('builds', None, 'new'), ('builds', None, 'finished'),
+                   ('buildrequests', None, None, None, 'new'),
+                   ('changes', None, 'new')]:
+        qrefs.append(dbbench.result(mq.startConsuming(cb, filter)))
+    i = 0
+    while len(qrefs) < count:
+        if i % 2:
+            filter = ('logs', str(i), 'append')
+        else:
+            filter = ('builds', str(i), None)
+        qrefs.append(dbbench.result(mq.startConsuming(cb, filter)))
+        i += 1
+    return qrefs, counter
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--subscriptions', default='10,1000,10000',
+                      help='comma-separated numbers of subscriptions')
+    parser.add_option('--messages', type='int', default=20000,
+                      help='number of messages produced per run')
+    opts, _ = parser.parse_args()
+
+    print("%8s %14s %14s" % ("subs", "linear (msg/s)", "trie (msg/s)"))
+    for count in [int(c) for c in opts.subscriptions.split(',')]:
+        mq = simple.SimpleMQ()
+        qrefs, counter = subscribe(mq, count)
+        keys = []
+        for i in range(opts.messages):
+            n = str(i % max(count, 1))
+            if i % 4:
+                keys.append(('logs', n, 'append'))
+            else:
+                keys.append(('builds', n, 'finished'))
+
+        def linear():
+            for key in keys:
+                linearProduce(qrefs, key, None)
+
+        def trie():
+            for key in keys:
+                mq.produce(key, None)
+
+        # sanity check: both deliver the same number of messages
+        counter[0] = 0
+        linear()
+        expected, counter[0] = counter[0], 0
+        trie()
+        assert counter[0] == expected, (counter[0], expected)
+
+        # the linear scan is slow enough with many consumers that a
+        # fraction of the messages gives a stable figure
+        nlinear = max(1, opts.messages * 10 // max(count, 10))
+        lkeys = keys[:nlinear]
+
+        def linearPart():
+            for key in lkeys:
+                linearProduce(qrefs, key, None)
+
+        print("%8d %14d %14d" % (
+            count,
+            len(lkeys) / dbbench.timeit(linearPart, 3),
+            len(keys) / dbbench.timeit(trie, 3)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+"""
+Benchmark ResultSpec.apply on large in-memory collections.
+
+The items look like builds, and are sorted the way the web UI asks for them
+(newest first, by a nullable field), with and without a page and a field
+selection.  The key-based sort is compared with the previous cmp-based sort,
+which selected fields on every item before sorting.
+
+    python bench_resultspec.py --items 1000,50000
+"""
+from __future__ import print_function
+
+import optparse
+import random
+
+from future.utils import iteritems
+
+from buildbot.data import resultspec
+
+import dbbench
+
+
+def cmpApply(spec, data):
+    # ResultSpec.apply, as it was before it used sort keys
+    if spec.fields:
+        fields = set(spec.fields)
+        data = [dict((k, v) for k, v in iteritems(d) if k in fields)
+                for d in data]
+    else:
+        data = list(data)
+    order = [(lambda a, b, k=k[1:]: resultspec.nonecmp(b[k], a[k]))
+             if k[0] == '-' else
+             (lambda a, b, k=k: resultspec.nonecmp(a[k], b[k]))
+             for k in spec.order]
+
+    def cmpFunc(a, b):
+        for f in order:
+            c = f(a, b)
+            if c:
+                return c
+        return 0
+    data.sort(cmp=cmpFunc)
+    if spec.offset is not None or spec.limit is not None:
+        end = ((spec.offset or 0) + spec.limit
+               if spec.limit is not None else None)
+        data = data[spec.offset:end]
+    return data
+
+
+def makeBuilds(count):
+    builds = []
+    for i in range(count):
+        builds.append({
+            'buildid': i,
+            'number': i // 10,
+            'builderid': i % 10,
+            'buildrequestid': i,
+            'workerid': random.randint(1, 20),
+            'masterid': 1,
+            'started_at': 1000000 + i,
+            'complete_at': None if i % 13 == 0 else 1000000 + i + 60,
+            'complete': i % 13 != 0,
+            'state_string': u'finished',
+            'results': random.choice([0, 1, 2, None]),
+        })
+    random.shuffle(builds)
+    return builds
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--items', default='1000,50000',
+                      help='comma-separated numbers of items')
+    opts, _ = parser.parse_args()
+
+    specs = [
+        ('sort', dict(order=['-complete_at'])),
+        ('sort 2 keys', dict(order=['results', '-buildid'])),
+        ('page', dict(order=['-complete_at'], limit=50)),
+        ('page+fields', dict(order=['-complete_at'], limit=50,
+                             fields=['buildid', 'complete_at'])),
+    ]
+
+    print("%8s %12s %10s %10s" % ("items", "spec", "cmp (s)", "key (s)"))
+    for count in [int(c) for c in opts.items.split(',')]:
+        builds = makeBuilds(count)
+        for name, kwargs in specs:
+            # sanity check: both give the same result
+            old = cmpApply(resultspec.ResultSpec(**kwargs), builds)
+            new = resultspec.ResultSpec(**kwargs).apply(builds)
+            assert list(new) == old, name
+
+            print("%8d %12s %10.4f %10.4f" % (
+                count, name,
+                dbbench.timeit(
+                    lambda: cmpApply(resultspec.ResultSpec(**kwargs), builds),
+                    3),
+                dbbench.timeit(
+                    lambda: resultspec.ResultSpec(**kwargs).apply(builds),
+                    3)))
+
+
+if __name__ == '__main__':
+    main()
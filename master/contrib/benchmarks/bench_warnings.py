@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+"""
+Benchmark how WarningCountingShellCommand finds the warnings in a big log.
+
+A log looking like the output of make and gcc, with the given number of
+lines, one in --warning-every of which is a warning, is given in chunks to
+the log observer of a Compile step with a few suppressions, and to an
+observer giving each line of the log to the step's warningLogConsumer.
+
+    python bench_warnings.py --lines 1000000
+"""
+from __future__ import print_function
+
+import optparse
+import time
+
+from buildbot.process import logobserver
+from buildbot.steps import shell
+
+CHUNK_SIZE = 65536
+
+
+def makeLog(lines, warningEvery):
+    log = []
+    for i in range(lines):
+        if i % 1000 == 0:
+            log.append(u"make[1]: Entering directory '/build/src/dir%d'"
+                       % (i // 1000))
+        elif i % 1000 == 999:
+            log.append(u"make[1]: Leaving directory '/build/src/dir%d'"
+                       % (i // 1000))
+        elif i % warningEvery == 0:
+            log.append(u"file%d.c:%d:5: warning: unused variable 'x%d' "
+                       u"[-Wunused-variable]" % (i % 97, i % 1000, i))
+        else:
+            log.append(u"gcc -DHAVE_CONFIG_H -I. -I../include -O2 -g -Wall "
+                       u"-c -o file%d.o file%d.c" % (i % 97, i % 97))
+    log = u'\n'.join(log) + u'\n'
+
+    # split the log into chunks of whole lines, as logs are received
+    chunks = []
+    start = 0
+    while start < len(log):
+        end = log.rfind(u'\n', start, start + CHUNK_SIZE) + 1
+        if end <= start:
+            end = log.find(u'\n', start) + 1
+        chunks.append(log[start:end])
+        start = end
+    return chunks
+
+
+def makeStep():
+    step = shell.Compile()
+    step.addSuppression([
+        ('.*/dir%d/.*' % i, '.*deprecated-declarations.*', None, None)
+        for i in range(20)] + [
+        (None, '.*variable .x12345.*', None, None)])
+    return step
+
+
+def countWarnings(makeObserver, chunks):
+    step = makeStep()
+    observer = makeObserver(step)
+    observer.setStep(step)
+    start = time.time()
+    for chunk in chunks:
+        observer.outReceived(chunk)
+    observer.finishReceived()
+    return time.time() - start, step.warnCount
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--lines', type='int', default=1000000,
+                      help='number of lines of the log')
+    parser.add_option('--warning-every', type='int', default=50,
+                      help='one line in this number is a warning')
+    opts, _ = parser.parse_args()
+    chunks = makeLog(opts.lines, opts.warning_every)
+
+    perLine, lineCount = countWarnings(
+        lambda step: logobserver.LineConsumerLogObserver(
+            step.warningLogConsumer),
+        chunks)
+    perChunk, chunkCount = countWarnings(
+        lambda step: shell._WarningCountingLogObserver(), chunks)
+    assert lineCount == chunkCount, (lineCount, chunkCount)
+
+    print("%d lines, %d chunks, %d warnings" % (opts.lines, len(chunks),
+                                                 chunkCount))
+    print("%10s %10s %10s" % ("", "time (s)", "lines/s"))
+    for name, elapsed in [("per line", perLine), ("per chunk", perChunk)]:
+        print("%10s %10.3f %10d" % (name, elapsed, opts.lines / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+"""
+Helpers shared by the benchmark scripts in this directory.
+
+The DB connector components are normally driven from the reactor through a
+DBThreadPool.  For benchmarking, the thread hop only adds noise, so
+L{SyncDBConnector} runs every C{pool.do} call synchronously on a single
+connection, and the resulting Deferreds have already fired when they are
+returned.
+"""
+from __future__ import print_function
+
+import time
+
+import sqlalchemy as sa
+from twisted.internet import defer
+from twisted.python import failure
+
+from buildbot import config
+from buildbot.db import model
+
+
+class SyncPool(object):
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.conn = engine.connect()
+
+    def do(self, callable, *args, **kwargs):
+        try:
+            return defer.succeed(callable(self.conn, *args, **kwargs))
+        except Exception:
+            return defer.fail()
+
+    def do_with_engine(self, callable, *args, **kwargs):
+        try:
+            return defer.succeed(callable(self.engine, *args, **kwargs))
+        except Exception:
+            return defer.fail()
+
+
+class FakeMaster(object):
+
+    def __init__(self):
+        self.config = config.MasterConfig()
+        self.config.logCompressionMethod = 'raw'
+
+
+class SyncDBConnector(object):
+
+    def __init__(self, db_url='sqlite://', table_names=None):
+        engine = sa.create_engine(db_url)
+        tables = None
+        if table_names:
+            tables = [model.Model.metadata.tables[name]
+                      for name in table_names]
+        model.Model.metadata.create_all(engine, tables=tables)
+        self.pool = SyncPool(engine)
+        self.master = FakeMaster()
+        self.model = model.Model(self)
+
+
+def result(d):
+    """Extract the result of an already-fired Deferred"""
+    res = []
+    d.addBoth(res.append)
+    assert res, "Deferred has not fired"
+    if isinstance(res[0], failure.Failure):
+        res[0].raiseException()
+    return res[0]
+
+
+def timeit(fn, repeat=1):
+    """Return the best wall-clock time of C{repeat} calls of C{fn}"""
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        fn()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
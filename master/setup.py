@@ -447,6 +447,8 @@ else:
         'txgithub',
         'ramlfications',
         'mock',
+        # zstandard required for log compression tests.
+        'zstandard',
     ]
     if sys.platform != 'win32':
         test_deps += [